@@ -9,6 +9,8 @@ class Settings:
     def __init__(self):
         self.auth0_domain = os.getenv("AUTH0_DOMAIN")
         self.auth0_api_audience = os.getenv("AUTH0_API_AUDIENCE")
+        # Local JWKS file; when set, tokens are verified without fetching keys
+        self.auth0_jwks_file = os.getenv("AUTH0_JWKS_FILE")
         self.gemini_api_key = os.getenv("GEMINI_API_KEY")
         self.authorization_header_streams_auth0_token = os.getenv("AUTHORIZATION_HEADER_STREAMS_AUTH0_TOKEN")
         self.webhook_signing_secret = os.getenv("WEBHOOK_SIGNING_SECRET")
@@ -18,6 +20,8 @@ class Settings:
         self.admin_secret_key = os.getenv("ADMIN_SECRET_KEY")
         self.namespace = os.getenv("NAMESPACE")
         self.db_url = os.getenv("DB_URL")
+        # Optional read replica for list and reporting endpoints
+        self.db_replica_url = os.getenv("DB_REPLICA_URL")
 
 @lru_cache()
 def get_settings() -> Settings:
@@ -1,26 +1,31 @@
 from fastapi import Depends, HTTPException
 from models.models import User, Organization
-from fastapi_plugin.fast_api_client import Auth0FastAPI
-from auth.config import get_settings
+from auth.user_cache import get_user
+from auth.verifier import require_auth
+from db import use_replica
 
-settings = get_settings()
 
-auth0 = Auth0FastAPI(
-    domain=settings.auth0_domain,
-    audience=settings.auth0_api_audience
-)
-
-
-async def get_current_user(claims=Depends(auth0.require_auth())):
+async def get_current_user(claims=Depends(require_auth)):
     auth_id = claims.get("sub")
     user_roles = claims.get("https://spendflow.com/roles", [])
 
-    user = await User.get_or_none(auth_id=auth_id)
+    user = await get_user(auth_id)
 
     if not user:
         raise HTTPException(403, "User not provisioned")
 
+    if not user.is_active:
+        raise HTTPException(403, "User is deactivated")
+
     user.role = user_roles
 
     return user
 
+
+
+async def replica_reads(claims=Depends(require_auth)):
+    """
+    Route dependency for list and reporting endpoints: their reads go to
+    the read replica, or to the primary right after this session wrote.
+    """
+    use_replica(claims.get("sub"))
@@ -0,0 +1,93 @@
+import copy
+import os
+import time
+from collections import OrderedDict
+
+from models.models import User
+
+# Webhook invalidation makes changes visible at once on this worker; the TTL
+# bounds how long another worker can keep serving a stale record.
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 30))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+
+_users: OrderedDict[str, tuple[User, float]] = OrderedDict()
+_generation = 0
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "expired": 0,
+    "evictions": 0,
+    "invalidations": 0,
+    "max_age_served": 0.0,
+}
+_age_served_total = 0.0
+
+
+async def get_user(auth_id: str) -> User | None:
+    """
+    Returns the user with this Auth0 subject, organization preloaded.
+    Each caller gets its own copy, so per-request changes (e.g. roles from
+    the token) never leak into the cached record.
+    """
+    global _age_served_total
+
+    now = time.monotonic()
+    cached = _users.get(auth_id)
+    if cached:
+        user, loaded_at = cached
+        age = now - loaded_at
+        if age < USER_CACHE_TTL:
+            _users.move_to_end(auth_id)
+            _stats["hits"] += 1
+            _age_served_total += age
+            _stats["max_age_served"] = max(_stats["max_age_served"], age)
+            return copy.copy(user)
+        del _users[auth_id]
+        _stats["expired"] += 1
+
+    _stats["misses"] += 1
+    generation = _generation
+    user = await User.get_or_none(auth_id=auth_id).select_related("organization")
+    if user is None:
+        # Not provisioned yet; the user.created webhook may land any moment
+        return None
+
+    # Don't store a record that was invalidated while it was loading
+    if generation == _generation:
+        _users[auth_id] = (user, time.monotonic())
+        while len(_users) > USER_CACHE_SIZE:
+            _users.popitem(last=False)
+            _stats["evictions"] += 1
+    return copy.copy(user)
+
+
+def invalidate_user(auth_id: str | None):
+    global _generation
+    _generation += 1
+    _stats["invalidations"] += 1
+    if auth_id:
+        _users.pop(auth_id, None)
+
+
+def invalidate_organization_users(organization_id):
+    global _generation
+    _generation += 1
+    organization_id = str(organization_id)
+    stale = [
+        auth_id for auth_id, (user, _) in _users.items()
+        if str(user.organization_id) == organization_id
+    ]
+    for auth_id in stale:
+        del _users[auth_id]
+    _stats["invalidations"] += len(stale)
+
+
+def user_cache_stats() -> dict:
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "hit_rate": _stats["hits"] / lookups if lookups else 0.0,
+        "avg_age_served": _age_served_total / _stats["hits"] if _stats["hits"] else 0.0,
+        "size": len(_users),
+        "ttl_seconds": USER_CACHE_TTL,
+    }
@@ -0,0 +1,262 @@
+"""
+Shared Auth0 access-token verifier.
+
+The JWKS keyset lives in memory and a background task refreshes it, so a
+request only verifies a signature against keys it already holds. Verified
+tokens are memoized by SHA-256 until their `exp`, which turns repeat
+requests with the same token into a dict lookup. When the IdP is slow or
+down, the last good keyset keeps being used.
+
+For offline use (tests, local development), point AUTH0_JWKS_FILE at a JWKS
+JSON file, or pass `jwks=` directly; the verifier then never goes to the
+network.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+import httpx
+from authlib.jose import JsonWebKey, JsonWebToken
+from authlib.jose.errors import JoseError
+from fastapi import HTTPException, Request
+
+from auth.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+JWKS_REFRESH_INTERVAL = float(os.getenv("JWKS_REFRESH_INTERVAL_SECONDS", 600))
+# Unknown `kid`s trigger an early refresh at most this often
+JWKS_MIN_REFRESH_INTERVAL = float(os.getenv("JWKS_MIN_REFRESH_INTERVAL_SECONDS", 30))
+JWKS_FETCH_TIMEOUT = float(os.getenv("JWKS_FETCH_TIMEOUT_SECONDS", 5))
+TOKEN_MEMO_SIZE = int(os.getenv("TOKEN_MEMO_SIZE", 10000))
+TOKEN_LEEWAY = int(os.getenv("TOKEN_LEEWAY_SECONDS", 30))
+ALGORITHMS = ["RS256"]
+
+
+class TokenError(Exception):
+    pass
+
+
+def _token_header(token: str) -> dict:
+    try:
+        segment = token.split(".", 1)[0]
+        segment += "=" * (-len(segment) % 4)
+        header = json.loads(base64.urlsafe_b64decode(segment))
+    except ValueError:
+        raise TokenError("Malformed token")
+    if not isinstance(header, dict):
+        raise TokenError("Malformed token")
+    return header
+
+
+class TokenVerifier:
+    def __init__(
+        self,
+        domain: str,
+        audience: str,
+        *,
+        jwks: dict | None = None,
+        refresh_interval: float = JWKS_REFRESH_INTERVAL,
+        memo_size: int = TOKEN_MEMO_SIZE,
+        leeway: int = TOKEN_LEEWAY,
+    ):
+        self.issuer = f"https://{domain}/"
+        self.audience = audience
+        self.jwks_uri = f"https://{domain}/.well-known/jwks.json"
+        self.refresh_interval = refresh_interval
+        self.memo_size = memo_size
+        self.leeway = leeway
+
+        self._jwt = JsonWebToken(ALGORITHMS)
+        self._claims_options = {
+            "iss": {"essential": True, "value": self.issuer},
+            "aud": {"essential": True, "value": audience},
+            "exp": {"essential": True},
+            "sub": {"essential": True},
+        }
+        self._keys: dict = {}
+        self._static = jwks is not None
+        self._refreshed_at: float | None = None
+        self._refresh_lock = asyncio.Lock()
+        self._memo: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+        self._task: asyncio.Task | None = None
+        self.stats = {
+            "memo_hits": 0,
+            "verified": 0,
+            "rejected": 0,
+            "refreshes": 0,
+            "refresh_failures": 0,
+        }
+
+        if jwks is not None:
+            self._load_keys(jwks)
+
+    def _load_keys(self, jwks: dict):
+        keys = {}
+        for jwk in jwks.get("keys", []):
+            if jwk.get("use", "sig") != "sig":
+                continue
+            keys[jwk.get("kid")] = JsonWebKey.import_key(jwk)
+        if not keys:
+            raise TokenError("JWKS has no signing keys")
+
+        # A key that was rotated out must not keep vouching for memoized tokens
+        if set(self._keys) - set(keys):
+            self._memo.clear()
+        self._keys = keys
+        self._refreshed_at = time.monotonic()
+
+    async def refresh(self, force: bool = False):
+        """
+        Re-fetches the keyset. On failure the current keys stay in use.
+        """
+        if self._static:
+            return
+        async with self._refresh_lock:
+            # Another request refreshed while we waited for the lock
+            if (
+                not force
+                and self._refreshed_at is not None
+                and time.monotonic() - self._refreshed_at < JWKS_MIN_REFRESH_INTERVAL
+            ):
+                return
+            try:
+                async with httpx.AsyncClient(timeout=JWKS_FETCH_TIMEOUT) as client:
+                    response = await client.get(self.jwks_uri)
+                    response.raise_for_status()
+                    self._load_keys(response.json())
+                self.stats["refreshes"] += 1
+            except Exception:
+                self.stats["refresh_failures"] += 1
+                logger.warning("JWKS refresh from %s failed", self.jwks_uri, exc_info=True)
+                if not self._keys:
+                    raise TokenError("Signing keys unavailable")
+
+    async def _key(self, kid):
+        if kid not in self._keys:
+            await self.refresh()
+        key = self._keys.get(kid)
+        if key is None and kid is None and len(self._keys) == 1:
+            key = next(iter(self._keys.values()))
+        if key is None:
+            raise TokenError("Unknown signing key")
+        return key
+
+    async def verify(self, token: str) -> dict:
+        """
+        Returns the claims of a valid access token, raises TokenError otherwise.
+        """
+        digest = hashlib.sha256(token.encode()).hexdigest()
+        now = time.time()
+
+        memoized = self._memo.get(digest)
+        if memoized:
+            claims, exp = memoized
+            if now < exp:
+                self._memo.move_to_end(digest)
+                self.stats["memo_hits"] += 1
+                return dict(claims)
+            del self._memo[digest]
+
+        try:
+            key = await self._key(_token_header(token).get("kid"))
+            claims = self._jwt.decode(token, key, claims_options=self._claims_options)
+            claims.validate(now=now, leeway=self.leeway)
+        except TokenError:
+            self.stats["rejected"] += 1
+            raise
+        except (JoseError, ValueError) as e:
+            self.stats["rejected"] += 1
+            raise TokenError(str(e) or "Invalid token")
+
+        claims = dict(claims)
+        self.stats["verified"] += 1
+        self._memo[digest] = (claims, claims["exp"] + self.leeway)
+        while len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+        return dict(claims)
+
+    def start(self):
+        if self._static or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh(force=True)
+            except TokenError:
+                pass
+            await asyncio.sleep(self.refresh_interval)
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "keys": len(self._keys),
+            "memoized_tokens": len(self._memo),
+            "keyset_age_seconds": (
+                time.monotonic() - self._refreshed_at if self._refreshed_at else None
+            ),
+        }
+
+
+@lru_cache()
+def get_verifier() -> TokenVerifier:
+    settings = get_settings()
+    jwks = None
+    if settings.auth0_jwks_file:
+        with open(settings.auth0_jwks_file) as f:
+            jwks = json.load(f)
+    return TokenVerifier(settings.auth0_domain, settings.auth0_api_audience, jwks=jwks)
+
+
+async def require_auth(request: Request) -> dict:
+    """
+    FastAPI dependency: verifies the Bearer token and returns its claims.
+    """
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(
+            status_code=401,
+            detail="Missing bearer token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    try:
+        claims = await get_verifier().verify(token.strip())
+    except TokenError as e:
+        raise HTTPException(
+            status_code=401,
+            detail=str(e),
+            headers={"WWW-Authenticate": 'Bearer error="invalid_token"'}
+        )
+    # Identifies the session for read-your-writes routing (see main.py)
+    request.state.auth_sub = claims.get("sub")
+    return claims
+
+
+def start_jwks_refresher():
+    get_verifier().start()
+
+
+async def stop_jwks_refresher():
+    await get_verifier().stop()
+
+
+def token_verifier_stats() -> dict:
+    return get_verifier().metrics()
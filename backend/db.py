@@ -1,22 +1,230 @@
-from tortoise import Tortoise # type: ignore
+import asyncio
+import os
+import time
+from contextvars import ContextVar
+
+from tortoise import Tortoise, connections # type: ignore
+from tortoise.backends.base.config_generator import expand_db_url
 from auth.config import get_settings
 
 settings = get_settings()
 
-TORTOISE_ORM = {
-    "connections": {
-        "default": settings.db_url
-    },
-    "apps": {
-        "models": {
-            "models": ["models.models", "aerich.models"],
-            "default_connection": "default",
-        }
-    },
-}
+# asyncpg pool, per process. Keep
+#   (API workers + OCR workers) * DB_POOL_MAX
+# below Postgres max_connections; scripts/load_pool.py helps pick the numbers
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 2))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 10))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT_SECONDS", 10))
+# Connections are recycled after this long, and closed after being idle for DB_POOL_MAX_IDLE
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME_SECONDS", 1800))
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE_SECONDS", 300))
+# Set to 0 behind pgbouncer in transaction mode
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT_SECONDS", 30))
+# Read-your-writes: after a mutation, a session's replica reads go to the
+# primary for this long (0 = off). Roughly the replica's worst usual lag
+DB_REPLICA_STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", 0))
+
+
+def connection_config(db_url: str | None):
+    """
+    Tortoise connection settings for `db_url`. Postgres gets the tuned,
+    instrumented asyncpg pool (engine `db_pool`); anything else, e.g. sqlite
+    for local runs, is used as is.
+    """
+    if not db_url:
+        return db_url
+    config = expand_db_url(db_url)
+    if config["engine"] != "tortoise.backends.asyncpg":
+        return db_url
+
+    config["engine"] = "db_pool"
+    config["credentials"].update({
+        "minsize": DB_POOL_MIN,
+        "maxsize": DB_POOL_MAX,
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        "command_timeout": DB_COMMAND_TIMEOUT,
+        "max_inactive_connection_lifetime": DB_POOL_MAX_IDLE,
+        "acquire_timeout": DB_POOL_ACQUIRE_TIMEOUT,
+        "max_lifetime": DB_POOL_MAX_LIFETIME,
+    })
+    return config
+
+
+def tortoise_config(db_url: str | None, replica_url: str | None = None) -> dict:
+    """
+    With `replica_url`, a second "replica" connection is added and
+    ReplicaRouter decides which reads go to it.
+    """
+    config = {
+        "connections": {
+            "default": connection_config(db_url)
+        },
+        "apps": {
+            "models": {
+                "models": ["models.models", "aerich.models"],
+                "default_connection": "default",
+            }
+        },
+    }
+    if replica_url:
+        config["connections"]["replica"] = connection_config(replica_url)
+        config["routers"] = ["db.ReplicaRouter"]
+    return config
+
+
+# Single source for the app, the OCR worker, scripts and aerich
+TORTOISE_ORM = tortoise_config(settings.db_url, settings.db_replica_url)
 
 async def init_db() -> None:
     await Tortoise.init(config=TORTOISE_ORM)
 
 async def close_db() -> None:
-    await Tortoise.close_connections()
\ No newline at end of file
+    await Tortoise.close_connections()
+
+
+# Replica routing. Reads go to the primary unless the current request opted
+# in with use_replica(); writes always do.
+_replica_reads: ContextVar[bool] = ContextVar("replica_reads", default=False)
+_sticky_until: dict[str, float] = {}
+_routing_stats = {"replica": 0, "sticky_primary": 0}
+MAX_STICKY_SESSIONS = 10000
+
+
+class ReplicaRouter:
+    def db_for_read(self, model):
+        return "replica" if _replica_reads.get() else "default"
+
+    def db_for_write(self, model):
+        return "default"
+
+
+def mark_written(session: str | None):
+    """
+    Records that `session` (an auth subject) just changed data, so its
+    replica reads stay on the primary for DB_REPLICA_STICKY_SECONDS.
+    Kept per process, like the user cache.
+    """
+    if not session or DB_REPLICA_STICKY_SECONDS <= 0:
+        return
+    now = time.monotonic()
+    if len(_sticky_until) >= MAX_STICKY_SESSIONS:
+        for key, until in list(_sticky_until.items()):
+            if until <= now:
+                del _sticky_until[key]
+    _sticky_until[session] = now + DB_REPLICA_STICKY_SECONDS
+
+
+def use_replica(session: str | None = None) -> bool:
+    """
+    Sends the rest of the current request's reads to the replica, unless
+    `session` wrote recently. Returns whether the replica is used.
+    """
+    if "replica" not in connections.db_config:
+        return False
+    until = _sticky_until.get(session) if session else None
+    if until is not None:
+        if until > time.monotonic():
+            _routing_stats["sticky_primary"] += 1
+            return False
+        _sticky_until.pop(session, None)
+    _replica_reads.set(True)
+    _routing_stats["replica"] += 1
+    return True
+
+
+def replica_stats() -> dict:
+    return {**_routing_stats, "sticky_sessions": len(_sticky_until)}
+
+
+def sql_placeholders(connection, count: int, start: int = 1) -> list[str]:
+    """
+    Positional parameter markers for raw queries: $1, $2... on Postgres, ? elsewhere.
+    """
+    if connection.capabilities.dialect == "postgres":
+        return [f"${i}" for i in range(start, start + count)]
+    return ["?"] * count
+
+
+class InstrumentedPool:
+    """
+    Wraps an asyncpg pool: times every acquire, bounds it with a timeout and
+    recycles connections older than `max_lifetime`. Everything else is
+    passed through to the pool.
+    """
+
+    def __init__(self, pool, acquire_timeout: float | None = None, max_lifetime: float | None = None):
+        self._pool = pool
+        self.acquire_timeout = acquire_timeout
+        self.max_lifetime = max_lifetime
+        self._recycled_at = time.monotonic()
+        self.waiting = 0
+        self.stats = {
+            "acquired": 0,
+            "acquire_timeouts": 0,
+            "waited": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "recycles": 0,
+        }
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    async def acquire(self, *, timeout: float | None = None):
+        started = time.monotonic()
+        if self.max_lifetime and started - self._recycled_at >= self.max_lifetime:
+            # Every connection open now is replaced when it is next released,
+            # so none lives much longer than max_lifetime
+            self._recycled_at = started
+            self.stats["recycles"] += 1
+            await self._pool.expire_connections()
+
+        self.waiting += 1
+        try:
+            connection = await self._pool.acquire(timeout=timeout or self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.stats["acquire_timeouts"] += 1
+            raise
+        finally:
+            self.waiting -= 1
+            waited = time.monotonic() - started
+            self.stats["wait_seconds_total"] += waited
+            self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], waited)
+            if waited >= 0.001:
+                self.stats["waited"] += 1
+
+        self.stats["acquired"] += 1
+        return connection
+
+    async def release(self, connection, *, timeout: float | None = None):
+        await self._pool.release(connection, timeout=timeout)
+
+    def metrics(self) -> dict:
+        size = self._pool.get_size()
+        idle = self._pool.get_idle_size()
+        acquired = self.stats["acquired"]
+        return {
+            "min_size": self._pool.get_min_size(),
+            "max_size": self._pool.get_max_size(),
+            "size": size,
+            "in_use": size - idle,
+            "idle": idle,
+            "waiting": self.waiting,
+            **self.stats,
+            "wait_seconds_total": round(self.stats["wait_seconds_total"], 3),
+            "wait_seconds_max": round(self.stats["wait_seconds_max"], 3),
+            "wait_seconds_avg": round(self.stats["wait_seconds_total"] / acquired, 4) if acquired else 0.0,
+        }
+
+
+# Connection name -> InstrumentedPool, filled in by db_pool when a pool opens
+_pools: dict[str, InstrumentedPool] = {}
+
+
+def register_pool(name: str, pool: InstrumentedPool):
+    _pools[name] = pool
+
+
+def pool_stats() -> dict:
+    return {name: pool.metrics() for name, pool in _pools.items()}
@@ -0,0 +1,27 @@
+"""
+Tortoise engine for Postgres: the stock asyncpg client, with its pool
+wrapped in db.InstrumentedPool. db.connection_config selects it for
+Postgres URLs.
+"""
+from tortoise.backends.asyncpg.client import AsyncpgDBClient
+
+from db import InstrumentedPool, register_pool
+
+
+class InstrumentedAsyncpgClient(AsyncpgDBClient):
+    def __init__(self, *args, acquire_timeout=None, max_lifetime=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.acquire_timeout = float(acquire_timeout) if acquire_timeout else None
+        self.max_lifetime = float(max_lifetime) if max_lifetime else None
+
+    async def create_pool(self, **kwargs):
+        pool = InstrumentedPool(
+            await super().create_pool(**kwargs),
+            acquire_timeout=self.acquire_timeout,
+            max_lifetime=self.max_lifetime
+        )
+        register_pool(self.connection_name, pool)
+        return pool
+
+
+client_class = InstrumentedAsyncpgClient
@@ -1,17 +1,40 @@
 """Python FastAPI main entrance"""
 
-from fastapi import FastAPI
-from fastapi_plugin.fast_api_client import Auth0FastAPI
+from fastapi import FastAPI, Request
 from auth.config import get_settings
-from routes import users,spends,approvals,receipts, events, notifications, audit_logs, policies, admins
+from routes import users,spends,approvals,receipts, events, notifications, audit_logs, policies, admins, metrics
 from fastapi.middleware.cors import CORSMiddleware
-from db import init_db, close_db
+from db import TORTOISE_ORM, mark_written
 from contextlib import asynccontextmanager
 from models.models import Category, User, Organization, IdempotencyKey
+from services.idempotency_service import start_sweeper as start_idempotency_sweeper, stop_sweeper as stop_idempotency_sweeper
+from services.audit_service import start_audit_writer, stop_audit_writer
+from auth.verifier import start_jwks_refresher, stop_jwks_refresher
+from notifications.dispatcher import start_dispatcher, stop_dispatcher
+from services.notification_hub import start_notification_hub, stop_notification_hub
 import bcrypt
 
+# Background services. register_tortoise wraps this lifespan, so the
+# database is connected before they start and closed after they stop
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_idempotency_sweeper()
+    start_audit_writer()
+    start_jwks_refresher()
+    start_dispatcher()
+    start_notification_hub()
+    yield
+    await stop_jwks_refresher()
+    # Ends open notification streams
+    await stop_notification_hub()
+    # Sends pending notifications
+    await stop_dispatcher()
+    await stop_idempotency_sweeper()
+    # Flushes queued audit rows
+    await stop_audit_writer()
+
 # Creates app instance
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 # AddCORS Middleware
 app.add_middleware(
     CORSMiddleware,
@@ -22,10 +45,15 @@ app.add_middleware(
 )
 
 settings = get_settings()
-auth0 = Auth0FastAPI(
-   domain=settings.auth0_domain,
-   audience=settings.auth0_api_audience
-)
+
+# Read-your-writes: a session that just changed data reads from the primary
+# for a while instead of a replica that may not have caught up
+@app.middleware("http")
+async def track_writes(request: Request, call_next):
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        mark_written(getattr(request.state, "auth_sub", None))
+    return response
 
 app.include_router(users.router)
 app.include_router(spends.router)
@@ -36,6 +64,7 @@ app.include_router(policies.router)
 app.include_router(audit_logs.router)
 app.include_router(notifications.router)
 app.include_router(admins.router)
+app.include_router(metrics.router)
 
 @app.get("/")
 def public():
@@ -57,12 +86,12 @@ async def debug_users():
 # @app.get("/debug-orgs_users")
 # async def debug_orgs_users ():
 #     return await User.filter(org_id="")all().values()
+
 from tortoise.contrib.fastapi import register_tortoise
 
 register_tortoise(
     app,
-    db_url=settings.db_url,
-    modules={"models": ["models.models"]},
+    config=TORTOISE_ORM,
     generate_schemas=False,
     add_exception_handlers=True,
 )
@@ -0,0 +1,22 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    # Same format as services.idempotency_service.stored_key. The bootstrap
+    # marker ("system" scope) is looked up by its raw key and stays as is.
+    return """
+        UPDATE "idempotencykey"
+        SET "key" = "scope" || ':' || coalesce("organization_id"::text, '-') || ':' || CASE
+            WHEN length("scope") + length(coalesce("organization_id"::text, '-')) + 2 + length("key") > 255
+            THEN encode(sha256(convert_to("key", 'UTF8')), 'hex')
+            ELSE "key"
+        END
+        WHERE "scope" <> 'system';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    # Keys that were hashed for length stay hashed
+    return """
+        UPDATE "idempotencykey"
+        SET "key" = substr("key", length("scope") + length(coalesce("organization_id"::text, '-')) + 3)
+        WHERE "scope" <> 'system';"""
@@ -0,0 +1,15 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "idempotencykey" ADD "entity_id" UUID;
+        ALTER TABLE "idempotencykey" ADD "expires_at" TIMESTAMPTZ;
+        CREATE INDEX IF NOT EXISTS "idx_idempotency_expires_7a2be9" ON "idempotencykey" ("expires_at");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_idempotency_expires_7a2be9";
+        ALTER TABLE "idempotencykey" DROP COLUMN "expires_at";
+        ALTER TABLE "idempotencykey" DROP COLUMN "entity_id";"""
@@ -0,0 +1,15 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE INDEX IF NOT EXISTS "idx_spendevent_organiz_f1f8db" ON "spendevent" ("organization_id", "created_at", "id");
+        CREATE INDEX IF NOT EXISTS "idx_auditlog_organiz_750836" ON "auditlog" ("organization_id", "created_at", "id");
+        CREATE INDEX IF NOT EXISTS "idx_notificatio_recipie_06b936" ON "notification" ("recipient_id", "created_at", "id");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_notificatio_recipie_06b936";
+        DROP INDEX IF EXISTS "idx_auditlog_organiz_750836";
+        DROP INDEX IF EXISTS "idx_spendevent_organiz_f1f8db";"""
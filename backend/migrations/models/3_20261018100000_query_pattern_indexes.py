@@ -0,0 +1,29 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE INDEX IF NOT EXISTS "idx_spendevent_organiz_f6545b" ON "spendevent" ("organization_id", "user_id", "created_at");
+        CREATE INDEX IF NOT EXISTS "idx_spendevent_organiz_f1fc52" ON "spendevent" ("organization_id", "status", "created_at");
+        CREATE INDEX IF NOT EXISTS "idx_spendevent_organiz_7bee0c" ON "spendevent" ("organization_id", "category_id", "created_at");
+        CREATE INDEX IF NOT EXISTS "idx_spendevent_pending" ON "spendevent" ("organization_id", "created_at") WHERE status = 'pending';
+        CREATE INDEX IF NOT EXISTS "idx_spendevent_awaiting" ON "spendevent" ("organization_id", "created_at") WHERE status = 'awaiting_approval';
+        CREATE INDEX IF NOT EXISTS "idx_auditlog_organiz_dc6b7a" ON "auditlog" ("organization_id", "action", "created_at");
+        CREATE INDEX IF NOT EXISTS "idx_auditlog_organiz_0edfef" ON "auditlog" ("organization_id", "actor_id", "created_at");
+        CREATE INDEX IF NOT EXISTS "idx_auditlog_organiz_eddc66" ON "auditlog" ("organization_id", "entity_type", "entity_id");
+        CREATE INDEX IF NOT EXISTS "idx_notification_unread" ON "notification" ("recipient_id", "created_at") WHERE read = false;
+        CREATE INDEX IF NOT EXISTS "idx_policy_organiz_1eb73f" ON "policy" ("organization_id", "is_active");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_policy_organiz_1eb73f";
+        DROP INDEX IF EXISTS "idx_notification_unread";
+        DROP INDEX IF EXISTS "idx_auditlog_organiz_eddc66";
+        DROP INDEX IF EXISTS "idx_auditlog_organiz_0edfef";
+        DROP INDEX IF EXISTS "idx_auditlog_organiz_dc6b7a";
+        DROP INDEX IF EXISTS "idx_spendevent_awaiting";
+        DROP INDEX IF EXISTS "idx_spendevent_pending";
+        DROP INDEX IF EXISTS "idx_spendevent_organiz_7bee0c";
+        DROP INDEX IF EXISTS "idx_spendevent_organiz_f1fc52";
+        DROP INDEX IF EXISTS "idx_spendevent_organiz_f6545b";"""
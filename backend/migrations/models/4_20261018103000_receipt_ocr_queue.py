@@ -0,0 +1,24 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "receipt" ADD "ocr_status" VARCHAR(20) NOT NULL DEFAULT 'queued';
+        ALTER TABLE "receipt" ADD "ocr_attempts" INT NOT NULL DEFAULT 0;
+        ALTER TABLE "receipt" ADD "ocr_error" TEXT;
+        ALTER TABLE "receipt" ADD "ocr_next_attempt_at" TIMESTAMPTZ;
+        ALTER TABLE "receipt" ADD "ocr_locked_at" TIMESTAMPTZ;
+        UPDATE "receipt" SET "ocr_status" = 'done' WHERE "extracted_data" IS NOT NULL;
+        UPDATE "receipt" SET "ocr_status" = 'dead', "ocr_error" = 'Uploaded before the OCR queue; file was not kept'
+            WHERE "extracted_data" IS NULL;
+        CREATE INDEX IF NOT EXISTS "idx_receipt_ocr_sta_790294" ON "receipt" ("ocr_status", "ocr_next_attempt_at");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_receipt_ocr_sta_790294";
+        ALTER TABLE "receipt" DROP COLUMN "ocr_locked_at";
+        ALTER TABLE "receipt" DROP COLUMN "ocr_next_attempt_at";
+        ALTER TABLE "receipt" DROP COLUMN "ocr_error";
+        ALTER TABLE "receipt" DROP COLUMN "ocr_attempts";
+        ALTER TABLE "receipt" DROP COLUMN "ocr_status";"""
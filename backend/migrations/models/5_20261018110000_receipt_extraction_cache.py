@@ -0,0 +1,24 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "receipt" ADD "content_hash" VARCHAR(64);
+        CREATE INDEX IF NOT EXISTS "idx_receipt_content_b64db3" ON "receipt" ("content_hash");
+        CREATE TABLE IF NOT EXISTS "receiptextraction" (
+            "id" UUID NOT NULL PRIMARY KEY,
+            "created_at" TIMESTAMPTZ NOT NULL,
+            "updated_at" TIMESTAMPTZ NOT NULL,
+            "content_hash" VARCHAR(64) NOT NULL UNIQUE,
+            "result" JSONB NOT NULL,
+            "hits" INT NOT NULL DEFAULT 0,
+            "last_used_at" TIMESTAMPTZ NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS "idx_receiptextr_last_us_b35c81" ON "receiptextraction" ("last_used_at");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "receiptextraction";
+        DROP INDEX IF EXISTS "idx_receipt_content_b64db3";
+        ALTER TABLE "receipt" DROP COLUMN "content_hash";"""
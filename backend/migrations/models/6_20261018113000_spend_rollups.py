@@ -0,0 +1,46 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    # The backfill computes the same key as services.spend_rollup.RollupKey.hash
+    return """
+        CREATE TABLE IF NOT EXISTS "spendrollup" (
+            "id" UUID NOT NULL PRIMARY KEY,
+            "created_at" TIMESTAMPTZ NOT NULL,
+            "updated_at" TIMESTAMPTZ NOT NULL,
+            "key" VARCHAR(64) NOT NULL UNIQUE,
+            "period" DATE NOT NULL,
+            "category_id" UUID,
+            "team_id" UUID,
+            "vendor_id" UUID,
+            "currency" VARCHAR(10) NOT NULL,
+            "status" VARCHAR(50) NOT NULL,
+            "total" DECIMAL(18,2) NOT NULL DEFAULT 0,
+            "count" INT NOT NULL DEFAULT 0,
+            "organization_id" UUID NOT NULL REFERENCES "organization" ("id") ON DELETE CASCADE
+        );
+        CREATE INDEX IF NOT EXISTS "idx_spendrollup_organiz_d35f0b" ON "spendrollup" ("organization_id", "period");
+        INSERT INTO "spendrollup" (
+            "id", "created_at", "updated_at", "organization_id", "key", "period",
+            "category_id", "team_id", "vendor_id", "currency", "status", "total", "count"
+        )
+        SELECT gen_random_uuid(), now(), now(), "organization_id",
+            encode(sha256(convert_to(concat_ws('|',
+                "organization_id"::text,
+                to_char(date_trunc('month', "spend_date"), 'YYYY-MM-DD'),
+                coalesce("category_id"::text, ''),
+                coalesce("team_id"::text, ''),
+                coalesce("vendor_id"::text, ''),
+                "currency",
+                "status"
+            ), 'UTF8')), 'hex'),
+            date_trunc('month', "spend_date")::date,
+            "category_id", "team_id", "vendor_id", "currency", "status", sum("amount"), count(*)
+        FROM "spendevent"
+        GROUP BY "organization_id", date_trunc('month', "spend_date"),
+            "category_id", "team_id", "vendor_id", "currency", "status";"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "spendrollup";"""
@@ -0,0 +1,23 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "notificationcounter" (
+            "id" UUID NOT NULL PRIMARY KEY,
+            "created_at" TIMESTAMPTZ NOT NULL,
+            "updated_at" TIMESTAMPTZ NOT NULL,
+            "unread" INT NOT NULL DEFAULT 0,
+            "recipient_id" UUID NOT NULL UNIQUE REFERENCES "user" ("id") ON DELETE CASCADE
+        );
+        INSERT INTO "notificationcounter" ("id", "created_at", "updated_at", "recipient_id", "unread")
+        SELECT gen_random_uuid(), now(), now(), "recipient_id", count(*)
+        FROM "notification"
+        WHERE NOT "read"
+        GROUP BY "recipient_id"
+        ON CONFLICT ("recipient_id") DO NOTHING;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "notificationcounter";"""
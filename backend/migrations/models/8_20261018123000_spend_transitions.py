@@ -0,0 +1,21 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "spendtransition" (
+            "id" UUID NOT NULL PRIMARY KEY,
+            "created_at" TIMESTAMPTZ NOT NULL,
+            "updated_at" TIMESTAMPTZ NOT NULL,
+            "from_status" VARCHAR(50) NOT NULL,
+            "to_status" VARCHAR(50) NOT NULL,
+            "reason" VARCHAR(50),
+            "actor_id" UUID REFERENCES "user" ("id") ON DELETE SET NULL,
+            "spend_event_id" UUID NOT NULL REFERENCES "spendevent" ("id") ON DELETE CASCADE
+        );
+        CREATE INDEX IF NOT EXISTS "idx_spendtransi_spend_e_59390f" ON "spendtransition" ("spend_event_id", "created_at");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "spendtransition";"""
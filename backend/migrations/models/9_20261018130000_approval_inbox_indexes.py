@@ -0,0 +1,13 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE INDEX IF NOT EXISTS "idx_approval_approve_5f2296" ON "approval" ("approver_id", "status", "created_at", "id");
+        CREATE INDEX IF NOT EXISTS "idx_receipt_spend_e_229ec3" ON "receipt" ("spend_event_id", "created_at");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_receipt_spend_e_229ec3";
+        DROP INDEX IF EXISTS "idx_approval_approve_5f2296";"""
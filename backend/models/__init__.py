@@ -6,11 +6,14 @@ from .models import (
     Vendor,
     Category,
     SpendEvent,
+    SpendTransition,
+    SpendRollup,
     Receipt,
     Policy,
     PolicyRule,
     Approval,
     IdempotencyKey,
     Notification,
+    NotificationCounter,
     AuditLog,
 )
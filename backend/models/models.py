@@ -1,6 +1,7 @@
 import uuid
 from tortoise import fields, models
 from tortoise.models import Model
+from tortoise.indexes import PartialIndex
 from fastadmin import TortoiseModelAdmin, WidgetType, register
 import typing as tp
 import bcrypt, sys, inspect
@@ -127,6 +128,72 @@ class SpendEvent(BaseModel):
 
     raw_metadata = fields.JSONField(null=True)
 
+    class Meta:
+        indexes = (
+            # Keyset pagination: newest first within an organization
+            ("organization_id", "created_at", "id"),
+            # list_spends filters (own spends, status, category)
+            ("organization_id", "user_id", "created_at"),
+            ("organization_id", "status", "created_at"),
+            ("organization_id", "category_id", "created_at"),
+            # Small indexes over the open work queues
+            PartialIndex(
+                fields=("organization_id", "created_at"),
+                condition={"status": "pending"},
+                name="idx_spendevent_pending"
+            ),
+            PartialIndex(
+                fields=("organization_id", "created_at"),
+                condition={"status": "awaiting_approval"},
+                name="idx_spendevent_awaiting"
+            ),
+        )
+
+
+class SpendTransition(BaseModel):
+    # Status history of a spend, written by spend_state.transition_spend
+    spend_event = fields.ForeignKeyField(
+        "models.SpendEvent",
+        related_name="transitions",
+        on_delete=fields.CASCADE
+    )
+    from_status = fields.CharField(max_length=50)
+    to_status = fields.CharField(max_length=50)
+    actor = fields.ForeignKeyField(
+        "models.User",
+        related_name="spend_transitions",
+        on_delete=fields.SET_NULL,
+        null=True
+    )
+    reason = fields.CharField(max_length=50, null=True)  # e.g. "policy", "approval"
+
+    class Meta:
+        indexes = (("spend_event_id", "created_at"),)
+
+
+# Running totals per (organization, month, category, team, vendor, currency,
+# status), kept in step with SpendEvent by services/spend_rollup.py. The
+# dimension ids are plain columns: NULL means "none", and `key` (a hash of
+# all dimensions) is what upserts conflict on, since NULLs never collide.
+class SpendRollup(BaseModel):
+    organization = fields.ForeignKeyField(
+        "models.Organization",
+        related_name="spend_rollups",
+        on_delete=fields.CASCADE
+    )
+    key = fields.CharField(max_length=64, unique=True)
+    period = fields.DateField()  # first day of the month
+    category_id = fields.UUIDField(null=True)
+    team_id = fields.UUIDField(null=True)
+    vendor_id = fields.UUIDField(null=True)
+    currency = fields.CharField(max_length=10)
+    status = fields.CharField(max_length=50)
+    total = fields.DecimalField(max_digits=18, decimal_places=2, default=0)
+    count = fields.IntField(default=0)
+
+    class Meta:
+        indexes = (("organization_id", "period"),)
+
 
 class Receipt(BaseModel):
     spend_event = fields.ForeignKeyField(
@@ -135,9 +202,33 @@ class Receipt(BaseModel):
         on_delete=fields.CASCADE
     )
     file_url = fields.TextField()
+    # SHA-256 of the file: extraction cache key and duplicate-upload lookup
+    content_hash = fields.CharField(max_length=64, null=True, index=True)
     extracted_data = fields.JSONField(null=True)
     is_verified = fields.BooleanField(default=False)
 
+    # OCR job state, worked off by worker.py (see services/ocr_queue.py)
+    ocr_status = fields.CharField(max_length=20, default="queued")
+    ocr_attempts = fields.IntField(default=0)
+    ocr_error = fields.TextField(null=True)
+    ocr_next_attempt_at = fields.DatetimeField(null=True)
+    ocr_locked_at = fields.DatetimeField(null=True)
+
+    class Meta:
+        indexes = (
+            ("ocr_status", "ocr_next_attempt_at"),
+            # Receipts prefetched for a page of spends
+            ("spend_event_id", "created_at"),
+        )
+
+
+# Extraction results by file content, shared by every upload of the same bytes
+class ReceiptExtraction(BaseModel):
+    content_hash = fields.CharField(max_length=64, unique=True)
+    result = fields.JSONField()
+    hits = fields.IntField(default=0)
+    last_used_at = fields.DatetimeField(index=True)
+
 
 class Policy(BaseModel):
     organization = fields.ForeignKeyField(
@@ -148,6 +239,9 @@ class Policy(BaseModel):
     name = fields.CharField(max_length=255)
     is_active = fields.BooleanField(default=True)
 
+    class Meta:
+        indexes = (("organization_id", "is_active"),)
+
 
 class PolicyRule(BaseModel):
     policy = fields.ForeignKeyField(
@@ -175,6 +269,10 @@ class Approval(BaseModel):
     status = fields.CharField(max_length=50)
     comment = fields.TextField(null=True)
 
+    class Meta:
+        # Approver inbox: own approvals by status, newest first
+        indexes = (("approver_id", "status", "created_at", "id"),)
+
 class IdempotencyKey(BaseModel):
     organization = fields.ForeignKeyField(
         "models.Organization",
@@ -184,6 +282,8 @@ class IdempotencyKey(BaseModel):
     )
     key = fields.CharField(max_length=255, unique=True)
     scope = fields.CharField(max_length=100)
+    entity_id = fields.UUIDField(null=True)  # Result of the request that claimed the key
+    expires_at = fields.DatetimeField(null=True, index=True)  # Null keys never expire
 
 class Notification(BaseModel):
     organization = fields.ForeignKeyField(
@@ -201,6 +301,28 @@ class Notification(BaseModel):
     read = fields.BooleanField(default=False)
     metadata = fields.JSONField(null=True)  # Optional extra info (e.g., spend_id)
 
+    class Meta:
+        indexes = (
+            ("recipient_id", "created_at", "id"),
+            # Unread badge and unread_only listing
+            PartialIndex(
+                fields=("recipient_id", "created_at"),
+                condition={"read": False},
+                name="idx_notification_unread"
+            ),
+        )
+
+
+class NotificationCounter(BaseModel):
+    # Unread notifications per recipient, kept in step with Notification.read
+    # by services.notification_service, so the badge is one row read
+    recipient = fields.OneToOneField(
+        "models.User",
+        related_name="notification_counter",
+        on_delete=fields.CASCADE
+    )
+    unread = fields.IntField(default=0)
+
 
 class AuditLog(BaseModel):
 
@@ -220,6 +342,15 @@ class AuditLog(BaseModel):
     action = fields.CharField(max_length=100)
     metadata = fields.JSONField(null=True)
 
+    class Meta:
+        indexes = (
+            ("organization_id", "created_at", "id"),
+            # list_audit_logs filters and per-entity history
+            ("organization_id", "action", "created_at"),
+            ("organization_id", "actor_id", "created_at"),
+            ("organization_id", "entity_type", "entity_id"),
+        )
+
     """
     For future auto mapping
     class VendorCategoryMap(BaseModel):
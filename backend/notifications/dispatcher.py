@@ -0,0 +1,350 @@
+"""
+Outbound email dispatcher.
+
+Request handlers only enqueue(); delivery happens in a background task:
+
+- emails to the same recipient of the same kind are coalesced for
+  NOTIFY_DIGEST_WINDOW_SECONDS (or until NOTIFY_DIGEST_MAX_ITEMS) and sent
+  as one digest ("5 spends need your approval")
+- messages go out over up to SMTP_POOL_SIZE persistent SMTP connections,
+  so connect, STARTTLS and login happen once per connection, not per email
+- a failed send is retried with jittered backoff, up to
+  NOTIFY_MAX_ATTEMPTS, without holding anything else up
+
+The queue is in memory, like the audit writer's: stop_dispatcher() sends
+whatever is pending. With SMTP_HOST unset emails are dropped (and counted).
+scripts/smtp_sink.py is a local SMTP server to point this at in dev.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from email.message import EmailMessage
+
+import aiosmtplib
+
+logger = logging.getLogger(__name__)
+
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_START_TLS = os.getenv("SMTP_START_TLS", "true").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT_SECONDS", 30))
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 2))
+# Pooled connections idle for longer than this are checked with NOOP before reuse
+SMTP_IDLE_CHECK = float(os.getenv("SMTP_IDLE_CHECK_SECONDS", 30))
+FROM_EMAIL = os.getenv("FROM_EMAIL", "no-reply@demo.com")
+
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", 10000))
+# Also how long a lone email waits, so keep it short; bursts land within seconds
+NOTIFY_DIGEST_WINDOW = float(os.getenv("NOTIFY_DIGEST_WINDOW_SECONDS", 5))
+NOTIFY_DIGEST_MAX_ITEMS = int(os.getenv("NOTIFY_DIGEST_MAX_ITEMS", 50))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", 5))
+NOTIFY_RETRY_BASE = float(os.getenv("NOTIFY_RETRY_BASE_SECONDS", 5))
+NOTIFY_RETRY_MAX = float(os.getenv("NOTIFY_RETRY_MAX_SECONDS", 300))
+
+
+@dataclass
+class OutboundEmail:
+    to: str
+    kind: str  # picks the renderer, and what gets coalesced together
+    item: dict
+    recipient_name: str | None = None
+
+
+@dataclass
+class Digest:
+    to: str
+    kind: str
+    recipient_name: str | None
+    due: float
+    items: list = field(default_factory=list)
+    attempts: int = 0
+
+
+# kind -> render(digest) -> (subject, body). See notifications/service.py
+_renderers = {}
+
+
+def register_renderer(kind: str, render):
+    _renderers[kind] = render
+
+
+def build_message(digest: Digest) -> EmailMessage:
+    subject, body = _renderers[digest.kind](digest)
+    msg = EmailMessage()
+    msg["From"] = FROM_EMAIL
+    msg["To"] = digest.to
+    msg["Subject"] = subject
+    msg.set_content(body)
+    return msg
+
+
+class SmtpPool:
+    """
+    Up to `size` logged-in SMTP connections, reused across sends.
+    """
+
+    def __init__(self, size: int = SMTP_POOL_SIZE, **options):
+        self.options = {
+            "hostname": SMTP_HOST,
+            "port": SMTP_PORT,
+            "username": SMTP_USER,
+            "password": SMTP_PASSWORD,
+            "start_tls": SMTP_START_TLS,
+            "timeout": SMTP_TIMEOUT,
+            **options,
+        }
+        self._slots = asyncio.Semaphore(size)
+        self._idle: list[tuple[aiosmtplib.SMTP, float]] = []
+        self.stats = {"connects": 0, "reused": 0, "discarded": 0}
+
+    async def _checkout(self) -> aiosmtplib.SMTP:
+        while self._idle:
+            client, last_used = self._idle.pop()
+            if not client.is_connected:
+                self.stats["discarded"] += 1
+                continue
+            if time.monotonic() - last_used > SMTP_IDLE_CHECK:
+                # Servers drop idle sessions; find out now rather than mid-send
+                try:
+                    await client.noop()
+                except aiosmtplib.SMTPException:
+                    self.stats["discarded"] += 1
+                    await self._close(client)
+                    continue
+            self.stats["reused"] += 1
+            return client
+
+        client = aiosmtplib.SMTP(**self.options)
+        await client.connect()
+        self.stats["connects"] += 1
+        return client
+
+    @asynccontextmanager
+    async def connection(self):
+        async with self._slots:
+            client = await self._checkout()
+            try:
+                yield client
+            except BaseException:
+                # The session may be mid-transaction; don't hand it out again
+                self.stats["discarded"] += 1
+                await self._close(client)
+                raise
+            self._idle.append((client, time.monotonic()))
+
+    async def _close(self, client):
+        try:
+            if client.is_connected:
+                await client.quit()
+        except Exception:
+            client.close()
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for client, _ in idle:
+            await self._close(client)
+
+
+class NotificationDispatcher:
+    def __init__(
+        self,
+        pool: SmtpPool,
+        *,
+        queue_size: int = NOTIFY_QUEUE_SIZE,
+        window: float = NOTIFY_DIGEST_WINDOW,
+        max_items: int = NOTIFY_DIGEST_MAX_ITEMS,
+        max_attempts: int = NOTIFY_MAX_ATTEMPTS
+    ):
+        self.pool = pool
+        self.window = window
+        self.max_items = max_items
+        self.max_attempts = max_attempts
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._digests: OrderedDict[tuple[str, str], Digest] = OrderedDict()
+        self._sending: set[asyncio.Task] = set()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self._stop_event = asyncio.Event()
+        self.stats = {
+            "queued": 0,
+            "dropped": 0,
+            "sent": 0,
+            "digests": 0,
+            "coalesced": 0,
+            "retries": 0,
+            "failed": 0,
+        }
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Sends everything pending, one attempt each, then stops.
+        """
+        if self._task is None:
+            return
+        self._stopping = True
+        self._stop_event.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        while not self._queue.empty():
+            self._add(self._queue.get_nowait())
+        digests = list(self._digests.values())
+        self._digests.clear()
+        for digest in digests:
+            self._spawn(digest)
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+        await self.pool.close()
+
+    def enqueue(self, email: OutboundEmail):
+        """
+        Never blocks: when the queue is full the email is dropped and counted.
+        """
+        try:
+            self._queue.put_nowait(email)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            logger.warning("Notification queue full, dropping %s email to %s", email.kind, email.to)
+            return
+        self.stats["queued"] += 1
+
+    def _add(self, email: OutboundEmail):
+        key = (email.to, email.kind)
+        digest = self._digests.get(key)
+        if digest is None:
+            digest = self._digests[key] = Digest(
+                to=email.to,
+                kind=email.kind,
+                recipient_name=email.recipient_name,
+                due=time.monotonic() + self.window
+            )
+        else:
+            self.stats["coalesced"] += 1
+        digest.items.append(email.item)
+        if len(digest.items) >= self.max_items:
+            digest.due = 0
+
+    async def _run(self):
+        # stop() also cancels us, but wait_for() can swallow a cancel that
+        # races with a get() completing
+        while not self._stopping:
+            now = time.monotonic()
+            for key in [key for key, digest in self._digests.items() if digest.due <= now]:
+                self._spawn(self._digests.pop(key))
+
+            timeout = None
+            if self._digests:
+                timeout = max(0.0, min(d.due for d in self._digests.values()) - time.monotonic())
+            try:
+                email = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                continue
+            self._add(email)
+
+    def _spawn(self, digest: Digest):
+        task = asyncio.create_task(self._deliver(digest))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _deliver(self, digest: Digest):
+        if not self.pool.options["hostname"]:
+            self.stats["dropped"] += len(digest.items)
+            logger.info("SMTP_HOST is not configured, not sending %s email to %s", digest.kind, digest.to)
+            return
+
+        while True:
+            digest.attempts += 1
+            try:
+                message = build_message(digest)
+                async with self.pool.connection() as smtp:
+                    await smtp.send_message(message)
+            except Exception as e:
+                # A refused address or a broken template won't fix itself
+                permanent = isinstance(e, (aiosmtplib.SMTPRecipientsRefused, KeyError, ValueError))
+                if permanent or digest.attempts >= self.max_attempts or self._stopping:
+                    self.stats["failed"] += 1
+                    logger.error("Giving up on %s email to %s after %s attempts: %s",
+                                 digest.kind, digest.to, digest.attempts, e)
+                    return
+                self.stats["retries"] += 1
+                delay = min(NOTIFY_RETRY_MAX, NOTIFY_RETRY_BASE * 2 ** (digest.attempts - 1))
+                try:
+                    # Shutdown cuts the wait short for one last attempt
+                    await asyncio.wait_for(self._stop_event.wait(), random.uniform(delay / 2, delay))
+                except asyncio.TimeoutError:
+                    pass
+                # Anything that queued up for this recipient meanwhile rides along
+                pending = self._digests.pop((digest.to, digest.kind), None)
+                if pending:
+                    digest.items.extend(pending.items)
+                continue
+
+            self.stats["sent"] += 1
+            if len(digest.items) > 1:
+                self.stats["digests"] += 1
+            return
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "queue_depth": self._queue.qsize(),
+            "pending_digests": len(self._digests),
+            "sending": len(self._sending),
+            "smtp": self.pool.stats,
+            "running": self._task is not None,
+        }
+
+
+_dispatcher: NotificationDispatcher | None = None
+
+
+def start_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = NotificationDispatcher(SmtpPool())
+        _dispatcher.start()
+
+
+async def stop_dispatcher():
+    global _dispatcher
+    if _dispatcher is not None:
+        await _dispatcher.stop()
+        _dispatcher = None
+
+
+def dispatcher_stats() -> dict:
+    return _dispatcher.metrics() if _dispatcher else {"running": False}
+
+
+async def send_email(email: OutboundEmail):
+    """
+    Queues the email. Scripts that never started the dispatcher send it
+    inline, on its own connection.
+    """
+    if _dispatcher is not None:
+        _dispatcher.enqueue(email)
+        return
+    if not SMTP_HOST:
+        logger.info("SMTP_HOST is not configured, not sending %s email to %s", email.kind, email.to)
+        return
+    digest = Digest(to=email.to, kind=email.kind, recipient_name=email.recipient_name, due=0, items=[email.item])
+    pool = SmtpPool(size=1)
+    try:
+        async with pool.connection() as smtp:
+            await smtp.send_message(build_message(digest))
+    finally:
+        await pool.close()
@@ -1,48 +1,71 @@
-from models.models import User, Approval
-import os
-import aiosmtplib
-from email.message import EmailMessage
+from models.models import User, SpendEvent
+from notifications.dispatcher import Digest, OutboundEmail, register_renderer, send_email
 
-SMTP_HOST = os.getenv("SMTP_HOST")
-SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
-SMTP_USER = os.getenv("SMTP_USER")
-SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
-FROM_EMAIL = os.getenv("FROM_EMAIL", "no-reply@demo.com")
+APPROVAL_REQUESTED = "approval_requested"
+# Spends listed in a digest; the rest are summed up in one line
+DIGEST_LIST_LIMIT = 20
 
 
-async def send_approval_notification(approval: Approval):
-    approver: User = approval.approver
-    spend = approval.spend_event
-
+async def send_approval_notification(approver: User, spend: SpendEvent, submitter: User | None = None):
+    """
+    Queues the approval email; returns without waiting for SMTP.
+    """
     if not approver or not approver.email:
         return
 
-    msg = EmailMessage()
-    msg["From"] = FROM_EMAIL
-    msg["To"] = approver.email
-    msg["Subject"] = "Approval required for spend"
+    # Pass the submitter in: spend.user is only there if it was fetched
+    if submitter is None and isinstance(spend.user, User):
+        submitter = spend.user
+    await send_email(OutboundEmail(
+        to=approver.email,
+        kind=APPROVAL_REQUESTED,
+        recipient_name=approver.full_name,
+        item={
+            "amount": str(spend.amount),
+            "currency": spend.currency,
+            "description": spend.description,
+            "submitted_by": submitter.full_name if submitter else None,
+        }
+    ))
+
 
-    msg.set_content(
-        f"""
-Hello {approver.full_name},
+def _render_approval(digest: Digest) -> tuple[str, str]:
+    items = digest.items
+    if len(items) == 1:
+        item = items[0]
+        return "Approval required for spend", f"""
+Hello {digest.recipient_name},
 
 A spend requires your approval.
 
-Amount: {spend.amount} {spend.currency}
-Description: {spend.description or "N/A"}
-Submitted by: {spend.user.full_name if spend.user else "Unknown"}
+Amount: {item["amount"]} {item["currency"]}
+Description: {item["description"] or "N/A"}
+Submitted by: {item["submitted_by"] or "Unknown"}
+
+Please log in to review and approve.
+
+Thanks
+"""
+
+    lines = [
+        f"- {item['amount']} {item['currency']}: {item['description'] or 'N/A'}"
+        f" ({item['submitted_by'] or 'Unknown'})"
+        for item in items[:DIGEST_LIST_LIMIT]
+    ]
+    if len(items) > DIGEST_LIST_LIMIT:
+        lines.append(f"- and {len(items) - DIGEST_LIST_LIMIT} more")
+    listing = "\n".join(lines)
+    return f"{len(items)} spends need your approval", f"""
+Hello {digest.recipient_name},
+
+{len(items)} spends require your approval:
+
+{listing}
 
 Please log in to review and approve.
 
 Thanks
 """
-    )
-
-    await aiosmtplib.send(
-        msg,
-        hostname=SMTP_HOST,
-        port=SMTP_PORT,
-        username=SMTP_USER,
-        password=SMTP_PASSWORD,
-        start_tls=True
-    )
+
+
+register_renderer(APPROVAL_REQUESTED, _render_approval)
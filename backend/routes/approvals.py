@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from models.models import Approval
-from services.approval_service import resolve_approval
-from auth.dependencies import get_current_user
+from services.approval_service import approval_inbox, resolve_approval, resolve_approvals
+from auth.dependencies import get_current_user, replica_reads
 from auth.permissions import require_role
 from auth.roles import Role
 from services.notification_service import create_notification
@@ -14,6 +15,40 @@ class ApprovalDecisionRequest(BaseModel):
     comment: str | None = None
 
 
+class ApprovalBatchItem(BaseModel):
+    approval_id: UUID
+    approved: bool
+    comment: str | None = None
+
+
+class ApprovalBatchRequest(BaseModel):
+    decisions: list[ApprovalBatchItem]
+
+
+@router.get("/inbox", dependencies=[Depends(replica_reads)])
+async def get_approval_inbox(
+    user=Depends(require_role(Role.MANAGER, Role.FINANCE)),
+    status: str | None = Query("pending"),
+    category_id: UUID | None = None,
+    submitted_by: UUID | None = None,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: str | None = None,
+    include_total: bool | None = None
+):
+    try:
+        return await approval_inbox(
+            user,
+            status=status,
+            category_id=category_id,
+            submitted_by=submitted_by,
+            limit=limit,
+            cursor=cursor,
+            include_total=include_total
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.post("/{approval_id}/decision")
 async def decide_approval(
     approval_id: str,
@@ -28,10 +63,28 @@ async def decide_approval(
     if approval.approver_id != user.id:
         raise HTTPException(status_code=403, detail="Not allowed")
 
-    await resolve_approval(
+    resolved = await resolve_approval(
         approval=approval,
         approved=payload.approved,
         comment=payload.comment
     )
+    if not resolved:
+        raise HTTPException(status_code=409, detail="Approval was already decided or the spend has moved on")
 
     return {"status": "ok"}
+
+
+@router.post("/decisions")
+async def decide_approvals(
+    payload: ApprovalBatchRequest,
+    user=Depends(require_role(Role.MANAGER, Role.FINANCE))
+):
+    """
+    Decides up to MAX_DECISION_BATCH approvals in one request. Always 200;
+    each decision gets its own outcome.
+    """
+    try:
+        results = await resolve_approvals(user, [item.model_dump() for item in payload.decisions])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"results": results}
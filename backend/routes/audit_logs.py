@@ -1,20 +1,14 @@
 from fastapi import APIRouter, Depends, Query, HTTPException
-from auth.dependencies import get_current_user
+from auth.dependencies import get_current_user, replica_reads
 from auth.roles import Role
 from models.models import AuditLog
 from auth.permissions import require_role
+from services.pagination import keyset_page
+from services.export import AUDIT_LOG_EXPORT_COLUMNS, stream_export
+from fastapi.responses import StreamingResponse
 router = APIRouter(prefix="/audit-logs", tags=["Audit Logs"])
 
-@router.get("")
-async def list_audit_logs(
-    user=Depends(require_role(Role.ADMIN)),
-    limit: int = Query(50, ge=1, le=100),
-    offset: int = Query(0, ge=0),
-    action: str | None = None,
-    entity_type: str | None = None,
-    actor_id: str | None = None
-):
-
+def _audit_logs(user, action=None, entity_type=None, actor_id=None):
     qs = AuditLog.filter(organization=user.organization)
 
     if action:
@@ -26,17 +20,55 @@ async def list_audit_logs(
     if actor_id:
         qs = qs.filter(actor_id=actor_id)
 
-    total = await qs.count()
-    logs = await qs.limit(limit).offset(offset).order_by("-id")
+    return qs
+
+
+@router.get("", dependencies=[Depends(replica_reads)])
+async def list_audit_logs(
+    user=Depends(require_role(Role.ADMIN)),
+    limit: int = Query(50, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    cursor: str | None = None,
+    include_total: bool | None = None,
+    action: str | None = None,
+    entity_type: str | None = None,
+    actor_id: str | None = None
+):
+
+    qs = _audit_logs(user, action=action, entity_type=entity_type, actor_id=actor_id)
+    try:
+        page = await keyset_page(qs, limit=limit, cursor=cursor, offset=offset, include_total=include_total)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     return {
-        "total": total,
-        "limit": limit,
-        "offset": offset,
-        "items": logs,
+        **page,
         "user": {
             "id": str(user.id),
             "username": user.username,
             "email": user.email
         }
     }
+
+
+@router.get("/export", dependencies=[Depends(replica_reads)])
+async def export_audit_logs(
+    user=Depends(require_role(Role.ADMIN)),
+    format: str = Query("csv", description="csv or parquet"),
+    action: str | None = None,
+    entity_type: str | None = None,
+    actor_id: str | None = None
+):
+    """
+    All matching audit log entries in one streamed file; same filters as the list.
+    """
+    qs = _audit_logs(user, action=action, entity_type=entity_type, actor_id=actor_id)
+    try:
+        stream, media_type = stream_export(qs, AUDIT_LOG_EXPORT_COLUMNS, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        stream,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="audit-logs.{format}"'}
+    )
@@ -1,6 +1,6 @@
 import os
 from fastapi import APIRouter, Request, HTTPException, status, Header
-from services.idempotency_service import is_duplicate
+from services.idempotency_service import claim_key, release_key
 from services.user_service import (
     create_user_from_auth0,
     handle_organization_deleted,
@@ -54,9 +54,19 @@ async def handle_auth0_webhook(
         )
 
     # Idempotency Check: Don't process the same event twice
-    if event_id and await is_duplicate(event_id):
+    if event_id and not (await claim_key(event_id, scope="auth0_event")).acquired:
         return {"status": "duplicate", "event_id": event_id}
 
+    try:
+        return await _route_user_event(event_type, user_data)
+    except Exception:
+        # Auth0 retries failed deliveries; let the retry through
+        if event_id:
+            await release_key(event_id, scope="auth0_event")
+        raise
+
+
+async def _route_user_event(event_type: str, user_data: dict):
     # Event Routing Logic
     match event_type:
         case "user.created":
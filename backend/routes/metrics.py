@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends
+from auth.permissions import require_role
+from auth.roles import Role
+from auth.user_cache import user_cache_stats
+from auth.verifier import token_verifier_stats
+from db import pool_stats, replica_stats
+from notifications.dispatcher import dispatcher_stats
+from services.audit_service import audit_writer_stats
+from services.extraction_cache import extraction_cache_stats
+from services.notification_hub import notification_hub_stats
+from services.ocr_queue import ocr_queue_stats
+from services.policy_cache import policy_cache_stats
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+@router.get("")
+async def get_metrics(user=Depends(require_role(Role.ADMIN))):
+    return {
+        "policy_cache": policy_cache_stats(),
+        "audit_writer": audit_writer_stats(),
+        "user_cache": user_cache_stats(),
+        "token_verifier": token_verifier_stats(),
+        "ocr_queue": await ocr_queue_stats(),
+        "extraction_cache": await extraction_cache_stats(),
+        "db_pool": pool_stats(),
+        "db_routing": replica_stats(),
+        "notifications": dispatcher_stats(),
+        "notification_stream": notification_hub_stats(),
+    }
@@ -1,18 +1,133 @@
-from fastapi import APIRouter, Depends, Query
-from auth.dependencies import get_current_user
+import json
+import os
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from auth.dependencies import get_current_user, replica_reads
 from models.models import Notification
-from services.notification_service import list_notifications, mark_notification_as_read
+from services.notification_hub import SSE_REPLAY_LIMIT, get_hub, is_seen, replay_after
+from services.pagination import decode_cursor
+from services.notification_service import (
+    list_notifications,
+    mark_notification_as_read,
+    mark_notifications_as_read,
+    unread_count
+)
+
+# Comment lines sent on idle streams, so proxies don't time them out
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", 15))
+SSE_RETRY_MS = int(os.getenv("SSE_RETRY_MS", 3000))
 
 router = APIRouter(prefix="/notifications", tags=["Notifications"])
 
-@router.get("")
+@router.get("", dependencies=[Depends(replica_reads)])
 async def get_notifications(
     user=Depends(get_current_user),
     unread_only: bool = Query(False),
     limit: int = Query(50, ge=1, le=100),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: str | None = None,
+    include_total: bool | None = None
 ):
-    return await list_notifications(user=user, unread_only=unread_only, limit=limit, offset=offset)
+    try:
+        return await list_notifications(
+            user=user,
+            unread_only=unread_only,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+            include_total=include_total
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+class NotificationReadRequest(BaseModel):
+    ids: list[UUID] | None = None
+    all: bool = False
+
+
+@router.get("/unread-count")
+async def get_unread_count(user=Depends(get_current_user)):
+    """
+    Badge count, read from the maintained counter rather than count().
+    """
+    return {"unread": await unread_count(user)}
+
+
+@router.post("/read")
+async def read_notifications(payload: NotificationReadRequest, user=Depends(get_current_user)):
+    """
+    Marks `ids`, or with `all` every notification, read in one UPDATE.
+    """
+    if payload.all == (payload.ids is not None):
+        raise HTTPException(status_code=400, detail="Pass either ids or all")
+    try:
+        updated = await mark_notifications_as_read(user, ids=None if payload.all else payload.ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "ok", "updated": updated, "unread": await unread_count(user)}
+
+
+def _sse(event: dict) -> str:
+    return f"id: {event['cursor']}\nevent: notification\ndata: {json.dumps(event)}\n\n"
+
+
+@router.get("/stream")
+async def stream_notifications(
+    user=Depends(get_current_user),
+    last_event_id: str | None = Header(None),
+    cursor: str | None = None
+):
+    """
+    Server-Sent Events: one `notification` event per new notification.
+    Each event id is a cursor; on reconnect, the Last-Event-ID header (or
+    `cursor`, for the first connection) replays what was missed.
+    Replays read from the primary: a lagging replica could skip rows.
+    """
+    hub = get_hub()
+    if hub is None:
+        raise HTTPException(status_code=503, detail="Notification stream is not available")
+
+    resume_from = last_event_id or cursor
+    if resume_from:
+        try:
+            decode_cursor(resume_from)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # Subscribe before replaying, so nothing falls between the two
+    subscription = hub.subscribe(user.id)
+
+    async def events():
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            last = None
+            position = resume_from
+            while position:
+                replayed = await replay_after(user.id, position)
+                for event in replayed:
+                    yield _sse(event)
+                if replayed:
+                    last = decode_cursor(replayed[-1]["cursor"])
+                position = replayed[-1]["cursor"] if len(replayed) == SSE_REPLAY_LIMIT else None
+
+            while not subscription.closed.is_set():
+                event = await subscription.next_event(SSE_HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": keepalive\n\n"
+                elif not is_seen(event, last):
+                    yield _sse(event)
+        finally:
+            hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 
 @router.post("/{notification_id}/read")
 async def read_notification(notification_id: str, user=Depends(get_current_user)):
@@ -1,3 +1,4 @@
+import json
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional
@@ -5,6 +6,8 @@ from models.models import Policy, PolicyRule
 from auth.dependencies import get_current_user
 from auth.roles import Role
 from auth.permissions import require_role
+from services.policy_cache import invalidate_policies
+from services.policy_conditions import compile_condition
 router = APIRouter(prefix="/policies", tags=["Policies"])
 
 #  Request/Response schemas
@@ -24,9 +27,18 @@ class PolicyResponse(BaseModel):
     is_active: bool
     rules: List[PolicyRuleCreateRequest]
 
+def _validate_rules(rules: List[PolicyRuleCreateRequest]):
+    for rule in rules:
+        try:
+            condition = json.loads(rule.condition) if rule.condition.strip() else {}
+            compile_condition(condition)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid rule condition: {e}")
+
 #  Routes 
 @router.post("", response_model=PolicyResponse)
 async def create_policy(payload: PolicyCreateRequest, user=Depends(require_role(Role.FINANCE,Role.ADMIN))):
+    _validate_rules(payload.rules or [])
     policy = await Policy.create(
         name=payload.name,
         is_active=payload.is_active,
@@ -41,6 +53,8 @@ async def create_policy(payload: PolicyCreateRequest, user=Depends(require_role(
             priority=rule_req.priority
         )
 
+    invalidate_policies(policy.organization_id)
+
     return PolicyResponse(
         id=str(policy.id),
         name=policy.name,
@@ -62,6 +76,7 @@ async def update_policy(policy_id: str, payload: PolicyCreateRequest, user=Depen
     policy = await Policy.get_or_none(id=policy_id, organization=user.organization)
     if not policy:
         raise HTTPException(status_code=404, detail="Policy not found")
+    _validate_rules(payload.rules or [])
 
     policy.name = payload.name
     policy.is_active = payload.is_active
@@ -77,6 +92,8 @@ async def update_policy(policy_id: str, payload: PolicyCreateRequest, user=Depen
             priority=rule_req.priority
         )
 
+    invalidate_policies(policy.organization_id)
+
     return PolicyResponse(
         id=str(policy.id),
         name=policy.name,
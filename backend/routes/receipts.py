@@ -1,6 +1,8 @@
-from fastapi import APIRouter, BackgroundTasks, UploadFile, Depends
-from models.models import SpendEvent
+from fastapi import APIRouter, HTTPException, UploadFile, Depends
+from models.models import Receipt, SpendEvent
 from services.receipt_service import attach_receipt
+from services.blob_store import BLOB_CHUNK_SIZE, BlobTooLarge
+from services.extraction_cache import find_duplicate_receipts
 from auth.dependencies import get_current_user
 from pydantic import BaseModel
 
@@ -9,21 +11,52 @@ class ReceiptUploadRequest(BaseModel):
     spend_id: str
     file_url: str
 
+async def _read_chunks(file: UploadFile):
+    # At most one chunk of the upload is held in memory at a time
+    while chunk := await file.read(BLOB_CHUNK_SIZE):
+        yield chunk
+
+
 @router.post("")
-async def upload_receipt(file: UploadFile, spend_id: str, background_tasks: BackgroundTasks, user=Depends(get_current_user)):
-    spend = await SpendEvent.get_or_none(id=spend_id)
+async def upload_receipt(file: UploadFile, spend_id: str, user=Depends(get_current_user)):
+    spend = await SpendEvent.get_or_none(id=spend_id, organization_id=user.organization_id)
     if not spend:
         raise HTTPException(status_code=404, detail="Spend event not found")
 
     try:
-        file_bytes = await file.read()
-
+        # OCR runs in worker.py; poll GET /receipts/{id} for ocr_status
         receipt = await attach_receipt(
             spend=spend,
-            file_bytes=file_bytes,
-            background_tasks=background_tasks
+            file_chunks=_read_chunks(file)
         )
 
         return receipt
+    except BlobTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to upload receipt: {e}")
+
+
+@router.get("/{receipt_id}")
+async def get_receipt(receipt_id: str, user=Depends(get_current_user)):
+    receipt = await Receipt.get_or_none(
+        id=receipt_id,
+        spend_event__organization_id=user.organization_id
+    )
+    if not receipt:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    return receipt
+
+
+@router.get("/{receipt_id}/duplicates")
+async def get_receipt_duplicates(receipt_id: str, user=Depends(get_current_user)):
+    """
+    Other receipts of the organization uploaded with the exact same file.
+    """
+    receipt = await Receipt.get_or_none(
+        id=receipt_id,
+        spend_event__organization_id=user.organization_id
+    )
+    if not receipt:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    return await find_duplicate_receipts(receipt, user.organization_id)
@@ -1,13 +1,20 @@
+import json
+import time
 from typing import Optional
 from uuid import UUID
 from services.policy_service import evaluate_policies
-from fastapi import APIRouter, Depends, BackgroundTasks, Query
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException, Query
+from pydantic import BaseModel, ValidationError
 from datetime import date
-from services.spend_service import create_spend_event
-from auth.dependencies import get_current_user
+from services.spend_service import create_spend_event, create_spend_events_bulk
+from services.pagination import keyset_page
+from services.spend_rollup import spend_summary
+from services.export import SPEND_EXPORT_COLUMNS, stream_export
+from fastapi.responses import StreamingResponse
+from auth.dependencies import get_current_user, replica_reads
 from models.models import Category, Receipt, SpendEvent
 from auth.roles import Role
+from auth.permissions import require_role
 
 router = APIRouter(prefix="/spends", tags=["Spends"])
 
@@ -23,15 +30,23 @@ class SpendCreateRequest(BaseModel):
     category: Optional[str]
     # category_id: str | None = None
 
-@router.get("")
-async def list_spends(
-    user=Depends(get_current_user),
-    limit: int = Query(20, ge=1, le=100),
-    offset: int = Query(0, ge=0),
-    status: str | None = None,
-    category_id: str | None = None,
-    user_id: str | None = None
-):
+
+class SpendBatchItem(BaseModel):
+    amount: float
+    currency: str
+    spend_date: date
+    source: str = "import"
+    description: str | None = None
+    category_id: UUID | None = None
+    category: str | None = None
+    vendor_id: UUID | None = None
+    idempotency_key: str | None = None
+    raw_metadata: dict | None = None
+
+
+MAX_BATCH_ITEMS = 5000
+
+def _visible_spends(user, status=None, category_id=None, user_id=None):
     qs = SpendEvent.filter(organization=user.organization)
 
     # Role based visibility
@@ -48,17 +63,176 @@ async def list_spends(
     if user_id and user.role == Role.FINANCE.value:
         qs = qs.filter(user_id=user_id)
 
-    total = await qs.count()
-    spends = await qs.limit(limit).offset(offset).order_by("-created_at")
+    return qs
+
+
+@router.get("", dependencies=[Depends(replica_reads)])
+async def list_spends(
+    user=Depends(get_current_user),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    cursor: str | None = None,
+    include_total: bool | None = None,
+    status: str | None = None,
+    category_id: str | None = None,
+    user_id: str | None = None
+):
+    qs = _visible_spends(user, status=status, category_id=category_id, user_id=user_id)
+    try:
+        return await keyset_page(qs, limit=limit, cursor=cursor, offset=offset, include_total=include_total)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/export", dependencies=[Depends(replica_reads)])
+async def export_spends(
+    user=Depends(get_current_user),
+    format: str = Query("csv", description="csv or parquet"),
+    status: str | None = None,
+    category_id: str | None = None,
+    user_id: str | None = None
+):
+    """
+    All matching spends in one streamed file; same filters and visibility
+    as the list.
+    """
+    qs = _visible_spends(user, status=status, category_id=category_id, user_id=user_id)
+    try:
+        stream, media_type = stream_export(qs, SPEND_EXPORT_COLUMNS, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        stream,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="spends.{format}"'}
+    )
+
+
+def _month(value: str | None, name: str) -> date | None:
+    if not value:
+        return None
+    try:
+        year, month = value.split("-")
+        return date(int(year), int(month), 1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be YYYY-MM")
+
+
+@router.get("/summary", dependencies=[Depends(replica_reads)])
+async def get_spend_summary(
+    user=Depends(require_role(Role.FINANCE, Role.ADMIN)),
+    group_by: str = Query("month,category", description="Comma-separated: month, category, team, vendor, status, currency"),
+    start: str | None = Query(None, description="First month, YYYY-MM"),
+    end: str | None = Query(None, description="Last month, YYYY-MM"),
+    status: str | None = None,
+    currency: str | None = None
+):
+    """
+    Spend totals for dashboards and budgets, answered from the rollup
+    tables: the cost depends on the number of groups, not of spends.
+    """
+    dimensions = [name.strip() for name in group_by.split(",") if name.strip()]
+    try:
+        rows = await spend_summary(
+            user.organization_id,
+            dimensions,
+            start=_month(start, "start"),
+            end=_month(end, "end"),
+            status=status,
+            currency=currency
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"group_by": dimensions, "rows": rows}
+
+from fastapi import Request
+
+
+async def _read_batch(request: Request) -> list:
+    """
+    Accepts a JSON array (or {"items": [...]}) or an NDJSON stream.
+    NDJSON is parsed line by line as it arrives.
+    """
+    content_type = request.headers.get("content-type", "")
+
+    if "ndjson" not in content_type:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON payload")
+        items = body.get("items") if isinstance(body, dict) else body
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Expected an array of spends")
+        if len(items) > MAX_BATCH_ITEMS:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_ITEMS} items")
+        return items
+
+    items = []
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if not line.strip():
+                continue
+            if len(items) >= MAX_BATCH_ITEMS:
+                raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_ITEMS} items")
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid NDJSON line {len(items) + 1}")
+    if buffer.strip():
+        try:
+            items.append(json.loads(buffer))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid NDJSON line {len(items) + 1}")
+    return items
+
+
+@router.post("/batch")
+async def create_spends_batch(request: Request, user=Depends(get_current_user)):
+    started = time.perf_counter()
+    raw_items = await _read_batch(request)
+
+    results = [None] * len(raw_items)
+    valid = []
+    for index, raw in enumerate(raw_items):
+        try:
+            valid.append((index, SpendBatchItem.model_validate(raw).model_dump()))
+        except ValidationError as e:
+            results[index] = {
+                "index": index,
+                "status": "invalid",
+                "error": e.errors(include_url=False, include_context=False)
+            }
+
+    # Preloaded by get_current_user
+    organization = user.organization
+    if not organization:
+        raise HTTPException(status_code=403, detail="User has no organization")
+
+    created = await create_spend_events_bulk(
+        organization=organization,
+        user=user,
+        items=[item for _, item in valid]
+    )
+    for (index, _), result in zip(valid, created):
+        results[index] = {**result, "index": index}
+
+    elapsed = time.perf_counter() - started
+    counts = {"created": 0, "duplicate": 0, "invalid": 0}
+    for result in results:
+        counts[result["status"]] += 1
 
     return {
-        "total": total,
-        "limit": limit,
-        "offset": offset,
-        "items": spends
+        "received": len(raw_items),
+        **counts,
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "items_per_second": round(len(raw_items) / elapsed, 1) if elapsed else None,
+        "items": results
     }
 
-from fastapi import Request
+
 @router.post("")
 async def create_spend(
     payload: SpendCreateRequest,
@@ -80,7 +254,8 @@ async def create_spend(
 #     organization=user.organization
 # )
 
-    spend = await SpendEvent.create(
+    # Same path as every other create: rollups, audit row and policies
+    spend = await create_spend_event(
         organization=user.organization,
         user=user,
         amount=payload.amount,
@@ -88,11 +263,11 @@ async def create_spend(
         spend_date=date.today(),
         source="dashboard",
         description=payload.description,
-        category="59c75288-9201-462d-87dd-526151606310",
+        category=category,
         vendor=None
     )
-    
-    if payload.receipt_url:
+
+    if getattr(payload, "receipt_url", None):
         await Receipt.create(
             spend_event=spend,
             file_url=payload.receipt_url
@@ -0,0 +1,228 @@
+"""
+Query plan and latency benchmark for the hot-path indexes (Postgres only).
+
+Seeds one organization with ~1M spends (plus audit logs and notifications),
+then runs the list/filter queries the API issues twice: without the indexes
+from migrations 2 and 3 ("before") and with them ("after").
+
+    python -m scripts.bench_indexes --seed --spends 1000000
+    python -m scripts.bench_indexes            # reuse the seeded data
+
+Run it against a scratch database: it drops and recreates indexes.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import statistics
+import time
+import uuid
+from pathlib import Path
+
+from tortoise import connections
+
+from db import init_db, close_db
+
+BENCH_ORG_NAME = "bench-org"
+MIGRATIONS = Path(__file__).resolve().parent.parent / "migrations" / "models"
+INDEX_MIGRATIONS = ("2_*_keyset_pagination_indexes.py", "3_*_query_pattern_indexes.py")
+
+STATUSES = "ARRAY['pending','awaiting_approval','approved','approved','approved','rejected','blocked']"
+ACTIONS = "ARRAY['spend_created','policy_evaluated','approval_requested','approval_resolved','receipt_uploaded']"
+
+
+def _load_migration(pattern: str):
+    path = next(MIGRATIONS.glob(pattern))
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def _run_script(conn, sql: str):
+    for statement in filter(None, (s.strip() for s in sql.split(";"))):
+        await conn.execute_script(statement)
+
+
+async def seed(conn, *, spends: int, users: int):
+    org_id = str(uuid.uuid4())
+    print(f"Seeding {spends} spends for {users} users...")
+    started = time.perf_counter()
+
+    await conn.execute_query(
+        'INSERT INTO "organization" ("id", "created_at", "updated_at", "name", "is_active") '
+        "VALUES ($1, now(), now(), $2, true)",
+        [org_id, BENCH_ORG_NAME]
+    )
+    await conn.execute_query(
+        'INSERT INTO "user" ("id", "created_at", "updated_at", "email", "full_name", "role", '
+        '"is_active", "is_superuser", "organization_id") '
+        "SELECT gen_random_uuid(), now(), now(), 'bench-' || $1::text || '-' || g || '@example.com', "
+        "'Bench ' || g, CASE WHEN g % 10 = 0 THEN 'manager' ELSE 'employee' END, true, false, $1::uuid "
+        "FROM generate_series(1, $2::int) g",
+        [org_id, users]
+    )
+    await conn.execute_query(
+        'INSERT INTO "category" ("id", "created_at", "updated_at", "name", "organization_id") '
+        "SELECT gen_random_uuid(), now(), now(), 'Category ' || g, $1::uuid FROM generate_series(1, 20) g",
+        [org_id]
+    )
+    await conn.execute_query(
+        'INSERT INTO "spendevent" ("id", "created_at", "updated_at", "amount", "currency", "spend_date", '
+        '"source", "status", "organization_id", "user_id", "category_id") '
+        "SELECT gen_random_uuid(), now() - (g % 730) * interval '1 day' - random() * interval '1 day', now(), "
+        "round((random() * 2000)::numeric, 2), 'USD', current_date - (g % 730), 'bench', "
+        f"({STATUSES})[1 + floor(random() * 7)::int], $1::uuid, "
+        "u.ids[1 + floor(random() * array_length(u.ids, 1))::int], "
+        "c.ids[1 + floor(random() * array_length(c.ids, 1))::int] "
+        "FROM generate_series(1, $2::int) g, "
+        '(SELECT array_agg("id") ids FROM "user" WHERE "organization_id" = $1::uuid) u, '
+        '(SELECT array_agg("id") ids FROM "category" WHERE "organization_id" = $1::uuid) c',
+        [org_id, spends]
+    )
+    await conn.execute_query(
+        'INSERT INTO "auditlog" ("id", "created_at", "updated_at", "entity_type", "entity_id", "action", '
+        '"organization_id", "actor_id") '
+        "SELECT gen_random_uuid(), now() - (g % 730) * interval '1 day' - random() * interval '1 day', now(), "
+        f"'SpendEvent', gen_random_uuid(), ({ACTIONS})[1 + floor(random() * 5)::int], $1::uuid, "
+        "u.ids[1 + floor(random() * array_length(u.ids, 1))::int] "
+        "FROM generate_series(1, $2::int) g, "
+        '(SELECT array_agg("id") ids FROM "user" WHERE "organization_id" = $1::uuid) u',
+        [org_id, spends]
+    )
+    await conn.execute_query(
+        'INSERT INTO "notification" ("id", "created_at", "updated_at", "title", "message", "read", '
+        '"organization_id", "recipient_id") '
+        "SELECT gen_random_uuid(), now() - (g % 730) * interval '1 day', now(), 'Approval Required', "
+        "'Bench notification', random() < 0.9, $1::uuid, "
+        "u.ids[1 + floor(random() * array_length(u.ids, 1))::int] "
+        "FROM generate_series(1, $2::int) g, "
+        '(SELECT array_agg("id") ids FROM "user" WHERE "organization_id" = $1::uuid) u',
+        [org_id, spends // 5]
+    )
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+
+async def _bench_ids(conn) -> dict:
+    _, rows = await conn.execute_query(
+        'SELECT o."id" AS org_id, '
+        '(SELECT "id" FROM "user" WHERE "organization_id" = o."id" LIMIT 1) AS user_id, '
+        '(SELECT "id" FROM "category" WHERE "organization_id" = o."id" LIMIT 1) AS category_id '
+        'FROM "organization" o WHERE o."name" = $1 LIMIT 1',
+        [BENCH_ORG_NAME]
+    )
+    if not rows:
+        raise SystemExit("No benchmark data found, run with --seed first")
+    return dict(rows[0])
+
+
+def _queries(ids: dict) -> list[tuple[str, str, list]]:
+    page = 'ORDER BY "created_at" DESC, "id" DESC LIMIT 21'
+    org, user, category = ids["org_id"], ids["user_id"], ids["category_id"]
+    return [
+        ("spends: own, first page",
+         f'SELECT * FROM "spendevent" WHERE "organization_id" = $1 AND "user_id" = $2 {page}', [org, user]),
+        ("spends: by status",
+         f'SELECT * FROM "spendevent" WHERE "organization_id" = $1 AND "status" = $2 {page}',
+         [org, "rejected"]),
+        ("spends: awaiting approval",
+         f'SELECT * FROM "spendevent" WHERE "organization_id" = $1 AND "status" = $2 {page}',
+         [org, "awaiting_approval"]),
+        ("spends: by category",
+         f'SELECT * FROM "spendevent" WHERE "organization_id" = $1 AND "category_id" = $2 {page}',
+         [org, category]),
+        ("audit: by action",
+         f'SELECT * FROM "auditlog" WHERE "organization_id" = $1 AND "action" = $2 {page}',
+         [org, "approval_resolved"]),
+        ("audit: by actor",
+         f'SELECT * FROM "auditlog" WHERE "organization_id" = $1 AND "actor_id" = $2 {page}', [org, user]),
+        ("notifications: unread",
+         f'SELECT * FROM "notification" WHERE "recipient_id" = $1 AND "read" = false {page}', [user]),
+        ("policies: active",
+         'SELECT * FROM "policy" WHERE "organization_id" = $1 AND "is_active" = true', [org]),
+    ]
+
+
+def _plan_summary(node: dict) -> str:
+    parts = []
+
+    def walk(n):
+        label = n["Node Type"]
+        if n.get("Index Name"):
+            label += f" ({n['Index Name']})"
+        parts.append(label)
+        for child in n.get("Plans", []):
+            walk(child)
+
+    walk(node)
+    return " > ".join(parts)
+
+
+async def measure(conn, queries, repeat: int) -> dict:
+    results = {}
+    for name, sql, params in queries:
+        _, rows = await conn.execute_query(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", params)
+        plan = rows[0]["QUERY PLAN"]
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await conn.execute_query(sql, params)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        results[name] = {
+            "plan": _plan_summary(plan[0]["Plan"]),
+            "p50_ms": statistics.median(timings),
+            "max_ms": max(timings),
+        }
+    return results
+
+
+async def bench(*, seed_data: bool, spends: int, users: int, repeat: int):
+    conn = connections.get("default")
+    if conn.capabilities.dialect != "postgres":
+        raise SystemExit("The index benchmark needs Postgres (DB_URL=postgres://...)")
+
+    if seed_data:
+        await seed(conn, spends=spends, users=users)
+
+    migrations = [_load_migration(pattern) for pattern in INDEX_MIGRATIONS]
+    queries = _queries(await _bench_ids(conn))
+
+    for migration in reversed(migrations):
+        await _run_script(conn, await migration.downgrade(conn))
+    await conn.execute_script("ANALYZE")
+    before = await measure(conn, queries, repeat)
+
+    for migration in migrations:
+        await _run_script(conn, await migration.upgrade(conn))
+    await conn.execute_script("ANALYZE")
+    after = await measure(conn, queries, repeat)
+
+    for name, _, _ in queries:
+        print(f"\n{name}")
+        print(f"  before: {before[name]['p50_ms']:8.2f} ms p50  {before[name]['plan']}")
+        print(f"  after:  {after[name]['p50_ms']:8.2f} ms p50  {after[name]['plan']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", action="store_true", help="Insert a fresh benchmark dataset first")
+    parser.add_argument("--spends", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    async def runner():
+        await init_db()
+        try:
+            await bench(seed_data=args.seed, spends=args.spends, users=args.users, repeat=args.repeat)
+        finally:
+            await close_db()
+
+    asyncio.run(runner())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Import-time budget for the API app.
+
+Imports `main` in a fresh interpreter under `-X importtime` and fails
+(exit 1) when the total goes over budget or when a module that is meant to
+load lazily (the LLM stack, authlib's clients, pypdf) is imported at
+startup:
+
+    python -m scripts.import_budget
+    python -m scripts.import_budget --budget-ms 800 --top 25
+
+tests/test_import_budget.py runs the same checks under pytest, which keeps
+cold start, and with it worker boot and autoscaling reaction time, from
+creeping back up.
+"""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", 1500))
+
+# Only loaded on first use; importing them from `main` is a regression
+LAZY_MODULES = (
+    "langchain_core",
+    "langchain_google_genai",
+    "google.genai",
+    "google.generativeai",
+    # OAuth/HTTP clients; the API only needs authlib.jose to verify tokens
+    "authlib.integrations",
+    "pypdf",
+)
+
+
+def measure(module: str) -> list[tuple[str, int, int]]:
+    """
+    Returns (module, self_us, cumulative_us) for every import, outermost last,
+    as reported by -X importtime.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        lines = [l for l in result.stderr.splitlines() if not l.startswith("import time:")]
+        raise SystemExit(f"Importing {module} failed:\n" + "\n".join(lines[-20:]))
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            continue  # header
+        # One separator space, then two more per nesting level
+        imports.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def total_ms(imports: list) -> float:
+    # Top-level imports are the ones without indentation; their cumulative
+    # times add up to the whole import
+    return sum(cumulative for name, _, cumulative in imports if not name.startswith(" ")) / 1000
+
+
+def eager_modules(imports: list) -> list[str]:
+    """
+    The LAZY_MODULES (or their submodules) among `imports`.
+    """
+    loaded = {name.strip() for name, _, _ in imports}
+    return sorted(
+        name for name in loaded
+        if any(name == lazy or name.startswith(lazy + ".") for lazy in LAZY_MODULES)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    imports = measure(args.module)
+    total = total_ms(imports)
+
+    print(f"import {args.module}: {total:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    # Direct imports, one nesting level down, are where the time can be cut
+    direct = [
+        (name, cumulative) for name, _, cumulative in imports
+        if name.startswith("  ") and not name.startswith("    ")
+    ]
+    print("\nSlowest direct imports:")
+    for name, cumulative in sorted(direct, key=lambda row: row[1], reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name.strip()}")
+
+    eager = eager_modules(imports)
+
+    failed = False
+    if eager:
+        failed = True
+        print(f"\nFAIL: lazily loaded modules imported at startup: {', '.join(eager[:10])}")
+    if total > args.budget_ms:
+        failed = True
+        print(f"\nFAIL: import time {total:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    if failed:
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Connection pool load test (Postgres only).
+
+Plays one worker process under a burst: `--concurrency` requests in flight
+at once, each holding a connection for `--hold-ms`. The burst runs once for
+each candidate DB_POOL_MAX, and the script reports latency, pool wait and
+acquire timeouts for each. It also reports how large the pool can be before
+all API and OCR workers together exceed the server's max_connections:
+
+    python -m scripts.load_pool --api-workers 4 --ocr-workers 2
+    python -m scripts.load_pool --sizes 5,10,20,40 --concurrency 100 --hold-ms 50
+
+Pick the smallest size with no timeouts and a p99 close to the best; more
+connections than the database has cores mostly adds contention.
+"""
+import argparse
+import asyncio
+import copy
+import statistics
+import time
+
+from tortoise import Tortoise, connections
+
+from db import TORTOISE_ORM, DB_POOL_MAX, pool_stats
+
+# Connections kept free for superuser, migrations and ad-hoc sessions
+RESERVED_CONNECTIONS = 10
+
+
+def _config(pool_size: int) -> dict:
+    config = copy.deepcopy(TORTOISE_ORM)
+    default = config["connections"]["default"]
+    if not isinstance(default, dict) or default.get("engine") != "db_pool":
+        raise SystemExit("DB_URL must point at Postgres")
+    default["credentials"].update({"minsize": pool_size, "maxsize": pool_size, "application_name": "load_pool"})
+    return config
+
+
+async def _connection_ceiling(workers: int) -> tuple[int, int, int]:
+    conn = connections.get("default")
+    _, rows = await conn.execute_query("SHOW max_connections")
+    max_connections = int(rows[0]["max_connections"])
+    # Connections held by anything other than this script
+    _, rows = await conn.execute_query(
+        "SELECT count(*) AS n FROM pg_stat_activity WHERE pid <> pg_backend_pid() "
+        "AND application_name <> 'load_pool'"
+    )
+    others = int(rows[0]["n"])
+    ceiling = max(0, (max_connections - RESERVED_CONNECTIONS - others) // workers)
+    return max_connections, others, ceiling
+
+
+async def _burst(pool_size: int, *, requests: int, concurrency: int, hold: float) -> dict:
+    await Tortoise.init(config=_config(pool_size))
+    conn = connections.get("default")
+    latencies = []
+    errors = {"timeouts": 0, "other": 0}
+    remaining = requests
+
+    async def client():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                await conn.execute_query("SELECT pg_sleep($1)", [hold])
+            except asyncio.TimeoutError:
+                errors["timeouts"] += 1
+                continue
+            except Exception:
+                errors["other"] += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    try:
+        # Open the pool before timing
+        await conn.execute_query("SELECT 1")
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        pool = pool_stats()["default"]
+    finally:
+        await Tortoise.close_connections()
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "pool_size": pool_size,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": quantiles[49] * 1000 if quantiles else 0.0,
+        "p99_ms": quantiles[98] * 1000 if quantiles else 0.0,
+        "wait_avg_ms": pool["wait_seconds_avg"] * 1000,
+        "wait_max_ms": pool["wait_seconds_max"] * 1000,
+        "acquire_timeouts": pool["acquire_timeouts"],
+        "errors": errors["timeouts"] + errors["other"],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=f"2,5,{DB_POOL_MAX},20",
+                        help="Comma-separated DB_POOL_MAX values to try")
+    parser.add_argument("--concurrency", type=int, default=50, help="Requests in flight per worker at peak")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--hold-ms", type=float, default=20, help="How long each request holds its connection")
+    parser.add_argument("--api-workers", type=int, default=4, help="gunicorn workers across all API hosts")
+    parser.add_argument("--ocr-workers", type=int, default=1, help="worker.py processes")
+    args = parser.parse_args()
+
+    sizes = sorted({int(s) for s in args.sizes.split(",")})
+    workers = args.api_workers + args.ocr_workers
+
+    await Tortoise.init(config=_config(1))
+    try:
+        max_connections, others, ceiling = await _connection_ceiling(workers)
+    finally:
+        await Tortoise.close_connections()
+    print(
+        f"max_connections={max_connections}, {others} in use elsewhere, {RESERVED_CONNECTIONS} reserved: "
+        f"at most {ceiling} per process for {workers} processes\n"
+    )
+
+    results = []
+    for size in sizes:
+        results.append(await _burst(
+            size, requests=args.requests, concurrency=args.concurrency, hold=args.hold_ms / 1000
+        ))
+
+    print(f"{'pool':>5} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'wait avg':>9} {'wait max':>9} {'timeouts':>9} {'errors':>7}")
+    for r in results:
+        print(
+            f"{r['pool_size']:>5} {r['throughput']:>8.0f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+            f"{r['wait_avg_ms']:>9.1f} {r['wait_max_ms']:>9.1f} {r['acquire_timeouts']:>9} {r['errors']:>7}"
+        )
+
+    healthy = [r for r in results if not r["errors"] and r["pool_size"] <= ceiling]
+    if not healthy:
+        print("\nNo size fits: lower concurrency per worker, add a pooler (pgbouncer) or raise max_connections")
+        return
+    best_p99 = min(r["p99_ms"] for r in healthy)
+    pick = next(r for r in healthy if r["p99_ms"] <= best_p99 * 1.1)
+    print(
+        f"\nSuggested: DB_POOL_MAX={pick['pool_size']} "
+        f"({pick['pool_size'] * workers} connections across {workers} processes)"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
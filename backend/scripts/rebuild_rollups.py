@@ -0,0 +1,33 @@
+"""
+Recomputes the spend rollups from spendevent.
+
+    python -m scripts.rebuild_rollups
+    python -m scripts.rebuild_rollups --organization <uuid>
+
+Safe to run while the app is up: the rebuild is one transaction, so the
+summary endpoint keeps serving the old totals until it commits.
+"""
+import argparse
+import asyncio
+import time
+
+from db import init_db, close_db
+from services.spend_rollup import rebuild_rollups
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--organization", help="Only rebuild this organization's rollups")
+    args = parser.parse_args()
+
+    await init_db()
+    try:
+        started = time.perf_counter()
+        rows = await rebuild_rollups(args.organization)
+        print(f"Rebuilt {rows} rollup rows in {time.perf_counter() - started:.1f}s")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
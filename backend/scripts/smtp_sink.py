@@ -0,0 +1,100 @@
+"""
+Local SMTP sink for notification delivery.
+
+Accepts every message and prints a one-line summary (the whole message with
+--verbose). --fail-rate makes it answer DATA with a temporary error, to
+exercise the dispatcher's retries.
+
+    python -m scripts.smtp_sink --port 1025
+    SMTP_HOST=localhost SMTP_PORT=1025 SMTP_START_TLS=false uvicorn main:app
+
+The connection count it reports shows the dispatcher reusing sessions.
+"""
+import argparse
+import asyncio
+import random
+from email import message_from_bytes
+
+stats = {"connections": 0, "messages": 0, "rejected": 0}
+
+
+async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, *, fail_rate: float, verbose: bool):
+    stats["connections"] += 1
+    peer = writer.get_extra_info("peername")
+
+    async def reply(line: str):
+        writer.write(line.encode() + b"\r\n")
+        await writer.drain()
+
+    await reply("220 smtp-sink ready")
+    recipients = []
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.decode(errors="replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+
+            if verb == "EHLO":
+                await reply("250-smtp-sink")
+                await reply("250-8BITMIME")
+                await reply("250 SMTPUTF8")
+            elif verb == "HELO":
+                await reply("250 smtp-sink")
+            elif verb == "MAIL":
+                recipients = []
+                await reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command.split(":", 1)[-1].strip(" <>"))
+                await reply("250 OK")
+            elif verb == "DATA":
+                await reply("354 End data with <CR><LF>.<CR><LF>")
+                data = await reader.readuntil(b"\r\n.\r\n")
+                if random.random() < fail_rate:
+                    stats["rejected"] += 1
+                    await reply("451 Try again later")
+                    continue
+                stats["messages"] += 1
+                message = message_from_bytes(data[:-5])
+                print(
+                    f"[{stats['messages']} messages / {stats['connections']} connections] "
+                    f"{', '.join(recipients)}: {message['Subject']}"
+                )
+                if verbose:
+                    print(data[:-5].decode(errors="replace"))
+                await reply("250 OK")
+            elif verb in ("RSET", "NOOP"):
+                await reply("250 OK")
+            elif verb == "QUIT":
+                await reply("221 Bye")
+                break
+            else:
+                await reply("502 Command not implemented")
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+    if verbose:
+        print(f"connection from {peer} closed")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of messages answered with 451")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = await asyncio.start_server(
+        lambda r, w: handle(r, w, fail_rate=args.fail_rate, verbose=args.verbose),
+        args.host, args.port
+    )
+    print(f"SMTP sink listening on {args.host}:{args.port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,37 +1,64 @@
-from models.models import Approval, SpendEvent, User
+from collections import defaultdict
+from models.models import Approval, AuditLog, Receipt, SpendEvent, User
 from services.audit_service import log_action
-from spend_state import transition_spend, SpendStatus
+from spend_state import TRANSITIONS, TransitionLost, transition_spend, transition_spends, SpendStatus
+from tortoise import timezone
+from tortoise.transactions import in_transaction
 from notifications.service import send_approval_notification
 from services.notification_service import create_notification
 from services.approver_service import select_approver
+from services.pagination import keyset_page
+
+# Most decisions one resolve_approvals call takes
+MAX_DECISION_BATCH = 200
+
+
+class _Conflict(Exception):
+    pass
+
+
 async def request_approval(spend: SpendEvent, action: dict):
+    """
+    Creates a pending approval and moves the spend to awaiting_approval.
+    Returns None, creating nothing, if the spend's status changed meanwhile.
+    """
     approver_id = action.get("approver")
-    approver = await User.get(id=approver_id)
+    # Approver and submitter in one query; the email names both
+    users = {}
+    if approver_id:
+        ids = [approver_id, spend.user_id] if spend.user_id else [approver_id]
+        users = {str(user.id): user for user in await User.filter(id__in=ids)}
+    approver = users.get(str(approver_id))
     if not approver:
         # fallback, send to financ admin or raise
         raise ValueError("No approver found for this spend")
 
-    approval = await Approval.create(
-        spend_event=spend,
-        approver_id=approver_id,
-        status="pending"
-    )
-
-    spend.status = "awaiting_approval"
-    await spend.save()
+    # The approval exists only if the spend really moved to awaiting_approval
+    try:
+        async with in_transaction() as conn:
+            approval = await Approval.create(
+                spend_event=spend,
+                approver_id=approver_id,
+                status="pending",
+                using_db=conn
+            )
+            if not await transition_spend(spend, SpendStatus.AWAITING_APPROVAL, reason="policy", using_db=conn):
+                raise _Conflict
+    except _Conflict:
+        return None
 
     await log_action(
-        organization=spend.organization,
-        actor=spend.user,
+        organization=spend.organization_id,
+        actor=spend.user_id,
         entity=approval,
         action="approval_requested"
     )
 
-    # Send notification async-safe
-    await send_approval_notification(approval)
+    # Queued; delivered (and coalesced) by the notification dispatcher
+    await send_approval_notification(approver, spend, submitter=users.get(str(spend.user_id)))
     # send DB notification
     await create_notification(
-        organization=spend.organization,
+        organization=spend.organization_id,
         recipient=approver,
         title="Approval Required",
         message=f"Spend of {spend.amount} {spend.currency} requires your approval",
@@ -40,20 +67,266 @@ async def request_approval(spend: SpendEvent, action: dict):
 
     return approval
 
-async def resolve_approval(approval: Approval, approved: bool, comment=None):
-    approval.status = "approved" if approved else "rejected"
-    approval.comment = comment
-    await approval.save()
-
-    spend = approval.spend_event
+async def resolve_approval(approval: Approval, approved: bool, comment=None) -> bool:
+    """
+    Records the decision and moves the spend, in one transaction. Returns
+    False, changing nothing, if the approval was already decided or the
+    spend is no longer awaiting approval (e.g. blocked, or approved through
+    another approval).
+    """
+    status = "approved" if approved else "rejected"
     new_status = SpendStatus.APPROVED if approved else SpendStatus.REJECTED
-    await transition_spend(spend, new_status)
+    try:
+        async with in_transaction() as conn:
+            decided = await Approval.filter(id=approval.id, status="pending").using_db(conn).update(
+                status=status,
+                comment=comment,
+                updated_at=timezone.now()
+            )
+            if not decided:
+                raise _Conflict
+            spend = await SpendEvent.get(id=approval.spend_event_id).using_db(conn)
+            if new_status not in TRANSITIONS[SpendStatus(spend.status)]:
+                raise _Conflict
+            if not await transition_spend(spend, new_status, actor=approval.approver_id, reason="approval", using_db=conn):
+                raise _Conflict
+    except _Conflict:
+        return False
+
+    approval.status = status
+    approval.comment = comment
 
-    from services.audit_service import log_action
     await log_action(
-        organization=spend.organization,
-        actor=approval.approver,
+        organization=spend.organization_id,
+        actor=approval.approver_id,
         entity=spend,
         action="approval_resolved",
         metadata={"approved": approved}
     )
+    return True
+
+
+async def resolve_approvals(approver: User, decisions: list[dict]) -> list[dict]:
+    """
+    Decides many approvals of `approver` at once. `decisions` are dicts
+    with "approval_id", "approved" and optionally "comment".
+
+    Ownership and state are checked with one query. The valid decisions
+    are applied in one transaction: one conditional UPDATE of approvals
+    per (decision, comment), one of spends per outcome, and bulk inserts
+    of history and audit rows. If an approval or spend changed meanwhile,
+    that transaction is rolled back and the batch is decided one by one.
+    Submitters get one notification each.
+
+    Returns one outcome per decision, in order: "approved", "rejected",
+    "not_found", "forbidden" or "conflict" (already decided, the spend
+    moved on, or listed twice). Raises ValueError on an oversized batch.
+    """
+    if len(decisions) > MAX_DECISION_BATCH:
+        raise ValueError(f"At most {MAX_DECISION_BATCH} decisions per request")
+
+    approvals = {
+        str(approval.id): approval
+        for approval in await Approval.filter(
+            id__in=[decision["approval_id"] for decision in decisions]
+        ).select_related("spend_event")
+    }
+
+    results = []
+    accepted = []
+    # Result entry of each accepted decision, by position in `accepted`
+    accepted_results = []
+    seen_spends = set()
+    for decision in decisions:
+        approval = approvals.get(str(decision["approval_id"]))
+        new_status = SpendStatus.APPROVED if decision["approved"] else SpendStatus.REJECTED
+        if approval is None:
+            outcome = "not_found"
+        elif approval.approver_id != approver.id:
+            outcome = "forbidden"
+        elif (
+            approval.status != "pending"
+            or approval.spend_event_id in seen_spends
+            or new_status not in TRANSITIONS[SpendStatus(approval.spend_event.status)]
+        ):
+            outcome = "conflict"
+        else:
+            outcome = new_status.value
+            seen_spends.add(approval.spend_event_id)
+        results.append({"approval_id": str(decision["approval_id"]), "outcome": outcome})
+        if outcome == new_status.value:
+            accepted.append((approval, decision))
+            accepted_results.append(results[-1])
+
+    if not accepted:
+        return results
+
+    try:
+        await _apply_decisions(approver, accepted)
+    except TransitionLost:
+        # Someone decided or moved one of these meanwhile; settle each alone
+        # Only the accepted entries change; a repeat listing stays "conflict"
+        decided = []
+        for (approval, decision), result in zip(accepted, accepted_results):
+            if await resolve_approval(approval, decision["approved"], decision.get("comment")):
+                decided.append((approval, decision))
+            else:
+                result["outcome"] = "conflict"
+        accepted = decided
+
+    await _notify_submitters([(approval.spend_event, decision["approved"]) for approval, decision in accepted])
+    return results
+
+
+async def _apply_decisions(approver: User, accepted: list):
+    by_decision = defaultdict(list)
+    for approval, decision in accepted:
+        by_decision[(bool(decision["approved"]), decision.get("comment"))].append(approval)
+
+    now = timezone.now()
+    async with in_transaction() as conn:
+        for (approved, comment), group in by_decision.items():
+            decided = await Approval.filter(
+                id__in=[approval.id for approval in group],
+                status="pending"
+            ).using_db(conn).update(
+                status="approved" if approved else "rejected",
+                comment=comment,
+                updated_at=now
+            )
+            if decided != len(group):
+                raise TransitionLost
+
+        for approved in (True, False):
+            spends = [approval.spend_event for approval, decision in accepted if bool(decision["approved"]) == approved]
+            if spends:
+                await transition_spends(
+                    spends,
+                    SpendStatus.APPROVED if approved else SpendStatus.REJECTED,
+                    actor=approver,
+                    reason="approval",
+                    using_db=conn
+                )
+
+        await AuditLog.bulk_create([
+            AuditLog(
+                organization_id=approval.spend_event.organization_id,
+                actor_id=approver.id,
+                entity_type="SpendEvent",
+                entity_id=approval.spend_event_id,
+                action="approval_resolved",
+                metadata={"approved": bool(decision["approved"])}
+            )
+            for approval, decision in accepted
+        ], batch_size=500, using_db=conn)
+
+    for approval, decision in accepted:
+        approval.status = "approved" if decision["approved"] else "rejected"
+        approval.comment = decision.get("comment")
+
+
+async def _notify_submitters(decided: list[tuple[SpendEvent, bool]]):
+    """
+    One in-app notification per submitter, however many of their spends
+    were decided.
+    """
+    by_submitter = defaultdict(list)
+    for spend, approved in decided:
+        if spend.user_id:
+            by_submitter[spend.user_id].append((spend, approved))
+
+    for submitter_id, items in by_submitter.items():
+        if len(items) == 1:
+            spend, approved = items[0]
+            title = "Spend approved" if approved else "Spend rejected"
+            message = f"Your spend of {spend.amount} {spend.currency} was {'approved' if approved else 'rejected'}"
+        else:
+            approved_count = sum(1 for _, approved in items if approved)
+            title = f"{len(items)} spends decided"
+            message = f"{approved_count} of your spends were approved and {len(items) - approved_count} rejected"
+        await create_notification(
+            organization=items[0][0].organization_id,
+            recipient=submitter_id,
+            title=title,
+            message=message,
+            metadata={"spend_ids": [str(spend.id) for spend, _ in items]}
+        )
+
+
+async def approval_inbox(
+    approver: User,
+    *,
+    status: str | None = "pending",
+    category_id=None,
+    submitted_by=None,
+    limit: int = 50,
+    cursor: str | None = None,
+    include_total: bool | None = None
+) -> dict:
+    """
+    One page of the approvals assigned to `approver`, newest first, as
+    plain dicts. Spend, submitter, category and vendor are joined into the
+    page query and the page's receipts come in one more, so a page costs
+    two queries (three with the total) whatever its size.
+    Raises ValueError on a malformed cursor.
+    """
+    qs = Approval.filter(approver_id=approver.id)
+    if status:
+        qs = qs.filter(status=status)
+    if category_id:
+        qs = qs.filter(spend_event__category_id=category_id)
+    if submitted_by:
+        qs = qs.filter(spend_event__user_id=submitted_by)
+
+    page = await keyset_page(
+        qs.select_related("spend_event__user", "spend_event__category", "spend_event__vendor"),
+        limit=limit,
+        cursor=cursor,
+        include_total=include_total
+    )
+
+    receipts = defaultdict(list)
+    if page["items"]:
+        for receipt in await Receipt.filter(
+            spend_event_id__in=[approval.spend_event_id for approval in page["items"]]
+        ).order_by("created_at"):
+            receipts[receipt.spend_event_id].append(receipt)
+
+    page["items"] = [_inbox_item(approval, receipts[approval.spend_event_id]) for approval in page["items"]]
+    return page
+
+
+def _inbox_item(approval: Approval, receipts: list[Receipt]) -> dict:
+    # Only reads relations approval_inbox fetched; nothing here queries
+    spend = approval.spend_event
+    submitter, category, vendor = spend.user, spend.category, spend.vendor
+    return {
+        "id": approval.id,
+        "status": approval.status,
+        "comment": approval.comment,
+        "created_at": approval.created_at,
+        "spend": {
+            "id": spend.id,
+            "amount": spend.amount,
+            "currency": spend.currency,
+            "spend_date": spend.spend_date,
+            "description": spend.description,
+            "status": spend.status,
+            "submitted_by": {
+                "id": submitter.id,
+                "full_name": submitter.full_name,
+                "email": submitter.email,
+            } if submitter else None,
+            "category": {"id": category.id, "name": category.name} if category else None,
+            "vendor": {"id": vendor.id, "name": vendor.name} if vendor else None,
+            "receipts": [
+                {
+                    "id": receipt.id,
+                    "file_url": receipt.file_url,
+                    "is_verified": receipt.is_verified,
+                    "ocr_status": receipt.ocr_status,
+                }
+                for receipt in receipts
+            ],
+        },
+    }
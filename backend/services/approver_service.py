@@ -1,56 +1,30 @@
 from models.models import Policy, PolicyRule, User, SpendEvent
 from auth.roles import Role
+from services.policy_cache import get_rule_set
+from services.policy_conditions import spend_facts
 
 async def select_approver(spend: SpendEvent) -> User | None:
     """
     Select approver automatically based on active policies.
     MVP logic:
-    - Loop active policies in organization by priority
-    - Check each rule condition against spend
+    - Match the organization's active policy rules against the spend
+    - Walk matching rules from highest priority down
     - Return first approver found in action JSON
     """
 
-    org = spend.organization
+    org_id = spend.organization_id
 
-    # Fetch active policies ordered by priority
-    policies = await Policy.filter(
-        organization=org,
-        is_active=True
-    ).prefetch_related("rules")
+    # Same compiled rule set and condition language as evaluate_policies
+    rule_set = await get_rule_set(org_id)
+    facts = await spend_facts(spend, rule_set.index.named_dimensions)
 
-    # Flatten rules and sort by priority descending
-    rules = sorted(
-        [r for p in policies for r in p.rules],
-        key=lambda r: r.priority,
-        reverse=True
-    )
-
-    for rule in rules:
-        condition = rule.condition  # JSON
-        action = rule.action        # JSON
-
-        # Simple MVP evaluator: assume condition keys match spend fields
-        # e.g., {"amount_gt": 500} or {"category": "Travel"}
-        match = True
-
-        for k, v in condition.items():
-            if k == "amount_gt" and (spend.amount is None or spend.amount <= v):
-                match = False
-                break
-            elif k == "amount_lt" and (spend.amount is None or spend.amount >= v):
-                match = False
-                break
-            elif k == "category" and getattr(spend.category, "name", None) != v:
-                match = False
-                break
-            # We will add more as needed this is for the MVP 
-
-        if match:
-            # Get approver from action JSON, e.g., {"approver_role": "manager"}
-            role = action.get("approver_role", Role.MANAGER.value)
-            approver = await User.filter(organization=org, role=role).first()
-            if approver:
-                return approver
+    # Highest priority first
+    for rule in reversed(rule_set.match(facts)):
+        # Get approver from action JSON, e.g., {"approver_role": "manager"}
+        role = rule.action.get("approver_role", Role.MANAGER.value)
+        approver = await User.filter(organization_id=org_id, role=role).first()
+        if approver:
+            return approver
 
     # Fallback: first manager
-    return await User.filter(organization=org, role=Role.MANAGER.value).first()
\ No newline at end of file
+    return await User.filter(organization_id=org_id, role=Role.MANAGER.value).first()
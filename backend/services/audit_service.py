@@ -1,5 +1,205 @@
+import asyncio
+import logging
+import os
+
 from models.models import AuditLog
 
+logger = logging.getLogger(__name__)
+
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", 10000))
+AUDIT_FLUSH_SIZE = int(os.getenv("AUDIT_FLUSH_SIZE", 200))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", 0.5))
+# Bulk insert attempts per flush, AUDIT_RETRY_BACKOFF, 2x, 4x... apart
+AUDIT_FLUSH_ATTEMPTS = int(os.getenv("AUDIT_FLUSH_ATTEMPTS", 3))
+AUDIT_RETRY_BACKOFF = float(os.getenv("AUDIT_RETRY_BACKOFF_SECONDS", 0.5))
+# Single-row inserts a row gets, one per flush, before it is dropped
+AUDIT_ROW_ATTEMPTS = int(os.getenv("AUDIT_ROW_ATTEMPTS", 5))
+# "async": log_action returns once the row is queued (fire-and-forget)
+# "sync": log_action waits until the batch holding the row is written
+AUDIT_DURABILITY = os.getenv("AUDIT_DURABILITY", "async")
+
+_STOP = object()
+
+
+class AuditWriter:
+    """
+    Buffers audit rows on a queue and writes them with bulk_create,
+    whenever `flush_size` rows are waiting or `flush_interval` has passed.
+    At most `queue_size` rows are held (queued or awaiting a retry); past
+    that producers block (backpressure) instead of dropping rows.
+
+    A failed bulk insert is retried with backoff, then the batch is written
+    row by row so that one bad row cannot sink the rest. Rows that still
+    fail are carried over to the next flush, and dropped (counted in
+    "failed") after AUDIT_ROW_ATTEMPTS tries or when the writer stops.
+    """
+
+    def __init__(self, queue_size: int, flush_size: int, flush_interval: float):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # One slot per row held, released once it is written or dropped
+        self._slots = asyncio.Semaphore(queue_size)
+        self._task: asyncio.Task | None = None
+        # Rows awaiting a retry: [entry, future, single-row attempts]
+        self._carried: list = []
+        self.stats = {
+            "queued": 0, "written": 0, "failed": 0, "flushes": 0, "retries": 0, "row_fallbacks": 0
+        }
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Writes everything still queued, then stops the writer.
+        """
+        if self._task is None:
+            return
+        await self._queue.put((_STOP, None))
+        await self._task
+        self._task = None
+
+    async def enqueue(self, entry: AuditLog, wait: bool = False):
+        future = asyncio.get_running_loop().create_future() if wait else None
+        await self._slots.acquire()
+        self._queue.put_nowait((entry, future))
+        self.stats["queued"] += 1
+        if future:
+            await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            batch = []
+            try:
+                # Carried-over rows are retried even if nothing new arrives
+                item = await asyncio.wait_for(
+                    self._queue.get(), self.flush_interval if self._carried else None
+                )
+            except asyncio.TimeoutError:
+                item = None
+            deadline = loop.time() + self.flush_interval
+
+            while item is not None:
+                if item[0] is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.flush_size:
+                    break
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+
+            await self._flush(batch, final=stopping)
+
+    async def _flush(self, batch: list, final: bool = False):
+        carried, self._carried = self._carried, []
+        if not batch and not carried:
+            return
+        self.stats["flushes"] += 1
+
+        # Carried rows already failed a bulk insert; retry them alone
+        failed = await self._write_rows(carried)
+        if batch:
+            if await self._write_bulk(batch):
+                self._done(batch)
+            else:
+                self.stats["row_fallbacks"] += 1
+                failed += await self._write_rows([[entry, future, 0] for entry, future in batch])
+
+        dropped = []
+        for row in failed:
+            row[2] += 1
+            (dropped if final or row[2] >= AUDIT_ROW_ATTEMPTS else self._carried).append(row)
+        if self._carried:
+            logger.error("%s audit log rows failed to write, retrying on the next flush", len(self._carried))
+        if dropped:
+            logger.error("Dropping %s audit log rows that could not be written", len(dropped))
+            self.stats["failed"] += len(dropped)
+            for _, future, _ in dropped:
+                self._slots.release()
+                if future and not future.done():
+                    future.set_exception(RuntimeError("Audit log row was not written"))
+
+    async def _write_bulk(self, batch: list) -> bool:
+        for attempt in range(AUDIT_FLUSH_ATTEMPTS):
+            if attempt:
+                self.stats["retries"] += 1
+                await asyncio.sleep(AUDIT_RETRY_BACKOFF * 2 ** (attempt - 1))
+            try:
+                await AuditLog.bulk_create([entry for entry, _ in batch])
+                return True
+            except Exception:
+                logger.warning(
+                    "Bulk write of %s audit log rows failed (attempt %s of %s)",
+                    len(batch), attempt + 1, AUDIT_FLUSH_ATTEMPTS, exc_info=True
+                )
+        return False
+
+    async def _write_rows(self, rows: list) -> list:
+        """
+        Inserts [entry, future, attempts] rows one at a time. Returns the
+        ones that failed.
+        """
+        failed = []
+        for row in rows:
+            try:
+                await row[0].save(force_create=True)
+            except Exception:
+                logger.warning("Failed to write audit log row %s", row[0].id, exc_info=True)
+                failed.append(row)
+                continue
+            self._done([row[:2]])
+        return failed
+
+    def _done(self, rows: list):
+        self.stats["written"] += len(rows)
+        for _, future in rows:
+            self._slots.release()
+            if future and not future.done():
+                future.set_result(None)
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "queue_depth": self._queue.qsize(),
+            "carried": len(self._carried),
+            "running": self._task is not None,
+        }
+
+
+_writer: AuditWriter | None = None
+
+
+def start_audit_writer():
+    global _writer
+    if _writer is None:
+        _writer = AuditWriter(AUDIT_QUEUE_SIZE, AUDIT_FLUSH_SIZE, AUDIT_FLUSH_INTERVAL)
+        _writer.start()
+
+
+async def stop_audit_writer():
+    global _writer
+    if _writer is not None:
+        await _writer.stop()
+        _writer = None
+
+
+def audit_writer_stats() -> dict:
+    return _writer.metrics() if _writer else {"running": False}
+
+
+def _pk(value):
+    return getattr(value, "id", value)
+
 
 async def log_action(
     *,
@@ -7,13 +207,23 @@ async def log_action(
     actor,
     entity,
     action,
-    metadata=None
+    metadata=None,
+    wait: bool | None = None
 ):
-    await AuditLog.create(
-        organization=organization,
-        actor=actor,
+    entry = AuditLog(
+        organization_id=_pk(organization),
+        actor_id=_pk(actor),
         entity_type=entity.__class__.__name__,
         entity_id=entity.id,
         action=action,
         metadata=metadata
     )
+
+    # Scripts and workers that never started the writer write inline
+    if _writer is None:
+        await entry.save()
+        return
+
+    if wait is None:
+        wait = AUDIT_DURABILITY == "sync"
+    await _writer.enqueue(entry, wait=wait)
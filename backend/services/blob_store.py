@@ -0,0 +1,151 @@
+"""
+Receipt file storage.
+
+Files are written from an async stream of chunks, so an upload never has
+to sit in memory as a whole, and are addressed by the SHA-256 of their
+content: storing the same receipt twice keeps one copy. Readers get the
+file memory-mapped instead of loaded.
+
+Backends implement BlobStore and are picked by BLOB_STORE_BACKEND; the
+filesystem one is the default and the one to use in tests.
+"""
+import asyncio
+import hashlib
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import AsyncIterator
+
+BLOB_STORE_BACKEND = os.getenv("BLOB_STORE_BACKEND", "filesystem")
+BLOB_STORE_ROOT = os.getenv("BLOB_STORE_ROOT", "uploads/blobs")
+BLOB_CHUNK_SIZE = int(os.getenv("BLOB_CHUNK_SIZE", 1024 * 1024))
+
+BLOB_URL_PREFIX = "blob://"
+
+
+class BlobTooLarge(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class StoredBlob:
+    key: str  # hex SHA-256 of the content
+    size: int
+
+    @property
+    def url(self) -> str:
+        return f"{BLOB_URL_PREFIX}{self.key}"
+
+
+def blob_key(url: str) -> str | None:
+    return url[len(BLOB_URL_PREFIX):] if url.startswith(BLOB_URL_PREFIX) else None
+
+
+@contextmanager
+def map_file(path):
+    """
+    Read-only view of a file without loading it; empty files map to b"".
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+class BlobStore:
+    async def put_stream(self, chunks: AsyncIterator[bytes], max_size: int | None = None) -> StoredBlob:
+        """
+        Stores the streamed content. Raises BlobTooLarge past `max_size` bytes.
+        """
+        raise NotImplementedError
+
+    def open(self, key: str):
+        """
+        Context manager yielding the content as a bytes-like object.
+        """
+        raise NotImplementedError
+
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+
+class FilesystemBlobStore(BlobStore):
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key[2:4] / key
+
+    async def put_stream(self, chunks: AsyncIterator[bytes], max_size: int | None = None) -> StoredBlob:
+        tmp_dir = self.root / "tmp"
+        await asyncio.to_thread(tmp_dir.mkdir, parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=tmp_dir)
+        tmp = os.fdopen(fd, "wb")
+
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise BlobTooLarge(f"File exceeds {max_size} bytes")
+                digest.update(chunk)
+                await asyncio.to_thread(tmp.write, chunk)
+            await asyncio.to_thread(tmp.close)
+
+            key = digest.hexdigest()
+            await asyncio.to_thread(self._commit, tmp_name, key)
+        except BaseException:
+            tmp.close()
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        return StoredBlob(key=key, size=size)
+
+    def _commit(self, tmp_name: str, key: str):
+        path = self._path(key)
+        if path.exists():
+            # Same content already stored
+            os.unlink(tmp_name)
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_name, path)
+
+    def open(self, key: str):
+        return map_file(self._path(key))
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(self._path(key).exists)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._path(key).unlink, missing_ok=True)
+
+
+_BACKENDS = {
+    "filesystem": lambda: FilesystemBlobStore(BLOB_STORE_ROOT),
+}
+
+
+def register_backend(name: str, factory):
+    """
+    Makes another backend (e.g. object storage) selectable via BLOB_STORE_BACKEND.
+    """
+    _BACKENDS[name] = factory
+    get_blob_store.cache_clear()
+
+
+@lru_cache()
+def get_blob_store() -> BlobStore:
+    try:
+        factory = _BACKENDS[BLOB_STORE_BACKEND]
+    except KeyError:
+        raise ValueError(f"Unknown BLOB_STORE_BACKEND '{BLOB_STORE_BACKEND}'")
+    return factory()
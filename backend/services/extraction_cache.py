@@ -0,0 +1,93 @@
+"""
+Content-addressed cache of receipt extractions.
+
+Results are keyed by the SHA-256 of the file bytes, so re-uploading a
+receipt (to the same or another spend) reuses the first extraction instead
+of calling the LLM again. The same hash, stored on Receipt, is how duplicate
+uploads are found.
+"""
+import hashlib
+import logging
+import os
+from datetime import timedelta
+
+from tortoise import timezone
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F
+from tortoise.functions import Count, Sum
+
+from models.models import Receipt, ReceiptExtraction
+
+logger = logging.getLogger(__name__)
+
+RECEIPT_CACHE_TTL_DAYS = int(os.getenv("RECEIPT_CACHE_TTL_DAYS", 90))
+RECEIPT_CACHE_MAX_ENTRIES = int(os.getenv("RECEIPT_CACHE_MAX_ENTRIES", 100000))
+RECEIPT_CACHE_EVICT_INTERVAL = float(os.getenv("RECEIPT_CACHE_EVICT_INTERVAL_SECONDS", 3600))
+
+
+def content_hash(file_bytes: bytes) -> str:
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+async def get_cached_extraction(digest: str) -> dict | None:
+    entry = await ReceiptExtraction.get_or_none(content_hash=digest)
+    if entry is None:
+        return None
+
+    await ReceiptExtraction.filter(id=entry.id).update(
+        hits=F("hits") + 1,
+        last_used_at=timezone.now()
+    )
+    return entry.result
+
+
+async def store_extraction(digest: str, result: dict):
+    try:
+        await ReceiptExtraction.create(
+            content_hash=digest,
+            result=result,
+            last_used_at=timezone.now()
+        )
+    except IntegrityError:
+        # Another worker extracted the same file concurrently; keep its result
+        return
+
+
+async def evict_extractions() -> int:
+    """
+    Drops entries unused for RECEIPT_CACHE_TTL_DAYS, then the least recently
+    used ones beyond RECEIPT_CACHE_MAX_ENTRIES.
+    """
+    cutoff = timezone.now() - timedelta(days=RECEIPT_CACHE_TTL_DAYS)
+    evicted = await ReceiptExtraction.filter(last_used_at__lt=cutoff).delete()
+
+    overflow = await ReceiptExtraction.all().order_by("-last_used_at").offset(
+        RECEIPT_CACHE_MAX_ENTRIES
+    ).values_list("id", flat=True)
+    if overflow:
+        evicted += await ReceiptExtraction.filter(id__in=list(overflow)).delete()
+
+    if evicted:
+        logger.info("Evicted %s cached receipt extractions", evicted)
+    return evicted
+
+
+async def find_duplicate_receipts(receipt: Receipt, organization_id) -> list[dict]:
+    """
+    Other receipts of the organization with exactly the same file.
+    """
+    if not receipt.content_hash:
+        return []
+    return await Receipt.filter(
+        content_hash=receipt.content_hash,
+        spend_event__organization_id=organization_id
+    ).exclude(id=receipt.id).order_by("created_at").values("id", "spend_event_id", "created_at")
+
+
+async def extraction_cache_stats() -> dict:
+    # Lookups happen in the OCR workers, so the numbers come from the table
+    row = await ReceiptExtraction.annotate(
+        entries=Count("id"),
+        total_hits=Sum("hits")
+    ).first().values("entries", "total_hits")
+    return {"entries": row["entries"], "hits": row["total_hits"] or 0}
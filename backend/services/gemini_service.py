@@ -1,10 +1,13 @@
-import base64, os
+import asyncio, base64, os
+from functools import lru_cache
 from typing import Optional
 from pydantic import BaseModel, Field
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage, SystemMessage
 from auth.config import get_settings
-settings = get_settings()
+from services.llm_client import LLMClient
+
+# "gemini", or "fake" to run without the API (local load tests, offline dev)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+LLM_FAKE_LATENCY = float(os.getenv("LLM_FAKE_LATENCY_SECONDS", 0.5))
 
 # Structured Schema for receipts using pydantic
 class LineItem(BaseModel):
@@ -18,20 +21,36 @@ class InvoiceData(BaseModel):
     items: list[LineItem] = Field(description="List of items purchased")
     total_amount: float = Field(description="The final total amount on the receipt")
 
-#  Gemini structured LLM
-llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0, api_key=settings.gemini_api_key)
-structured_llm = llm.with_structured_output(InvoiceData)
+class InvoiceBatch(BaseModel):
+    receipts: list[InvoiceData] = Field(description="One entry per receipt, in the order they were given")
 
-SYSTEM_PROMPT = SystemMessage(
-    content="You are a professional accounting assistant. Extract data accurately from receipts. "
-            "If the date format is unclear, convert it to YYYY-MM-DD. If quantity is missing, assume 1."
+SYSTEM_PROMPT = (
+    "You are a professional accounting assistant. Extract data accurately from receipts. "
+    "If the date format is unclear, convert it to YYYY-MM-DD. If quantity is missing, assume 1."
 )
 
-async def extract_receipt_data(file_bytes: bytes = None, text_content: str = None) -> InvoiceData:
+
+@lru_cache()
+def _models():
     """
-    Uses Gemini via LangChain to extract structured invoice data.
-    Can handle images (PDF or image) or raw text.
+    Gemini structured LLMs, built on first use: langchain and google-genai
+    take long to import, and most API workers never extract a receipt.
+    Retries and timeouts are handled by LLMClient.
     """
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    llm = ChatGoogleGenerativeAI(
+        model="gemini-1.5-flash", temperature=0, api_key=get_settings().gemini_api_key, max_retries=0
+    )
+    return llm.with_structured_output(InvoiceData), llm.with_structured_output(InvoiceBatch)
+
+
+def _messages(content: list[dict]) -> list:
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    return [SystemMessage(content=SYSTEM_PROMPT), HumanMessage(content=content)]
+
+def _content(file_bytes=None, text_content: str = None) -> list[dict]:
     content_list = []
 
     if text_content:
@@ -44,10 +63,57 @@ async def extract_receipt_data(file_bytes: bytes = None, text_content: str = Non
             "image_url": {"url": f"data:application/octet-stream;base64,{encoded_file}"}
         })
 
+    return content_list
+
+
+async def _call(content: list[dict]) -> InvoiceData:
+    structured_llm, _ = _models()
+    return await structured_llm.ainvoke(_messages(content))
+
+
+async def _batch_call(contents: list[list[dict]]) -> list[InvoiceData]:
+    parts = [{
+        "type": "text",
+        "text": f"There are {len(contents)} separate receipts below. "
+                "Extract each one and return them in the same order."
+    }]
+    for i, content in enumerate(contents, 1):
+        parts.append({"type": "text", "text": f"Receipt {i}:"})
+        parts.extend(content)
+    _, batch_llm = _models()
+    response = await batch_llm.ainvoke(_messages(parts))
+    return response.receipts
+
+
+async def _fake_call(content: list[dict]) -> InvoiceData:
+    await asyncio.sleep(LLM_FAKE_LATENCY)
+    return InvoiceData(vendor_name="Fake Vendor", date=None, items=[], total_amount=0.0)
+
+
+async def _fake_batch_call(contents: list[list[dict]]) -> list[InvoiceData]:
+    await asyncio.sleep(LLM_FAKE_LATENCY)
+    return [InvoiceData(vendor_name="Fake Vendor", date=None, items=[], total_amount=0.0) for _ in contents]
+
+
+@lru_cache()
+def get_llm_client() -> LLMClient:
+    if LLM_BACKEND == "fake":
+        return LLMClient(_fake_call, _fake_batch_call)
+    return LLMClient(_call, _batch_call)
+
+
+async def extract_receipt_data(file_bytes=None, text_content: str = None) -> InvoiceData:
+    """
+    Uses Gemini via LangChain to extract structured invoice data.
+    Can handle images (PDF or image) or raw text. `file_bytes` may be any
+    bytes-like object (e.g. an mmap).
+    """
+    content_list = _content(file_bytes, text_content)
     if not content_list:
         raise ValueError("No file bytes or text content provided")
 
-    human_message = HumanMessage(content=content_list)
-    response = await structured_llm.ainvoke([SYSTEM_PROMPT, human_message])
+    return await get_llm_client().submit(content_list)
+
 
-    return response
+def llm_client_stats() -> dict:
+    return get_llm_client().metrics()
@@ -1,11 +1,245 @@
+"""
+Idempotency keys.
+
+A key is claimed with a single INSERT ... ON CONFLICT DO NOTHING, which is
+atomic on both Postgres and SQLite: exactly one caller gets `acquired=True`.
+Callers that claim inside the transaction that creates the result (passing
+the pre-generated entity id) never expose a half-finished claim; concurrent
+claimers wait on the unique index and then see the committed entity id, so a
+replay is a primary-key fetch.
+
+Keys are stored namespaced by scope and organization (see stored_key), so
+two tenants, or two endpoints, sending the same key never see each other's
+claims.
+
+Completed keys are kept in a small in-process LRU so hot client retries skip
+the database, and keys past `expires_at` are swept periodically.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+from typing import NamedTuple
+from uuid import UUID
+
+from tortoise import connections, timezone
 from models.models import IdempotencyKey
+from db import sql_placeholders
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 24 * 3600))
+IDEMPOTENCY_LRU_SIZE = int(os.getenv("IDEMPOTENCY_LRU_SIZE", 10000))
+SWEEP_INTERVAL = int(os.getenv("IDEMPOTENCY_SWEEP_INTERVAL_SECONDS", 300))
+SWEEP_BATCH = 1000
+
+_COLUMNS = ("id", "created_at", "updated_at", "key", "scope", "organization_id", "entity_id", "expires_at")
+# Keeps multi-row inserts well under the Postgres parameter limit
+_INSERT_CHUNK = 500
+
+
+class Claim(NamedTuple):
+    acquired: bool
+    entity_id: UUID | None = None
+
+
+_recent: OrderedDict[str, tuple[UUID | None, object]] = OrderedDict()
+_sweeper: asyncio.Task | None = None
+
+
+def _remember(key: str, entity_id: UUID | None, expires_at=None):
+    _recent[key] = (entity_id, expires_at)
+    _recent.move_to_end(key)
+    while len(_recent) > IDEMPOTENCY_LRU_SIZE:
+        _recent.popitem(last=False)
+
+
+def _recall(key: str) -> Claim | None:
+    entry = _recent.get(key)
+    if entry is None:
+        return None
+    entity_id, expires_at = entry
+    if expires_at is not None and expires_at <= timezone.now():
+        del _recent[key]
+        return None
+    _recent.move_to_end(key)
+    return Claim(acquired=False, entity_id=entity_id)
+
+
+def _pk(value):
+    value = getattr(value, "id", value)
+    return str(value) if value is not None else None
+
+
+def stored_key(key: str, scope: str, organization=None) -> str:
+    """
+    The key as stored: "<scope>:<organization id or ->:<key>". Client keys
+    too long for the column are replaced by their SHA-256.
+    """
+    prefix = f"{scope}:{_pk(organization) or '-'}:"
+    if len(prefix) + len(key) > 255:
+        key = hashlib.sha256(key.encode()).hexdigest()
+    return prefix + key
+
+
+async def _insert_claims(conn, rows: list[tuple]) -> set[str]:
+    """
+    Inserts claim rows, skipping keys that already exist.
+    Returns the keys this call inserted.
+    """
+    acquired = set()
+    for start in range(0, len(rows), _INSERT_CHUNK):
+        chunk = rows[start:start + _INSERT_CHUNK]
+        placeholders = sql_placeholders(conn, len(_COLUMNS) * len(chunk))
+        values_sql = ", ".join(
+            "(" + ", ".join(placeholders[i * len(_COLUMNS):(i + 1) * len(_COLUMNS)]) + ")"
+            for i in range(len(chunk))
+        )
+        columns_sql = ", ".join(f'"{column}"' for column in _COLUMNS)
+        _, inserted = await conn.execute_query(
+            f'INSERT INTO "idempotencykey" ({columns_sql}) VALUES {values_sql} '
+            f'ON CONFLICT ("key") DO NOTHING RETURNING "key"',
+            [value for row in chunk for value in row]
+        )
+        acquired.update(row["key"] for row in inserted)
+    return acquired
+
+
+async def claim_keys(
+    keys: dict[str, UUID | None],
+    scope: str,
+    organization=None,
+    ttl: int | None = IDEMPOTENCY_TTL,
+    using_db=None
+) -> dict[str, Claim]:
+    """
+    Claims many keys at once. `keys` maps each key to the id of the entity
+    the caller is about to create (or None). Keys that were already claimed
+    come back with `acquired=False` and the stored entity id.
+    """
+    organization_id = _pk(organization)
+    # Callers use their own keys; only the table and the LRU see stored ones
+    client_keys = {stored_key(key, scope, organization_id): key for key in keys}
+
+    claims = {}
+    pending = {}
+    for key, client_key in client_keys.items():
+        recalled = _recall(key)
+        if recalled:
+            claims[key] = recalled
+        else:
+            pending[key] = keys[client_key]
+
+    conn = using_db or connections.get("default")
+
+    # Second pass only runs for keys whose expired row we just removed
+    for _ in range(2):
+        if not pending:
+            break
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=ttl) if ttl else None
+        rows = [
+            (str(uuid.uuid4()), now, now, key, scope, organization_id, _pk(entity_id), expires_at)
+            for key, entity_id in pending.items()
+        ]
+        acquired = await _insert_claims(conn, rows)
+        for key in acquired:
+            claims[key] = Claim(acquired=True, entity_id=pending.pop(key))
+
+        expired = []
+        if pending:
+            existing = await IdempotencyKey.filter(key__in=list(pending)).using_db(conn).values_list(
+                "key", "entity_id", "expires_at"
+            )
+            for key, entity_id, key_expires_at in existing:
+                if key_expires_at is not None and key_expires_at <= now:
+                    expired.append(key)
+                    continue
+                claims[key] = Claim(acquired=False, entity_id=entity_id)
+                _remember(key, entity_id, key_expires_at)
+                pending.pop(key)
+
+        if expired:
+            await IdempotencyKey.filter(key__in=expired, expires_at__lte=now).using_db(conn).delete()
+
+    # Anything left lost a race against a concurrent sweep or claim; report it as taken
+    for key in pending:
+        claims[key] = Claim(acquired=False)
+    return {client_keys[key]: claim for key, claim in claims.items()}
+
+
+async def claim_key(
+    key: str,
+    scope: str,
+    organization=None,
+    entity_id: UUID | None = None,
+    ttl: int | None = IDEMPOTENCY_TTL,
+    using_db=None
+) -> Claim:
+    claims = await claim_keys({key: entity_id}, scope, organization=organization, ttl=ttl, using_db=using_db)
+    return claims[key]
+
+
+def remember_key(
+    key: str,
+    entity_id: UUID | None,
+    scope: str,
+    organization=None,
+    ttl: int | None = IDEMPOTENCY_TTL
+):
+    """
+    Records a committed claim in the LRU so the next retry skips the database.
+    """
+    expires_at = timezone.now() + timedelta(seconds=ttl) if ttl else None
+    _remember(stored_key(key, scope, organization), entity_id, expires_at)
+
+
+async def release_key(key: str, scope: str, organization=None):
+    """
+    Frees a key whose work failed outside a transaction, so it can be retried.
+    """
+    key = stored_key(key, scope, organization)
+    _recent.pop(key, None)
+    await IdempotencyKey.filter(key=key).delete()
+
+
+async def sweep_expired_keys() -> int:
+    deleted = 0
+    while True:
+        ids = await IdempotencyKey.filter(expires_at__lt=timezone.now()).limit(SWEEP_BATCH).values_list("id", flat=True)
+        if not ids:
+            return deleted
+        deleted += await IdempotencyKey.filter(id__in=ids).delete()
+        if len(ids) < SWEEP_BATCH:
+            return deleted
+
+
+async def _sweep_forever():
+    while True:
+        await asyncio.sleep(SWEEP_INTERVAL)
+        try:
+            deleted = await sweep_expired_keys()
+            if deleted:
+                logger.info("Swept %s expired idempotency keys", deleted)
+        except Exception:
+            logger.exception("Idempotency key sweep failed")
+
+
+def start_sweeper():
+    global _sweeper
+    if _sweeper is None:
+        _sweeper = asyncio.create_task(_sweep_forever())
 
-async def is_duplicate(key: str) -> bool:
-    return await IdempotencyKey.exists(key=key)
 
-async def record_key(key: str, scope: str, organization=None):
-    await IdempotencyKey.create(
-        key=key,
-        scope=scope,
-        organization=organization
-    )
+async def stop_sweeper():
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        try:
+            await _sweeper
+        except asyncio.CancelledError:
+            pass
+        _sweeper = None
@@ -0,0 +1,264 @@
+"""
+Rate-limited, concurrency-bounded client for LLM calls.
+
+Callers `submit()` a payload and await its result. Behind that:
+
+- payloads queue up and are sent in micro-batches of up to LLM_BATCH_SIZE,
+  collected for at most LLM_BATCH_WINDOW_SECONDS, when a batch call is
+  available (otherwise one call per payload)
+- a token bucket caps calls per second (LLM_RATE_PER_SECOND, LLM_BURST)
+  and a semaphore caps calls in flight (LLM_CONCURRENCY)
+- every call has a timeout; timeouts, 429s and 5xxs are retried with
+  jittered exponential backoff, so a month-end spike slows down instead of
+  turning into a retry storm. A batch that still fails with one of those
+  fails all its payloads; only a rejected or malformed batch is re-sent
+  payload by payload
+
+The client is model-agnostic: it is built from two coroutines, so tests
+and local runs can plug in a fake model.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+LLM_RATE_PER_SECOND = float(os.getenv("LLM_RATE_PER_SECOND", 5))
+LLM_BURST = int(os.getenv("LLM_BURST", 10))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 4))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT_SECONDS", 60))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))
+LLM_RETRY_BASE = float(os.getenv("LLM_RETRY_BASE_SECONDS", 1))
+LLM_RETRY_MAX = float(os.getenv("LLM_RETRY_MAX_SECONDS", 30))
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", 4))
+LLM_BATCH_WINDOW = float(os.getenv("LLM_BATCH_WINDOW_SECONDS", 0.2))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+_RETRYABLE_MARKERS = ("429", "RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED")
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status in RETRYABLE_STATUS:
+        return True
+    message = str(error)
+    return any(marker in message for marker in _RETRYABLE_MARKERS)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # The lock keeps waiters in FIFO order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class Histogram:
+    BOUNDS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.BOUNDS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def snapshot(self) -> dict:
+        labels = [f"le_{b}" for b in self.BOUNDS] + ["le_inf"]
+        cumulative, buckets = 0, {}
+        for label, count in zip(labels, self.counts):
+            cumulative += count
+            buckets[label] = cumulative
+        return {"count": self.count, "sum": round(self.total, 3), "buckets": buckets}
+
+
+class LLMClient:
+    """
+    `call(payload)` sends one payload; `batch_call(payloads)` sends several
+    in one request and returns results in the same order.
+    """
+
+    def __init__(
+        self,
+        call,
+        batch_call=None,
+        *,
+        rate: float = LLM_RATE_PER_SECOND,
+        burst: int = LLM_BURST,
+        concurrency: int = LLM_CONCURRENCY,
+        timeout: float = LLM_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES,
+        retry_base: float = LLM_RETRY_BASE,
+        batch_size: int = LLM_BATCH_SIZE,
+        batch_window: float = LLM_BATCH_WINDOW,
+    ):
+        self.call = call
+        self.batch_call = batch_call
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.batch_size = batch_size if batch_call else 1
+        self.batch_window = batch_window
+
+        self._bucket = TokenBucket(rate, burst)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._dispatcher: asyncio.Task | None = None
+        self._calls: set[asyncio.Task] = set()
+        self._in_flight = 0
+
+        self.latency = Histogram()
+        self.queue_wait = Histogram()
+        self.stats = {
+            "submitted": 0,
+            "calls": 0,
+            "batches": 0,
+            "retries": 0,
+            "timeouts": 0,
+            "rate_limited": 0,
+            "failures": 0,
+            "batch_fallbacks": 0,
+        }
+
+    async def submit(self, payload):
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((payload, future, time.monotonic()))
+        self.stats["submitted"] += 1
+        return await future
+
+    async def close(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        if self._calls:
+            await asyncio.gather(*self._calls, return_exceptions=True)
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            task = asyncio.create_task(self._send(batch))
+            self._calls.add(task)
+            task.add_done_callback(self._calls.discard)
+
+    async def _send(self, batch: list):
+        now = time.monotonic()
+        for _, _, queued_at in batch:
+            self.queue_wait.observe(now - queued_at)
+
+        payloads = [payload for payload, _, _ in batch]
+        futures = [future for _, future, _ in batch]
+
+        if len(batch) > 1:
+            try:
+                results = await self._with_retries(self.batch_call, payloads)
+                if len(results) != len(payloads):
+                    raise ValueError(f"Batch returned {len(results)} results for {len(payloads)} inputs")
+                self.stats["batches"] += 1
+                for future, result in zip(futures, results):
+                    if not future.done():
+                        future.set_result(result)
+                return
+            except Exception as e:
+                if is_retryable(e):
+                    # Already retried: splitting it up now would multiply
+                    # the calls while the provider is throttling us
+                    self.stats["failures"] += len(batch)
+                    logger.warning("LLM batch of %s failed after retries: %s", len(batch), e)
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(e)
+                    return
+                # Rejected or malformed batch: send them one by one instead
+                self.stats["batch_fallbacks"] += 1
+                logger.warning("LLM batch of %s failed, falling back to single calls: %s", len(batch), e)
+
+        await asyncio.gather(*(
+            self._send_one(payload, future) for payload, future in zip(payloads, futures)
+        ))
+
+    async def _send_one(self, payload, future):
+        try:
+            result = await self._with_retries(self.call, payload)
+        except Exception as e:
+            self.stats["failures"] += 1
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
+
+    async def _with_retries(self, call, argument):
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await self._invoke(call, argument)
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.stats["timeouts"] += 1
+                elif "429" in str(e) or getattr(e, "status_code", None) == 429:
+                    self.stats["rate_limited"] += 1
+                if attempt > self.max_retries or not is_retryable(e):
+                    raise
+                self.stats["retries"] += 1
+                delay = min(LLM_RETRY_MAX, self.retry_base * 2 ** (attempt - 1))
+                await asyncio.sleep(random.uniform(delay / 2, delay))
+
+    async def _invoke(self, call, argument):
+        async with self._semaphore:
+            await self._bucket.acquire()
+            self._in_flight += 1
+            self.stats["calls"] += 1
+            started = time.monotonic()
+            try:
+                return await asyncio.wait_for(call(argument), self.timeout)
+            finally:
+                self._in_flight -= 1
+                self.latency.observe(time.monotonic() - started)
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "queue_depth": self._queue.qsize(),
+            "in_flight": self._in_flight,
+            "latency_seconds": self.latency.snapshot(),
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+        }
@@ -0,0 +1,249 @@
+"""
+Live notification fan-out for GET /notifications/stream.
+
+create_notification() publishes each new notification; the hub hands it to
+the open streams of its recipient. NOTIFY_HUB_BACKEND picks how publishes
+reach the hub:
+
+- "memory" (default): in this process only. Enough for a single API node.
+- "postgres": through Postgres NOTIFY on NOTIFY_HUB_CHANNEL. Every API
+  node LISTENs on its own connection, so a notification created on any
+  node (or by the OCR worker) reaches streams on all of them.
+
+Streams are best-effort; the notification table stays the source of
+truth. Each event id is the notification's pagination cursor, and a
+reconnecting client sends it back as Last-Event-ID to get what it missed
+(see replay_after). A subscriber that falls too far behind, or that was
+listening while the LISTEN connection dropped, is closed so that it
+reconnects and catches up the same way.
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from uuid import UUID
+
+from tortoise import connections
+from tortoise.expressions import Q
+
+from models.models import Notification
+from services.pagination import decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_HUB_BACKEND = os.getenv("NOTIFY_HUB_BACKEND", "memory")
+NOTIFY_HUB_CHANNEL = os.getenv("NOTIFY_HUB_CHANNEL", "notifications")
+# Events buffered per open stream before it is closed as too slow
+SSE_SUBSCRIBER_QUEUE = int(os.getenv("SSE_SUBSCRIBER_QUEUE", 100))
+SSE_REPLAY_LIMIT = int(os.getenv("SSE_REPLAY_LIMIT", 200))
+LISTEN_RETRY_SECONDS = float(os.getenv("NOTIFY_HUB_LISTEN_RETRY_SECONDS", 5))
+# Postgres rejects NOTIFY payloads from 8000 bytes
+_MAX_PAYLOAD = 7900
+
+
+def notification_event(notification: Notification) -> dict:
+    return {
+        "id": str(notification.id),
+        "cursor": encode_cursor(notification.created_at, notification.id),
+        "recipient_id": str(notification.recipient_id),
+        "organization_id": str(notification.organization_id),
+        "title": notification.title,
+        "message": notification.message,
+        "read": notification.read,
+        "metadata": notification.metadata,
+        "created_at": notification.created_at.isoformat(),
+    }
+
+
+class Subscription:
+    def __init__(self, recipient_id: str):
+        self.recipient_id = recipient_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SSE_SUBSCRIBER_QUEUE)
+        # Set when the hub gives up on this subscriber; the stream ends
+        self.closed = asyncio.Event()
+
+    async def next_event(self, timeout: float) -> dict | None:
+        """
+        The next event, or None after `timeout` seconds or once closed.
+        """
+        get = asyncio.ensure_future(self.queue.get())
+        closed = asyncio.ensure_future(self.closed.wait())
+        done, pending = await asyncio.wait({get, closed}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        return get.result() if get in done else None
+
+
+class NotificationHub:
+    def __init__(self):
+        self._subscribers: dict[str, set[Subscription]] = defaultdict(set)
+        self._listener: asyncio.Task | None = None
+        self.stats = {"published": 0, "delivered": 0, "evicted": 0, "listen_reconnects": 0}
+
+    def subscribe(self, recipient_id) -> Subscription:
+        subscription = Subscription(str(recipient_id))
+        self._subscribers[subscription.recipient_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.recipient_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.recipient_id]
+
+    def deliver(self, event: dict):
+        for subscription in list(self._subscribers.get(event["recipient_id"], ())):
+            try:
+                subscription.queue.put_nowait(event)
+                self.stats["delivered"] += 1
+            except asyncio.QueueFull:
+                # It reconnects with Last-Event-ID and replays from the table
+                self._evict(subscription)
+
+    def _evict(self, subscription: Subscription):
+        self.stats["evicted"] += 1
+        subscription.closed.set()
+        self.unsubscribe(subscription)
+
+    def evict_all(self):
+        for subscribers in list(self._subscribers.values()):
+            for subscription in list(subscribers):
+                self._evict(subscription)
+
+    def start(self):
+        if NOTIFY_HUB_BACKEND == "postgres":
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        self.evict_all()
+
+    async def _listen(self):
+        import asyncpg
+        from auth.config import get_settings
+
+        dsn = get_settings().db_url
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn)
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda _: lost.set())
+                await conn.add_listener(
+                    NOTIFY_HUB_CHANNEL,
+                    lambda _conn, _pid, _channel, payload: asyncio.create_task(self._on_payload(payload))
+                )
+                await lost.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Notification LISTEN connection failed")
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            # Anything published meanwhile was missed; make streams catch up
+            self.stats["listen_reconnects"] += 1
+            self.evict_all()
+            await asyncio.sleep(LISTEN_RETRY_SECONDS)
+
+    async def _on_payload(self, payload: str):
+        try:
+            event = json.loads(payload)
+            if "cursor" not in event:
+                # Too big for NOTIFY, only the id came through
+                event = notification_event(await Notification.get(id=event["id"]))
+        except Exception:
+            logger.exception("Dropping unreadable notification payload")
+            return
+        self.deliver(event)
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "backend": NOTIFY_HUB_BACKEND,
+            "recipients": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "listening": self._listener is not None and not self._listener.done(),
+        }
+
+
+_hub: NotificationHub | None = None
+
+
+def start_notification_hub():
+    global _hub
+    if _hub is None:
+        _hub = NotificationHub()
+        _hub.start()
+
+
+async def stop_notification_hub():
+    global _hub
+    if _hub is not None:
+        await _hub.stop()
+        _hub = None
+
+
+def get_hub() -> NotificationHub | None:
+    return _hub
+
+
+def notification_hub_stats() -> dict:
+    return _hub.metrics() if _hub else {"running": False, "backend": NOTIFY_HUB_BACKEND}
+
+
+async def publish_notification(notification: Notification):
+    """
+    Called after the notification row is written. Never raises: a stream
+    that misses the event catches up on its next reconnect.
+    """
+    event = notification_event(notification)
+    try:
+        if NOTIFY_HUB_BACKEND == "postgres":
+            payload = json.dumps(event)
+            if len(payload.encode()) > _MAX_PAYLOAD:
+                payload = json.dumps({"id": event["id"], "recipient_id": event["recipient_id"]})
+            await connections.get("default").execute_query(
+                "SELECT pg_notify($1, $2)", [NOTIFY_HUB_CHANNEL, payload]
+            )
+        elif _hub is not None:
+            _hub.deliver(event)
+        else:
+            return
+    except Exception:
+        logger.exception("Publishing notification %s failed", event["id"])
+        return
+    if _hub is not None:
+        _hub.stats["published"] += 1
+
+
+async def replay_after(recipient_id, cursor: str) -> list[dict]:
+    """
+    Events for the recipient's notifications newer than `cursor`, oldest
+    first, at most SSE_REPLAY_LIMIT. Raises ValueError on a bad cursor.
+    """
+    created_at, id = decode_cursor(cursor)
+    rows = await Notification.filter(
+        Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=id),
+        recipient_id=recipient_id
+    ).order_by("created_at", "id").limit(SSE_REPLAY_LIMIT)
+    return [notification_event(row) for row in rows]
+
+
+def is_seen(event: dict, last: tuple | None) -> bool:
+    """
+    Whether `event` is at or before `last` (created_at, id), i.e. was
+    already sent on this stream.
+    """
+    if last is None:
+        return False
+    created_at, id = decode_cursor(event["cursor"])
+    return (created_at, UUID(str(id))) <= last
@@ -1,4 +1,38 @@
-from models.models import Notification, User, Organization
+import uuid
+
+from tortoise import timezone
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+
+from db import sql_placeholders
+from models.models import Notification, NotificationCounter, User, Organization
+from services.notification_hub import publish_notification
+from services.pagination import keyset_page
+
+# Most ids one bulk mark-as-read accepts
+MAX_READ_BATCH = 500
+
+
+async def _count_new_unread(conn, recipient_id):
+    # Upsert: the first notification of a recipient creates the counter
+    now = timezone.now()
+    placeholders = sql_placeholders(conn, 5)
+    await conn.execute_query(
+        'INSERT INTO "notificationcounter" ("id", "created_at", "updated_at", "recipient_id", "unread") '
+        f'VALUES ({", ".join(placeholders)}) '
+        'ON CONFLICT ("recipient_id") DO UPDATE SET '
+        '"unread" = "notificationcounter"."unread" + 1, "updated_at" = EXCLUDED."updated_at"',
+        [str(uuid.uuid4()), now, now, str(recipient_id), 1]
+    )
+
+
+async def _count_read(conn, recipient_id, count: int):
+    if count:
+        await NotificationCounter.filter(recipient_id=recipient_id).using_db(conn).update(
+            unread=F("unread") - count,
+            updated_at=timezone.now()
+        )
+
 
 async def create_notification(
     *,
@@ -8,25 +42,63 @@ async def create_notification(
     message: str,
     metadata: dict | None = None
 ):
-    return await Notification.create(
-        organization=organization,
-        recipient=recipient,
-        title=title,
-        message=message,
-        metadata=metadata
-    )
+    recipient_id = getattr(recipient, "id", recipient)
+    async with in_transaction() as conn:
+        notification = await Notification.create(
+            organization_id=getattr(organization, "id", organization),
+            recipient_id=recipient_id,
+            title=title,
+            message=message,
+            metadata=metadata,
+            using_db=conn
+        )
+        await _count_new_unread(conn, recipient_id)
+    # Pushed to the recipient's open /notifications/stream connections
+    await publish_notification(notification)
+    return notification
 
 async def mark_notification_as_read(notification_id: str, user: User):
     notif = await Notification.get_or_none(id=notification_id, recipient=user)
-    if notif:
+    if notif and not notif.read:
+        await mark_notifications_as_read(user, ids=[notif.id])
         notif.read = True
-        await notif.save()
     return notif
 
-async def list_notifications(user: User, unread_only: bool = False, limit: int = 50, offset: int = 0):
+
+async def mark_notifications_as_read(user: User, ids: list | None = None) -> int:
+    """
+    Marks the given notifications of `user` read, or all of them when `ids`
+    is None, in one UPDATE. Returns how many were unread.
+    Raises ValueError on more than MAX_READ_BATCH ids.
+    """
+    qs = Notification.filter(recipient_id=user.id, read=False)
+    if ids is not None:
+        if len(ids) > MAX_READ_BATCH:
+            raise ValueError(f"At most {MAX_READ_BATCH} notifications per request")
+        if not ids:
+            return 0
+        qs = qs.filter(id__in=ids)
+
+    async with in_transaction() as conn:
+        # Only rows this UPDATE flips count; a concurrent one sees read=True
+        updated = await qs.using_db(conn).update(read=True, updated_at=timezone.now())
+        await _count_read(conn, user.id, updated)
+    return updated
+
+
+async def unread_count(user: User) -> int:
+    counts = await NotificationCounter.filter(recipient_id=user.id).values_list("unread", flat=True)
+    return max(counts[0], 0) if counts else 0
+
+async def list_notifications(
+    user: User,
+    unread_only: bool = False,
+    limit: int = 50,
+    offset: int = 0,
+    cursor: str | None = None,
+    include_total: bool | None = None
+):
     qs = Notification.filter(recipient=user)
     if unread_only:
         qs = qs.filter(read=False)
-    total = await qs.count()
-    notifications = await qs.order_by("-created_at").limit(limit).offset(offset)
-    return {"total": total, "limit": limit, "offset": offset, "items": notifications}
+    return await keyset_page(qs, limit=limit, cursor=cursor, offset=offset, include_total=include_total)
@@ -0,0 +1,187 @@
+"""
+Receipt OCR job queue.
+
+Jobs are Receipt rows: `ocr_status` moves queued -> processing -> done, or
+back to queued with a jittered exponential backoff when an attempt fails.
+After OCR_MAX_ATTEMPTS the receipt is parked as "dead" with the last error.
+Workers (worker.py) claim rows with a conditional UPDATE, so any number of
+them can poll the same table without handing a job out twice. A job whose
+worker died is requeued once its lock is older than OCR_LOCK_TIMEOUT, and
+counts against OCR_MAX_ATTEMPTS like a failed attempt.
+"""
+import asyncio
+import logging
+import os
+import random
+from datetime import timedelta
+from enum import Enum
+
+from tortoise import timezone
+from tortoise.expressions import F
+from tortoise.functions import Count
+
+from models.models import Receipt
+
+logger = logging.getLogger(__name__)
+
+OCR_CONCURRENCY = int(os.getenv("OCR_CONCURRENCY", 4))
+OCR_MAX_ATTEMPTS = int(os.getenv("OCR_MAX_ATTEMPTS", 5))
+OCR_BACKOFF_BASE = float(os.getenv("OCR_BACKOFF_BASE_SECONDS", 10))
+OCR_BACKOFF_MAX = float(os.getenv("OCR_BACKOFF_MAX_SECONDS", 900))
+OCR_POLL_INTERVAL = float(os.getenv("OCR_POLL_INTERVAL_SECONDS", 2))
+OCR_LOCK_TIMEOUT = float(os.getenv("OCR_LOCK_TIMEOUT_SECONDS", 600))
+
+STALE_LOCK_ERROR = "Worker lock expired"
+
+
+class OcrStatus(str, Enum):
+    QUEUED = "queued"
+    PROCESSING = "processing"
+    DONE = "done"
+    DEAD = "dead"
+
+
+def backoff_delay(attempt: int) -> float:
+    # Equal jitter: at least half the exponential delay, so retries spread out
+    # without ever firing immediately
+    delay = min(OCR_BACKOFF_MAX, OCR_BACKOFF_BASE * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+async def claim_jobs(limit: int) -> list:
+    now = timezone.now()
+    candidates = await Receipt.filter(
+        ocr_status=OcrStatus.QUEUED,
+        ocr_next_attempt_at__lte=now
+    ).order_by("ocr_next_attempt_at").limit(limit).values_list("id", flat=True)
+
+    claimed = []
+    for receipt_id in candidates:
+        # Only one worker sees its UPDATE match the still-queued row
+        won = await Receipt.filter(id=receipt_id, ocr_status=OcrStatus.QUEUED).update(
+            ocr_status=OcrStatus.PROCESSING,
+            ocr_locked_at=now,
+            ocr_attempts=F("ocr_attempts") + 1
+        )
+        if won:
+            claimed.append(receipt_id)
+    return claimed
+
+
+async def requeue_stale_jobs() -> tuple[int, int]:
+    """
+    Requeues jobs whose worker died mid-attempt; returns (requeued, dead).
+    claim_jobs() already counted the attempt, so a receipt that keeps
+    killing its worker is parked as dead after OCR_MAX_ATTEMPTS like any
+    other failure instead of being handed out forever.
+    """
+    now = timezone.now()
+    stale = Receipt.filter(
+        ocr_status=OcrStatus.PROCESSING,
+        ocr_locked_at__lt=now - timedelta(seconds=OCR_LOCK_TIMEOUT)
+    )
+    dead = await stale.filter(ocr_attempts__gte=OCR_MAX_ATTEMPTS).update(
+        ocr_status=OcrStatus.DEAD,
+        ocr_error=STALE_LOCK_ERROR,
+        ocr_locked_at=None,
+        ocr_next_attempt_at=None
+    )
+    requeued = await stale.filter(ocr_attempts__lt=OCR_MAX_ATTEMPTS).update(
+        ocr_status=OcrStatus.QUEUED,
+        ocr_error=STALE_LOCK_ERROR,
+        ocr_locked_at=None,
+        ocr_next_attempt_at=now
+    )
+    return requeued, dead
+
+
+async def complete_job(receipt_id):
+    await Receipt.filter(id=receipt_id).update(
+        ocr_status=OcrStatus.DONE,
+        ocr_error=None,
+        ocr_locked_at=None
+    )
+
+
+async def fail_job(receipt_id, attempts: int, error: Exception, permanent: bool = False) -> str:
+    message = f"{type(error).__name__}: {error}"[:2000]
+    if permanent or attempts >= OCR_MAX_ATTEMPTS:
+        status, next_attempt_at = OcrStatus.DEAD, None
+    else:
+        status = OcrStatus.QUEUED
+        next_attempt_at = timezone.now() + timedelta(seconds=backoff_delay(attempts))
+
+    await Receipt.filter(id=receipt_id).update(
+        ocr_status=status,
+        ocr_error=message,
+        ocr_locked_at=None,
+        ocr_next_attempt_at=next_attempt_at
+    )
+    return status
+
+
+async def ocr_queue_stats() -> dict:
+    rows = await Receipt.annotate(count=Count("id")).group_by("ocr_status").values("ocr_status", "count")
+    return {row["ocr_status"]: row["count"] for row in rows}
+
+
+class OcrWorker:
+    """
+    Polls for queued receipts and runs `handler(receipt)` on at most
+    `concurrency` of them at a time.
+    """
+
+    def __init__(self, handler, concurrency: int = OCR_CONCURRENCY, poll_interval: float = OCR_POLL_INTERVAL):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._tasks: set[asyncio.Task] = set()
+        self.stats = {"claimed": 0, "done": 0, "retried": 0, "dead": 0, "requeued_stale": 0}
+
+    async def run(self, stop: asyncio.Event):
+        while not stop.is_set():
+            requeued, dead = await requeue_stale_jobs()
+            self.stats["requeued_stale"] += requeued
+            if dead:
+                self.stats["dead"] += dead
+                logger.error("%s receipt(s) parked as dead after their worker lock expired", dead)
+
+            free = self.concurrency - len(self._tasks)
+            claimed = await claim_jobs(free) if free > 0 else []
+            for receipt_id in claimed:
+                task = asyncio.create_task(self._run_job(receipt_id))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            self.stats["claimed"] += len(claimed)
+
+            if len(self._tasks) >= self.concurrency:
+                await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
+            elif not claimed:
+                try:
+                    await asyncio.wait_for(stop.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+        # Let in-flight jobs finish; anything cut short is requeued as stale
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run_job(self, receipt_id):
+        receipt = await Receipt.get(id=receipt_id).select_related("spend_event")
+        try:
+            await self.handler(receipt)
+        except Exception as e:
+            # A missing upload will not appear on retry
+            status = await fail_job(
+                receipt_id, receipt.ocr_attempts, e, permanent=isinstance(e, FileNotFoundError)
+            )
+            if status == OcrStatus.DEAD:
+                self.stats["dead"] += 1
+                logger.exception("Receipt %s OCR failed permanently", receipt_id)
+            else:
+                self.stats["retried"] += 1
+                logger.warning("Receipt %s OCR attempt %s failed: %s", receipt_id, receipt.ocr_attempts, e)
+            return
+
+        await complete_job(receipt_id)
+        self.stats["done"] += 1
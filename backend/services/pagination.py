@@ -0,0 +1,77 @@
+"""
+Keyset (cursor) pagination on (created_at, id).
+
+A cursor is the opaque, URL-safe encoding of the last row of a page. The next
+page is "rows strictly before that one" in (created_at DESC, id DESC) order,
+which the composite (scope, created_at, id) indexes serve directly, so a deep
+page costs the same as the first one.
+"""
+import base64
+import json
+from datetime import datetime
+from uuid import UUID
+
+from tortoise.expressions import Q
+
+
+def encode_cursor(created_at: datetime, id) -> str:
+    raw = json.dumps([created_at.isoformat(), str(id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """
+    Raises ValueError on a malformed cursor.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        return datetime.fromisoformat(created_at), UUID(id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def rows_after(qs, created_at: datetime, id):
+    """
+    Narrows `qs` to the rows that follow (created_at, id) in newest-first order.
+    """
+    return qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=id))
+
+
+async def keyset_page(
+    qs,
+    *,
+    limit: int,
+    cursor: str | None = None,
+    offset: int = 0,
+    include_total: bool | None = None
+) -> dict:
+    """
+    Returns one page of `qs`, newest first, with a `next_cursor` to fetch the
+    following page (None on the last page).
+
+    `total` is included when asked for, and by default only on the first
+    page, so paging through results doesn't run count() every time.
+    `offset` is honoured for existing clients but only without a cursor.
+    """
+    page_qs = qs
+    if cursor:
+        page_qs = rows_after(page_qs, *decode_cursor(cursor))
+        offset = 0
+
+    rows = await page_qs.order_by("-created_at", "-id").offset(offset).limit(limit + 1)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    page = {
+        "limit": limit,
+        "offset": offset,
+        "next_cursor": encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
+        "items": rows,
+    }
+
+    if include_total is None:
+        include_total = cursor is None
+    if include_total:
+        page["total"] = await qs.count()
+    return page
@@ -0,0 +1,120 @@
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+
+from models.models import Policy
+from services.policy_conditions import Condition, RuleIndex, SpendFacts, compile_condition
+
+logger = logging.getLogger(__name__)
+
+# Safety net for multi-worker deployments: a worker that did not see the
+# version bump itself still reloads its rule set after this many seconds.
+POLICY_CACHE_TTL = float(os.getenv("POLICY_CACHE_TTL", 60))
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    policy_id: str
+    priority: int
+    condition: Condition
+    action: dict
+
+
+@dataclass
+class CompiledRuleSet:
+    organization_id: str
+    version: int
+    rules: list[CompiledRule]
+    loaded_at: float = field(default_factory=time.monotonic)
+
+    def __post_init__(self):
+        self.index = RuleIndex([rule.condition for rule in self.rules])
+
+    def match(self, facts: SpendFacts) -> list[CompiledRule]:
+        """
+        Returns matching rules in ascending priority order.
+        """
+        return [self.rules[i] for i in self.index.match(facts)]
+
+
+_rule_sets: dict[str, CompiledRuleSet] = {}
+_versions: dict[str, int] = {}
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _as_dict(value) -> dict:
+    # Rules created through the API are stored as JSON strings
+    if isinstance(value, str):
+        value = json.loads(value) if value.strip() else {}
+    return value or {}
+
+
+async def _load_rule_set(organization_id: str, version: int) -> CompiledRuleSet:
+    policies = await Policy.filter(
+        organization_id=organization_id,
+        is_active=True
+    ).order_by("created_at").prefetch_related("rules")
+
+    rules = []
+    for policy in policies:
+        for rule in policy.rules:
+            try:
+                condition = compile_condition(_as_dict(rule.condition))
+                action = _as_dict(rule.action)
+            except ValueError as e:
+                logger.warning("Skipping invalid policy rule %s: %s", rule.id, e)
+                continue
+            rules.append(CompiledRule(
+                policy_id=str(policy.id),
+                priority=rule.priority,
+                condition=condition,
+                action=action
+            ))
+
+    # Stable sort keeps policy order for rules sharing a priority
+    rules.sort(key=lambda r: r.priority)
+    return CompiledRuleSet(organization_id=organization_id, version=version, rules=rules)
+
+
+async def get_rule_set(organization_id) -> CompiledRuleSet:
+    """
+    Returns the compiled, priority-sorted rules of an organization.
+    Only a cache miss (first use, version bump or TTL expiry) hits the database.
+    """
+    organization_id = str(organization_id)
+    version = _versions.get(organization_id, 0)
+    cached = _rule_sets.get(organization_id)
+
+    if (
+        cached
+        and cached.version == version
+        and time.monotonic() - cached.loaded_at < POLICY_CACHE_TTL
+    ):
+        _stats["hits"] += 1
+        return cached
+
+    _stats["misses"] += 1
+    rule_set = await _load_rule_set(organization_id, version)
+
+    # Don't store a rule set that was invalidated while it was loading
+    if _versions.get(organization_id, 0) == version:
+        _rule_sets[organization_id] = rule_set
+    return rule_set
+
+
+def invalidate_policies(organization_id):
+    organization_id = str(organization_id)
+    _versions[organization_id] = _versions.get(organization_id, 0) + 1
+    _rule_sets.pop(organization_id, None)
+    _stats["invalidations"] += 1
+
+
+def policy_cache_stats() -> dict:
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "hit_rate": _stats["hits"] / lookups if lookups else 0.0,
+        "organizations": len(_rule_sets),
+    }
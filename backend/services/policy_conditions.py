@@ -0,0 +1,335 @@
+"""
+Policy condition language shared by policy evaluation and approver selection.
+
+A condition is a JSON object whose keys are ANDed together:
+
+    {"amount_gt": 500}                        amount > 500
+    {"amount_gte": 100, "amount_lt": 1000}    100 <= amount < 1000
+    {"amount_between": [100, 1000]}           100 <= amount <= 1000
+    {"category": "Travel"}                    category name (or id)
+    {"vendor": ["Uber", "Lyft"]}              any of these vendors
+    {"currency": ["EUR", "GBP"]}              any of these currencies
+    {"team": "Sales"}                         team name (or id)
+
+Any other key is compared for equality against the spend attribute of the
+same name, which keeps the original MVP conditions working.
+
+Conditions are compiled once per rule set into a RuleIndex: hash buckets on
+category, vendor, currency and team, plus a stabbing table over amount
+intervals. Matching a spend is a handful of dict lookups, one bisect and a
+few bitwise ANDs instead of evaluating every rule.
+"""
+from bisect import bisect_left
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from uuid import UUID
+
+from models.models import Category, Team, Vendor
+
+SET_DIMENSIONS = ("category", "vendor", "currency", "team")
+RELATED_MODELS = {"category": Category, "vendor": Vendor, "team": Team}
+
+_AMOUNT_BOUNDS = {
+    "amount_gt": ("lo", False),
+    "amount_gte": ("lo", True),
+    "amount_lt": ("hi", False),
+    "amount_lte": ("hi", True),
+}
+
+
+@dataclass(frozen=True)
+class Condition:
+    lo: Decimal | None = None
+    lo_inclusive: bool = True
+    hi: Decimal | None = None
+    hi_inclusive: bool = True
+    amount_constrained: bool = False
+    category: frozenset | None = None
+    vendor: frozenset | None = None
+    currency: frozenset | None = None
+    team: frozenset | None = None
+    residual: tuple = ()
+
+    @property
+    def amount_empty(self) -> bool:
+        if self.lo is None or self.hi is None:
+            return False
+        if self.lo == self.hi:
+            return not (self.lo_inclusive and self.hi_inclusive)
+        return self.lo > self.hi
+
+
+@dataclass(frozen=True)
+class SpendFacts:
+    spend: object
+    amount: Decimal | None
+    category: frozenset
+    vendor: frozenset
+    currency: frozenset
+    team: frozenset
+
+
+def _decimal(value, key: str) -> Decimal:
+    if isinstance(value, bool):
+        raise ValueError(f"'{key}' must be a number")
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"'{key}' must be a number")
+
+
+def _normalize(dimension: str, value) -> str:
+    value = str(value).strip()
+    return value.upper() if dimension == "currency" else value.lower()
+
+
+def compile_condition(condition: dict) -> Condition:
+    """
+    Parses a condition JSON object. Raises ValueError on malformed input.
+    """
+    if not isinstance(condition, dict):
+        raise ValueError("Condition must be a JSON object")
+
+    bounds = {"lo": None, "lo_inclusive": True, "hi": None, "hi_inclusive": True}
+    amount_constrained = False
+    sets = {}
+    residual = []
+
+    def tighten(side: str, value: Decimal, inclusive: bool):
+        current = bounds[side]
+        stricter = (
+            current is None
+            or (side == "lo" and value > current)
+            or (side == "hi" and value < current)
+        )
+        if stricter:
+            bounds[side] = value
+            bounds[f"{side}_inclusive"] = inclusive
+        elif value == current and not inclusive:
+            bounds[f"{side}_inclusive"] = False
+
+    for key, value in condition.items():
+        if key in _AMOUNT_BOUNDS:
+            side, inclusive = _AMOUNT_BOUNDS[key]
+            tighten(side, _decimal(value, key), inclusive)
+            amount_constrained = True
+        elif key == "amount_between":
+            if not isinstance(value, (list, tuple)) or len(value) != 2:
+                raise ValueError("'amount_between' must be a [min, max] pair")
+            tighten("lo", _decimal(value[0], key), True)
+            tighten("hi", _decimal(value[1], key), True)
+            amount_constrained = True
+        elif key == "amount":
+            amount = _decimal(value, key)
+            tighten("lo", amount, True)
+            tighten("hi", amount, True)
+            amount_constrained = True
+        elif key in SET_DIMENSIONS:
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            allowed = frozenset(_normalize(key, v) for v in values if v is not None)
+            # Repeated constraints on one dimension intersect
+            sets[key] = sets[key] & allowed if key in sets else allowed
+        else:
+            residual.append((key, value))
+
+    return Condition(
+        amount_constrained=amount_constrained,
+        residual=tuple(residual),
+        **bounds,
+        **sets,
+    )
+
+
+def _is_id(key: str) -> bool:
+    try:
+        UUID(key)
+    except ValueError:
+        return False
+    return True
+
+
+def _keys(dimension: str, related_id, row=None) -> frozenset:
+    keys = set()
+    if related_id is not None:
+        keys.add(_normalize(dimension, related_id))
+    if row is not None:
+        keys.add(_normalize(dimension, row.name))
+        normalized_name = getattr(row, "normalized_name", None)
+        if normalized_name:
+            keys.add(_normalize(dimension, normalized_name))
+    return frozenset(keys)
+
+
+async def spend_facts_bulk(spends, named: frozenset = frozenset()) -> list[SpendFacts]:
+    """
+    Collects the values conditions are evaluated against. Category, vendor
+    and team match on the spend's foreign key ids; their rows are only
+    needed for the dimensions in `named` (RuleIndex.named_dimensions), and
+    the ones not loaded with the spends cost one query per dimension for
+    the whole batch.
+    """
+    rows = {}
+    for dimension in named:
+        model = RELATED_MODELS[dimension]
+        loaded, missing = {}, set()
+        for spend in spends:
+            related_id = getattr(spend, f"{dimension}_id", None)
+            row = getattr(spend, dimension, None)
+            if related_id is None:
+                continue
+            if isinstance(row, model) and str(row.id) == str(related_id):
+                loaded[str(row.id)] = row
+            else:
+                missing.add(related_id)
+        if missing:
+            for row in await model.filter(id__in=missing):
+                loaded[str(row.id)] = row
+        rows[dimension] = loaded
+
+    def related(spend, dimension):
+        related_id = getattr(spend, f"{dimension}_id", None)
+        row = rows.get(dimension, {}).get(str(related_id)) if related_id is not None else None
+        return _keys(dimension, related_id, row)
+
+    return [
+        SpendFacts(
+            spend=spend,
+            amount=Decimal(str(spend.amount)) if spend.amount is not None else None,
+            category=related(spend, "category"),
+            vendor=related(spend, "vendor"),
+            currency=_keys("currency", spend.currency),
+            team=related(spend, "team"),
+        )
+        for spend in spends
+    ]
+
+
+async def spend_facts(spend, named: frozenset = frozenset()) -> SpendFacts:
+    """
+    spend_facts_bulk for one spend. No query unless a rule in `named`
+    matches by name and the related row was not loaded.
+    """
+    return (await spend_facts_bulk([spend], named))[0]
+
+
+class RuleIndex:
+    """
+    Decision structure over a list of conditions. Bit i of every mask stands
+    for conditions[i], so the caller's ordering (priority) is preserved.
+    """
+
+    def __init__(self, conditions: list[Condition]):
+        self.size = len(conditions)
+        self._buckets = {dimension: {} for dimension in SET_DIMENSIONS}
+        self._wildcards = {dimension: 0 for dimension in SET_DIMENSIONS}
+        self._residual = {}
+
+        for i, condition in enumerate(conditions):
+            bit = 1 << i
+            for dimension in SET_DIMENSIONS:
+                allowed = getattr(condition, dimension)
+                if allowed is None:
+                    self._wildcards[dimension] |= bit
+                    continue
+                buckets = self._buckets[dimension]
+                for key in allowed:
+                    buckets[key] = buckets.get(key, 0) | bit
+            if condition.residual:
+                self._residual[i] = condition.residual
+
+        # Dimensions with a rule that matches by name rather than id
+        self.named_dimensions = frozenset(
+            dimension for dimension in RELATED_MODELS
+            if any(not _is_id(key) for key in self._buckets[dimension])
+        )
+
+        self._amount_any = 0
+        self._build_amount_index(conditions)
+
+    def _build_amount_index(self, conditions: list[Condition]):
+        points = set()
+        for condition in conditions:
+            if condition.lo is not None:
+                points.add(condition.lo)
+            if condition.hi is not None:
+                points.add(condition.hi)
+        self._points = sorted(points)
+
+        # Regions alternate open gap / single point:
+        # (-inf, p0), [p0], (p0, p1), [p1], ..., [pN-1], (pN-1, +inf)
+        last_region = 2 * len(self._points)
+        starts = [0] * (last_region + 2)
+        ends = [0] * (last_region + 2)
+
+        for i, condition in enumerate(conditions):
+            bit = 1 << i
+            if not condition.amount_constrained:
+                self._amount_any |= bit
+                continue
+            if condition.amount_empty:
+                # Contradictory range (e.g. gt 500 and lt 100) never matches
+                continue
+
+            if condition.lo is None:
+                first = 0
+            else:
+                index = bisect_left(self._points, condition.lo)
+                first = 2 * index + 1 if condition.lo_inclusive else 2 * index + 2
+
+            if condition.hi is None:
+                last = last_region
+            else:
+                index = bisect_left(self._points, condition.hi)
+                last = 2 * index + 1 if condition.hi_inclusive else 2 * index
+
+            if first <= last:
+                starts[first] |= bit
+                ends[last + 1] |= bit
+
+        self._regions = []
+        active = 0
+        for region in range(last_region + 1):
+            active = (active | starts[region]) & ~ends[region]
+            self._regions.append(active)
+
+    def _region(self, amount: Decimal) -> int:
+        index = bisect_left(self._points, amount)
+        if index < len(self._points) and self._points[index] == amount:
+            return 2 * index + 1
+        return 2 * index
+
+    def candidates(self, facts: SpendFacts) -> int:
+        if facts.amount is None:
+            mask = self._amount_any
+        else:
+            mask = self._amount_any | self._regions[self._region(facts.amount)]
+
+        for dimension in SET_DIMENSIONS:
+            if not mask:
+                return 0
+            allowed = self._wildcards[dimension]
+            buckets = self._buckets[dimension]
+            for key in getattr(facts, dimension):
+                allowed |= buckets.get(key, 0)
+            mask &= allowed
+        return mask
+
+    def match(self, facts: SpendFacts) -> list[int]:
+        """
+        Returns the indexes of matching conditions in ascending order.
+        """
+        mask = self.candidates(facts)
+        matched = []
+        while mask:
+            lowest = mask & -mask
+            index = lowest.bit_length() - 1
+            mask ^= lowest
+
+            residual = self._residual.get(index)
+            if residual and any(
+                getattr(facts.spend, name, None) != expected
+                for name, expected in residual
+            ):
+                continue
+            matched.append(index)
+        return matched
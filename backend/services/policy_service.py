@@ -1,52 +1,120 @@
-from models.models import Policy, PolicyRule, SpendEvent, Category
+from collections import defaultdict
+from models.models import AuditLog, Policy, PolicyRule, SpendEvent, Category
 from services.approval_service import request_approval
 from services.audit_service import log_action
-from spend_state import transition_spend, SpendStatus
+from services.policy_cache import get_rule_set
+from services.policy_conditions import spend_facts, spend_facts_bulk
+from services.spend_rollup import record_rollup_change, rollup_entry
+from spend_state import lock_spend, transition_spend, transition_spends, SpendStatus, TRANSITIONS
+from tortoise.transactions import in_transaction
 import asyncio
 
 async def evaluate_policies(spend):
-    policies = await Policy.filter(
-        organization=spend.organization,
-        is_active=True
-    ).prefetch_related("rules")
+    # Compiled rules come from the per-organization cache (no DB round-trip on a hit)
+    rule_set = await get_rule_set(spend.organization_id)
 
-    actions = []
-
-    for policy in policies:
-        for rule in sorted(policy.rules, key=lambda r: r.priority):
-            if _match_condition(rule.condition, spend):
-                actions.append(rule.action)
+    facts = await spend_facts(spend, rule_set.index.named_dimensions)
+    actions = [rule.action for rule in rule_set.match(facts)]
 
     await _apply_actions(spend, actions)
 
 
-def _match_condition(condition: dict, spend: SpendEvent) -> bool:
-    for field, expected in condition.items():
-        value = getattr(spend, field, None)
-        if value != expected:
-            return False
-    return True
-
+async def evaluate_policies_bulk(spends: list[SpendEvent]) -> dict:
+    """
+    Evaluates a batch of freshly created spends of one organization.
 
-async def _apply_actions(spend: SpendEvent, actions: list[dict]):
-    for action in actions:
-        action_type = action.get("type")
+    Statuses are grouped and written with one UPDATE per resulting status and
+    the policy_evaluated audit rows with one bulk insert. Only spends that
+    need an approver go through request_approval individually.
 
-        if action_type == "require_approval":
+    Returns {spend id: error} for the spends whose approval could not be
+    requested; they keep their status and the rest of the batch goes on.
+    """
+    if not spends:
+        return {}
+
+    rule_set = await get_rule_set(spends[0].organization_id)
+
+    by_status = defaultdict(list)
+    approval_requests = []
+    audit_rows = []
+
+    for facts in await spend_facts_bulk(spends, rule_set.index.named_dimensions):
+        spend = facts.spend
+        actions = [rule.action for rule in rule_set.match(facts)]
+
+        status = SpendStatus(spend.status)
+        approval_action = None
+        for action in actions:
+            target = _ACTION_STATUS.get(action.get("type"))
+            # Terminal decisions stick, like transition_spend enforces one by one
+            if target and target in TRANSITIONS[status]:
+                status = target
+                if target == SpendStatus.AWAITING_APPROVAL:
+                    approval_action = action
+
+        if approval_action:
+            # request_approval moves it, together with creating the approval
+            approval_requests.append((spend, approval_action))
+            if status != SpendStatus.AWAITING_APPROVAL:
+                by_status[status].append(spend)
+        elif status != spend.status:
+            by_status[status].append(spend)
+
+        audit_rows.append(AuditLog(
+            organization_id=spend.organization_id,
+            actor_id=spend.user_id,
+            entity_type="SpendEvent",
+            entity_id=spend.id,
+            action="policy_evaluated",
+            metadata={"actions": actions}
+        ))
+
+    errors = {}
+    for spend, action in approval_requests:
+        try:
             await request_approval(spend, action)
-            await transition_spend(spend, SpendStatus.AWAITING_APPROVAL)
+        except ValueError as e:
+            # The spend is committed already; only this item reports it
+            errors[spend.id] = str(e)
+
+    for status, group in by_status.items():
+        await transition_spends(group, status, reason="policy")
+
+    for row in audit_rows:
+        if row.entity_id in errors:
+            row.metadata = {**row.metadata, "error": errors[row.entity_id]}
+    await AuditLog.bulk_create(audit_rows, batch_size=500)
+    return errors
 
-        elif action_type == "auto_approve":
-            await transition_spend(spend, SpendStatus.APPROVED)
 
-        elif action_type == "block":
-            await transition_spend(spend, SpendStatus.BLOCKED)
+_ACTION_STATUS = {
+    "require_approval": SpendStatus.AWAITING_APPROVAL,
+    "auto_approve": SpendStatus.APPROVED,
+    "block": SpendStatus.BLOCKED,
+}
+
+
+async def _apply_actions(spend: SpendEvent, actions: list[dict]):
+    for action in actions:
+        target = _ACTION_STATUS.get(action.get("type"))
+        # Terminal decisions stick: later actions can't undo a block or approval
+        if target is None or target not in TRANSITIONS[SpendStatus(spend.status)]:
+            continue
+
+        if target == SpendStatus.AWAITING_APPROVAL:
+            moved = await request_approval(spend, action) is not None
+        else:
+            moved = await transition_spend(spend, target, reason="policy")
+        if not moved:
+            # Someone else changed the spend meanwhile; their decision stands
+            break
 
     # Always log after applying actions
     from services.audit_service import log_action
     await log_action(
-        organization=spend.organization,
-        actor=spend.user,
+        organization=spend.organization_id,
+        actor=spend.user_id,
         entity=spend,
         action="policy_evaluated",
         metadata={"actions": actions}
@@ -62,18 +130,20 @@ async def auto_categorize_spend(spend: SpendEvent, vendor_name: str):
 
     # Simple exact match for MVP; can improve with advanced matching later
     category = await Category.get_or_none(
-        organization=spend.organization,
+        organization_id=spend.organization_id,
         name__iexact=vendor_name
     )
 
-    if category:
-        spend.category = category
-        await spend.save()
-    else:
+    if not category:
         # Optional: create "Uncategorized" if no match
-        category = await Category.get_or_create(
-            organization=spend.organization,
+        category, _ = await Category.get_or_create(
+            organization_id=spend.organization_id,
             name="Uncategorized"
         )
-        spend.category = category[0]
-        await spend.save()
+
+    async with in_transaction() as conn:
+        await lock_spend(spend, conn)
+        before = rollup_entry(spend)
+        spend.category = category
+        await spend.save(update_fields=["category_id", "updated_at"], using_db=conn)
+        await record_rollup_change([before], [rollup_entry(spend)], using_db=conn)
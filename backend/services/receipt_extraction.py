@@ -0,0 +1,394 @@
+"""
+Local receipt extraction, tried before the LLM.
+
+Most receipts are machine-generated, so the fields can usually be read
+straight out of the file:
+
+    structured:ubl / structured:cii   XML e-invoices (also when embedded in a
+                                      Factur-X / ZUGFeRD PDF)
+    structured:json                   JSON receipts
+    pdf_text / text                   text layer of a PDF, or a plain-text
+                                      receipt, read by regex heuristics
+
+Every result carries a confidence. Below LOCAL_EXTRACTION_MIN_CONFIDENCE the
+caller falls back to the LLM, sending the text we found instead of the file
+when there is one.
+
+PDF support needs the optional `pypdf` package; without it PDFs go straight
+to the LLM.
+"""
+import io
+import json
+import logging
+import math
+import os
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+import defusedxml.ElementTree as SafeET
+from defusedxml import DefusedXmlException
+
+from services.gemini_service import InvoiceData, LineItem
+
+logger = logging.getLogger(__name__)
+
+LOCAL_EXTRACTION_MIN_CONFIDENCE = float(os.getenv("LOCAL_EXTRACTION_MIN_CONFIDENCE", 0.75))
+PDF_MAX_PAGES = int(os.getenv("LOCAL_EXTRACTION_PDF_MAX_PAGES", 5))
+# Text sent to the LLM when local confidence is too low
+MAX_TEXT_CHARS = 20000
+
+EMBEDDED_INVOICE_NAMES = ("factur-x.xml", "zugferd-invoice.xml", "xrechnung.xml", "zugferd.xml")
+
+
+@dataclass
+class LocalExtraction:
+    path: str
+    confidence: float
+    data: InvoiceData | None = None
+    text: str | None = None
+
+
+# Structured e-invoices
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _find(element, path: str):
+    """
+    Namespace-agnostic descent: "A/B" matches children by local name.
+    """
+    for name in path.split("/"):
+        if element is None:
+            return None
+        element = next((child for child in element if _local(child.tag) == name), None)
+    return element
+
+
+def _text(element, path: str) -> str | None:
+    found = _find(element, path)
+    if found is None or found.text is None:
+        return None
+    return found.text.strip() or None
+
+
+def _children(element, name: str):
+    return [child for child in element if _local(child.tag) == name]
+
+
+def _amount(value) -> float | None:
+    if value is None:
+        return None
+    try:
+        amount = float(Decimal(str(value).strip()))
+    except InvalidOperation:
+        return None
+    # NaN, Infinity, or too large for a float
+    return amount if math.isfinite(amount) else None
+
+
+def _parse_ubl(root) -> InvoiceData | None:
+    vendor = (
+        _text(root, "AccountingSupplierParty/Party/PartyName/Name")
+        or _text(root, "AccountingSupplierParty/Party/PartyLegalEntity/RegistrationName")
+    )
+    total = _amount(
+        _text(root, "LegalMonetaryTotal/PayableAmount")
+        or _text(root, "LegalMonetaryTotal/TaxInclusiveAmount")
+    )
+    if not vendor or total is None:
+        return None
+
+    items = []
+    for line in _children(root, "InvoiceLine") + _children(root, "CreditNoteLine"):
+        price = _amount(_text(line, "Price/PriceAmount"))
+        if price is None:
+            continue
+        quantity = _amount(_text(line, "InvoicedQuantity") or _text(line, "CreditedQuantity")) or 1
+        items.append(LineItem(
+            description=_text(line, "Item/Name") or _text(line, "Item/Description") or "",
+            quantity=max(int(quantity), 1),
+            price=price
+        ))
+    return InvoiceData(vendor_name=vendor, date=_text(root, "IssueDate"), items=items, total_amount=total)
+
+
+def _parse_cii(root) -> InvoiceData | None:
+    transaction = _find(root, "SupplyChainTradeTransaction")
+    if transaction is None:
+        return None
+    vendor = _text(transaction, "ApplicableHeaderTradeAgreement/SellerTradeParty/Name")
+    summation = _find(
+        transaction, "ApplicableHeaderTradeSettlement/SpecifiedTradeSettlementHeaderMonetarySummation"
+    )
+    total = None
+    if summation is not None:
+        total = _amount(_text(summation, "GrandTotalAmount") or _text(summation, "DuePayableAmount"))
+    if not vendor or total is None:
+        return None
+
+    # Format 102: YYYYMMDD
+    raw_date = _text(root, "ExchangedDocument/IssueDateTime/DateTimeString")
+    issue_date = None
+    if raw_date and re.fullmatch(r"\d{8}", raw_date):
+        issue_date = f"{raw_date[:4]}-{raw_date[4:6]}-{raw_date[6:]}"
+
+    items = []
+    for line in _children(transaction, "IncludedSupplyChainTradeLineItem"):
+        price = _amount(_text(line, "SpecifiedLineTradeAgreement/NetPriceProductTradePrice/ChargeAmount"))
+        if price is None:
+            continue
+        quantity = _amount(_text(line, "SpecifiedLineTradeDelivery/BilledQuantity")) or 1
+        items.append(LineItem(
+            description=_text(line, "SpecifiedTradeProduct/Name") or "",
+            quantity=max(int(quantity), 1),
+            price=price
+        ))
+    return InvoiceData(vendor_name=vendor, date=issue_date, items=items, total_amount=total)
+
+
+def _parse_xml(content) -> LocalExtraction | None:
+    # Uploaded files are untrusted: no entity expansion, no external fetches
+    try:
+        root = SafeET.fromstring(content)
+    except (ET.ParseError, DefusedXmlException):
+        return None
+
+    kind = _local(root.tag)
+    if kind in ("Invoice", "CreditNote"):
+        data, path = _parse_ubl(root), "structured:ubl"
+    elif kind == "CrossIndustryInvoice":
+        data, path = _parse_cii(root), "structured:cii"
+    else:
+        return None
+    if data is None:
+        return None
+    return LocalExtraction(path=path, confidence=1.0, data=data)
+
+
+def _parse_json(content) -> LocalExtraction | None:
+    try:
+        payload = json.loads(str(content, "utf-8"))
+    except ValueError:
+        return None
+    if not isinstance(payload, dict):
+        return None
+
+    vendor = payload.get("vendor_name") or payload.get("vendor") or payload.get("merchant")
+    if isinstance(vendor, dict):
+        vendor = vendor.get("name")
+    total = _amount(payload.get("total_amount", payload.get("total")))
+    if not vendor or total is None:
+        return None
+
+    items = []
+    for item in payload.get("items") or []:
+        price = _amount(item.get("price")) if isinstance(item, dict) else None
+        if price is None:
+            continue
+        items.append(LineItem(
+            description=str(item.get("description") or item.get("name") or ""),
+            quantity=max(int(_amount(item.get("quantity")) or 1), 1),
+            price=price
+        ))
+    data = InvoiceData(
+        vendor_name=str(vendor),
+        date=_normalize_date(str(payload["date"])) if payload.get("date") else None,
+        items=items,
+        total_amount=total
+    )
+    return LocalExtraction(path="structured:json", confidence=1.0, data=data)
+
+
+# Text heuristics
+
+_AMOUNT = r"[-]?\d{1,3}(?:[.,' ]\d{3})*(?:[.,]\d{2})|[-]?\d+(?:[.,]\d{2})"
+# Strongest first; "subtotal" lines never match
+_TOTAL_KEYWORDS = [
+    (re.compile(rf"(?:grand total|total due|amount due|balance due|total to pay|amount paid)\D{{0,20}}?({_AMOUNT})", re.I), 0.5),
+    (re.compile(rf"(?<!sub)(?<!sub )total\b\D{{0,20}}?({_AMOUNT})", re.I), 0.4),
+]
+_MONTHS = {
+    m: i + 1 for i, m in enumerate(
+        ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+    )
+}
+_DATE_PATTERNS = [
+    (re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b"), "ymd"),
+    (re.compile(r"\b(\d{1,2})[/.](\d{1,2})[/.](\d{4})\b"), "numeric"),
+    (re.compile(r"\b(\d{1,2})\s+([A-Za-z]{3})[a-z]*\.?\s+(\d{4})\b"), "d_mon_y"),
+    (re.compile(r"\b([A-Za-z]{3})[a-z]*\.?\s+(\d{1,2}),?\s+(\d{4})\b"), "mon_d_y"),
+]
+_NOT_VENDOR = re.compile(
+    r"^(invoice|receipt|tax invoice|bill|date|tel|phone|fax|www\.|http|page \d|order|no\.|#)", re.I
+)
+
+
+def _parse_number(raw: str) -> float | None:
+    raw = raw.replace(" ", "").replace("'", "")
+    decimal_sep = max(raw.rfind("."), raw.rfind(","))
+    if decimal_sep != -1 and len(raw) - decimal_sep - 1 == 2:
+        whole = re.sub(r"[.,]", "", raw[:decimal_sep])
+        raw = f"{whole}.{raw[decimal_sep + 1:]}"
+    else:
+        raw = re.sub(r"[.,]", "", raw)
+    return _amount(raw)
+
+
+def _normalize_date(raw: str) -> str | None:
+    found = _find_date(raw)
+    return found[0] if found else None
+
+
+def _find_date(text: str) -> tuple[str, bool] | None:
+    """
+    First date in the text as YYYY-MM-DD, and whether it was unambiguous.
+    """
+    for pattern, kind in _DATE_PATTERNS:
+        for match in pattern.finditer(text):
+            a, b, c = match.groups()
+            ambiguous = False
+            try:
+                if kind == "ymd":
+                    value = date(int(a), int(b), int(c))
+                elif kind == "numeric":
+                    first, second = int(a), int(b)
+                    # 03/04/2026 could be either order; day-first unless impossible
+                    ambiguous = first <= 12 and second <= 12 and first != second
+                    day, month = (second, first) if first <= 12 < second else (first, second)
+                    value = date(int(c), month, day)
+                elif kind == "d_mon_y":
+                    value = date(int(c), _MONTHS[b[:3].lower()], int(a))
+                else:
+                    value = date(int(c), _MONTHS[a[:3].lower()], int(b))
+            except (KeyError, ValueError):
+                continue
+            return value.isoformat(), not ambiguous
+    return None
+
+
+def _find_total(text: str) -> tuple[float, float] | None:
+    for pattern, weight in _TOTAL_KEYWORDS:
+        matches = list(pattern.finditer(text))
+        if matches:
+            # The last total on a receipt is the one that was paid
+            amount = _parse_number(matches[-1].group(1))
+            if amount is not None:
+                return amount, weight
+    return None
+
+
+def _find_vendor(lines: list[str]) -> str | None:
+    for line in lines[:8]:
+        if len(line) < 3 or not re.search(r"[A-Za-z]{2}", line) or _NOT_VENDOR.match(line):
+            continue
+        if re.search(_AMOUNT, line) and not re.search(r"[A-Za-z]{4}", line):
+            continue
+        return line[:255]
+    return None
+
+
+def extract_from_text(text: str, path: str) -> LocalExtraction:
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    text = "\n".join(lines)
+    confidence = 0.0
+
+    total = _find_total(text)
+    found_date = _find_date(text)
+    vendor = _find_vendor(lines)
+
+    if total:
+        confidence += total[1]
+    if found_date:
+        confidence += 0.25 if found_date[1] else 0.1
+    if vendor:
+        confidence += 0.25
+    if found_date and not found_date[1]:
+        # Day and month may be swapped: let the LLM read the date in context
+        confidence = min(confidence, max(LOCAL_EXTRACTION_MIN_CONFIDENCE - 0.05, 0))
+
+    data = None
+    if total and vendor:
+        data = InvoiceData(
+            vendor_name=vendor,
+            date=found_date[0] if found_date else None,
+            items=[],
+            total_amount=total[0]
+        )
+    return LocalExtraction(path=path, confidence=round(confidence, 2), data=data, text=text[:MAX_TEXT_CHARS])
+
+
+# Entry point
+
+def _pdf(file_data) -> LocalExtraction | None:
+    # Imported here: pypdf is optional and slow to import
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return None
+    try:
+        # mmap is already a seekable stream
+        stream = io.BytesIO(file_data) if isinstance(file_data, (bytes, bytearray)) else file_data
+        reader = PdfReader(stream)
+
+        # Factur-X / ZUGFeRD: the structured invoice rides along as an attachment
+        for name, contents in reader.attachments.items():
+            if name.lower() in EMBEDDED_INVOICE_NAMES:
+                for content in contents:
+                    result = _parse_xml(content)
+                    if result:
+                        return result
+
+        text = "\n".join(
+            page.extract_text() or "" for page in reader.pages[:PDF_MAX_PAGES]
+        )
+    except Exception as e:
+        logger.info("Could not read PDF text layer: %s", e)
+        return None
+
+    # Scanned PDFs have no (or next to no) text layer
+    if len(text.strip()) < 20:
+        return None
+    return extract_from_text(text, "pdf_text")
+
+
+def _decode_text(view: memoryview) -> str | None:
+    if b"\x00" in view[:4096]:
+        return None
+    try:
+        return str(view, "utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
+def extract_locally(file_data) -> LocalExtraction | None:
+    """
+    Runs the local tiers on a bytes-like receipt (bytes or mmap). Returns
+    None when the file has nothing we can read without the LLM (images,
+    scanned PDFs).
+    """
+    head = bytes(file_data[:1024]).lstrip()
+
+    if head.startswith(b"%PDF-"):
+        return _pdf(file_data)
+
+    # The parsers read the buffer in place instead of a bytes copy of the
+    # whole file; released before returning, so the caller can close an mmap
+    with memoryview(file_data) as view:
+        if head.startswith(b"<"):
+            result = _parse_xml(view)
+            if result:
+                return result
+
+        if head.startswith((b"{", b"[")):
+            result = _parse_json(view)
+            if result:
+                return result
+
+        text = _decode_text(view)
+    if text and text.strip():
+        return extract_from_text(text, "text")
+    return None
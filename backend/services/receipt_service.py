@@ -1,59 +1,170 @@
-from fastapi import BackgroundTasks
+import asyncio
+import logging
+import os
+from typing import AsyncIterator
+
+from tortoise import timezone
+from tortoise.transactions import in_transaction
+
 from models.models import Receipt
 from services.audit_service import log_action
 from services.spend_service import update_spend_after_receipt
 from services.policy_service import evaluate_policies
-from services.gemini_service import extract_receipt_data
+from services.gemini_service import InvoiceData, extract_receipt_data
 from services.policy_service import auto_categorize_spend
-from services.idempotency_service import is_duplicate, record_key
-async def attach_receipt(spend, background_tasks: BackgroundTasks, file_bytes: bytes, file_url:None):
+from services.ocr_queue import OcrStatus
+from services.blob_store import blob_key, get_blob_store, map_file
+from services.receipt_extraction import LOCAL_EXTRACTION_MIN_CONFIDENCE, extract_locally
+from services.extraction_cache import (
+    content_hash,
+    find_duplicate_receipts,
+    get_cached_extraction,
+    store_extraction,
+)
+
+logger = logging.getLogger(__name__)
+
+RECEIPT_MAX_BYTES = int(os.getenv("RECEIPT_MAX_BYTES", 20 * 1024 * 1024))
+
+
+async def attach_receipt(spend, file_chunks: AsyncIterator[bytes] | None = None, file_url: str | None = None):
+    """
+    Streams the upload into the blob store and queues it for OCR; worker.py
+    does the extraction. Raises BlobTooLarge past RECEIPT_MAX_BYTES.
+    """
+    digest = None
+    if file_chunks is not None:
+        blob = await get_blob_store().put_stream(file_chunks, max_size=RECEIPT_MAX_BYTES)
+        digest, file_url = blob.key, blob.url
+    if not file_url:
+        raise ValueError("Receipt file is required")
+
     receipt = await Receipt.create(
         spend_event=spend,
-        file_url=file_url if file_url else None
+        file_url=file_url,
+        content_hash=digest,
+        ocr_status=OcrStatus.QUEUED,
+        ocr_next_attempt_at=timezone.now()
     )
-    
 
     await log_action(
-        organization=spend.organization,
-        actor=spend.user,
+        organization=spend.organization_id,
+        actor=spend.user_id,
         entity=receipt,
         action="receipt_uploaded"
     )
 
-    background_tasks.add_task(_process_receipt_ocr, receipt, file_bytes)
+    duplicates = await find_duplicate_receipts(receipt, spend.organization_id)
+    if duplicates:
+        await log_action(
+            organization=spend.organization_id,
+            actor=spend.user_id,
+            entity=receipt,
+            action="receipt_duplicate_detected",
+            metadata={
+                "content_hash": digest,
+                "receipts": [str(d["id"]) for d in duplicates],
+                "spends": sorted({str(d["spend_event_id"]) for d in duplicates}),
+            }
+        )
 
     return receipt
 
-async def _process_receipt_ocr(receipt: Receipt, file_bytes: bytes):
-    key = f"receipt_ocr:{receipt.id}"
 
-    if await is_duplicate(key):
+def _open_receipt_file(receipt: Receipt):
+    key = blob_key(receipt.file_url)
+    if key:
+        return get_blob_store().open(key)
+    # Files spooled to a plain path before the blob store
+    return map_file(receipt.file_url)
+
+
+async def _extract(receipt: Receipt) -> tuple[InvoiceData, dict]:
+    """
+    Returns the extraction and how it was obtained ({"path": ..., ...}):
+    the content-hash cache, a local parser, or the LLM.
+    """
+    if receipt.content_hash:
+        cached = await get_cached_extraction(receipt.content_hash)
+        if cached is not None:
+            return InvoiceData.model_validate(cached), {"path": "cache"}
+
+    # Memory-mapped: pages are read as the parsers and encoder walk the file
+    with _open_receipt_file(receipt) as file_data:
+        if not receipt.content_hash:
+            # Stored without a hash (e.g. by an older API); saved with the result
+            receipt.content_hash = content_hash(file_data)
+            cached = await get_cached_extraction(receipt.content_hash)
+            if cached is not None:
+                return InvoiceData.model_validate(cached), {"path": "cache"}
+
+        try:
+            local = await asyncio.to_thread(extract_locally, file_data)
+        except Exception:
+            # A parser bug must not fail the job; the LLM reads the file instead
+            logger.exception("Local extraction of receipt %s failed", receipt.id)
+            local = None
+        if local and local.data and local.confidence >= LOCAL_EXTRACTION_MIN_CONFIDENCE:
+            data = local.data
+            extraction = {"path": local.path, "confidence": local.confidence}
+        elif local and local.text:
+            # The text layer is far smaller than the file and enough for the LLM
+            data = await extract_receipt_data(text_content=local.text)
+            extraction = {"path": "llm_text", "local_path": local.path, "local_confidence": local.confidence}
+        else:
+            data = await extract_receipt_data(file_bytes=file_data)
+            extraction = {"path": "llm"}
+
+    await store_extraction(receipt.content_hash, data.model_dump())
+    return data, extraction
+
+
+async def process_receipt_ocr(receipt: Receipt):
+    """
+    Runs one OCR job. Raising lets the queue retry the receipt later.
+
+    claim_jobs already hands each job to one worker. The results are
+    written in one transaction, and only while extracted_data is still
+    unset. A job requeued from a dead worker then either redoes everything
+    or, if the first run committed, finds it done.
+
+    Policies are evaluated after that commit: the approval emails and
+    notifications they send then never describe a rolled-back state, and
+    the spend row is not held locked while they run.
+    """
+    spend = receipt.spend_event
+    if receipt.extracted_data is not None:
         return
 
-    data = await extract_receipt_data(file_bytes=file_bytes)
+    data, extraction = await _extract(receipt)
+    extracted_data = {**data.dict(), "extraction": extraction}
 
-    receipt.extracted_data = data.dict()
-    receipt.is_verified = True
-    await receipt.save()
+    async with in_transaction() as conn:
+        # Leave the ocr_* job columns to the queue
+        won = await Receipt.filter(id=receipt.id, extracted_data__isnull=True).using_db(conn).update(
+            extracted_data=extracted_data,
+            is_verified=True,
+            content_hash=receipt.content_hash,
+            updated_at=timezone.now()
+        )
+        if not won:
+            return
+        receipt.extracted_data = extracted_data
+        receipt.is_verified = True
 
-    # Update SpendEvent fields
-    await update_spend_after_receipt(receipt.spend_event, data)
+        # Update SpendEvent fields
+        await update_spend_after_receipt(spend, data)
 
-    # Auto-categorize spend based on vendor
-    await auto_categorize_spend(receipt.spend_event, data.vendor_name)
+        # Auto-categorize spend based on vendor
+        await auto_categorize_spend(spend, data.vendor_name)
 
     # Re-run policy evaluation
-    await evaluate_policies(receipt.spend_event)
-    await record_key(
-        key=key,
-        scope="receipt_ocr",
-        organization=receipt.spend_event.organization
-    )
+    await evaluate_policies(spend)
+
     await log_action(
-        organization=receipt.spend_event.organization,
+        organization=spend.organization_id,
         actor=None,
         entity=receipt,
         action="receipt_processed",
-        metadata=data.dict()
+        metadata=extracted_data
     )
-    
\ No newline at end of file
@@ -0,0 +1,231 @@
+"""
+Pre-aggregated spend totals.
+
+SpendRollup holds sum and count per (organization, month, category, team,
+vendor, currency, status). Every write that changes one of those, or the
+amount, records the spend's entry before and after the change with
+record_rollup_change(), in the same transaction as the write. Dashboards
+then read a handful of rollup rows instead of scanning spendevent.
+
+rebuild_rollups() recomputes everything from spendevent (see
+scripts/rebuild_rollups.py), e.g. after a bulk fix-up done in SQL.
+"""
+import hashlib
+import uuid
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import NamedTuple
+
+from tortoise import connections, timezone
+from tortoise.functions import Count, Sum
+from tortoise.transactions import in_transaction
+
+from db import sql_placeholders
+from models.models import SpendEvent, SpendRollup
+
+CENT = Decimal("0.01")
+_INSERT_CHUNK = 200
+
+# Dimensions the summary can group by, and the rollup column behind each
+SUMMARY_DIMENSIONS = {
+    "month": "period",
+    "category": "category_id",
+    "team": "team_id",
+    "vendor": "vendor_id",
+    "status": "status",
+    "currency": "currency",
+}
+
+
+class RollupKey(NamedTuple):
+    organization_id: uuid.UUID
+    period: date
+    category_id: uuid.UUID | None
+    team_id: uuid.UUID | None
+    vendor_id: uuid.UUID | None
+    currency: str
+    status: str
+
+    @property
+    def hash(self) -> str:
+        raw = "|".join("" if part is None else str(part) for part in self)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def month_start(value) -> date:
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return value.replace(day=1)
+
+
+def rollup_entry(spend: SpendEvent) -> tuple[RollupKey, Decimal]:
+    """
+    Where `spend` currently counts, and for how much. Take one before
+    changing a spend and one after, and pass both to record_rollup_change.
+    """
+    key = RollupKey(
+        organization_id=spend.organization_id,
+        period=month_start(spend.spend_date),
+        category_id=spend.category_id,
+        team_id=spend.team_id,
+        vendor_id=spend.vendor_id,
+        currency=spend.currency,
+        status=str(getattr(spend.status, "value", spend.status)),
+    )
+    return key, Decimal(str(spend.amount)).quantize(CENT)
+
+
+async def record_rollup_change(before: list, after: list, using_db=None):
+    """
+    Moves entries out of their old rollup rows and into their new ones.
+    New spends have no `before`; entries that did not change cancel out.
+    """
+    deltas = defaultdict(lambda: [Decimal(0), 0])
+    for key, amount in before:
+        deltas[key][0] -= amount
+        deltas[key][1] -= 1
+    for key, amount in after:
+        deltas[key][0] += amount
+        deltas[key][1] += 1
+
+    changed = {key: delta for key, delta in deltas.items() if delta[0] or delta[1]}
+    if changed:
+        await _upsert(using_db or connections.get("default"), changed)
+
+
+_COLUMNS = (
+    "id", "created_at", "updated_at", "organization_id", "key", "period",
+    "category_id", "team_id", "vendor_id", "currency", "status", "total", "count",
+)
+
+
+async def _upsert(conn, deltas: dict):
+    postgres = conn.capabilities.dialect == "postgres"
+    now = timezone.now()
+
+    def _id(value):
+        return None if value is None else str(value)
+
+    rows = [
+        (
+            str(uuid.uuid4()), now, now, _id(key.organization_id), key.hash, key.period,
+            _id(key.category_id), _id(key.team_id), _id(key.vendor_id), key.currency, key.status,
+            # sqlite has no decimal type to bind to
+            total if postgres else str(total), count,
+        )
+        for key, (total, count) in deltas.items()
+    ]
+    columns_sql = ", ".join(f'"{column}"' for column in _COLUMNS)
+    for start in range(0, len(rows), _INSERT_CHUNK):
+        chunk = rows[start:start + _INSERT_CHUNK]
+        placeholders = sql_placeholders(conn, len(_COLUMNS) * len(chunk))
+        values_sql = ", ".join(
+            "(" + ", ".join(placeholders[i * len(_COLUMNS):(i + 1) * len(_COLUMNS)]) + ")"
+            for i in range(len(chunk))
+        )
+        await conn.execute_query(
+            f'INSERT INTO "spendrollup" ({columns_sql}) VALUES {values_sql} '
+            'ON CONFLICT ("key") DO UPDATE SET '
+            '"total" = "spendrollup"."total" + EXCLUDED."total", '
+            '"count" = "spendrollup"."count" + EXCLUDED."count", '
+            '"updated_at" = EXCLUDED."updated_at"',
+            [value for row in chunk for value in row]
+        )
+
+
+async def spend_summary(
+    organization_id,
+    group_by: list[str],
+    *,
+    start: date | None = None,
+    end: date | None = None,
+    status: str | None = None,
+    currency: str | None = None
+) -> list[dict]:
+    """
+    Totals from the rollups, grouped by `group_by` (keys of
+    SUMMARY_DIMENSIONS) and always by currency. `start` and `end` are
+    months, inclusive. Raises ValueError on an unknown dimension.
+    """
+    unknown = [name for name in group_by if name not in SUMMARY_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Cannot group by {', '.join(unknown)}")
+
+    columns = list(dict.fromkeys([SUMMARY_DIMENSIONS[name] for name in group_by] + ["currency"]))
+
+    qs = SpendRollup.filter(organization_id=organization_id, count__gt=0)
+    if start:
+        qs = qs.filter(period__gte=month_start(start))
+    if end:
+        qs = qs.filter(period__lte=month_start(end))
+    if status:
+        qs = qs.filter(status=status)
+    if currency:
+        qs = qs.filter(currency=currency)
+
+    rows = await qs.annotate(
+        total_amount=Sum("total"),
+        spend_count=Sum("count")
+    ).group_by(*columns).order_by(*columns).values(*columns, "total_amount", "spend_count")
+
+    names = {column: name for name, column in SUMMARY_DIMENSIONS.items()}
+    return [
+        {
+            **{names[column]: row[column] for column in columns},
+            "total": Decimal(str(row["total_amount"])).quantize(CENT),
+            "count": int(row["spend_count"]),
+        }
+        for row in rows
+    ]
+
+
+async def rebuild_rollups(organization_id=None) -> int:
+    """
+    Recomputes the rollups (of one organization, or all) from spendevent.
+    Aggregation, delete and rewrite run in one transaction, so readers see
+    the old totals until it commits. On Postgres the spendrollup table is
+    locked first: spend writes that already booked a rollup change commit
+    before the aggregate reads spendevent, and later ones wait and then
+    apply their change to the rebuilt totals. Returns the number of rollup
+    rows written.
+    """
+    dimensions = (
+        "organization_id", "spend_date", "category_id", "team_id", "vendor_id", "currency", "status"
+    )
+    totals = defaultdict(lambda: [Decimal(0), 0])
+
+    async with in_transaction() as conn:
+        if conn.capabilities.dialect == "postgres":
+            await conn.execute_query('LOCK TABLE "spendrollup" IN EXCLUSIVE MODE')
+
+        # Grouped by day in SQL, folded into months here: portable, and
+        # still far fewer rows than spends
+        qs = SpendEvent.all().using_db(conn)
+        if organization_id:
+            qs = qs.filter(organization_id=organization_id)
+        rows = await qs.annotate(
+            total_amount=Sum("amount"),
+            spend_count=Count("id")
+        ).group_by(*dimensions).values(*dimensions, "total_amount", "spend_count")
+
+        for row in rows:
+            key = RollupKey(
+                organization_id=row["organization_id"],
+                period=month_start(row["spend_date"]),
+                category_id=row["category_id"],
+                team_id=row["team_id"],
+                vendor_id=row["vendor_id"],
+                currency=row["currency"],
+                status=row["status"],
+            )
+            totals[key][0] += Decimal(str(row["total_amount"])).quantize(CENT)
+            totals[key][1] += row["spend_count"]
+
+        stale = SpendRollup.all().using_db(conn)
+        if organization_id:
+            stale = stale.filter(organization_id=organization_id)
+        await stale.delete()
+        if totals:
+            await _upsert(conn, totals)
+    return len(totals)
@@ -1,7 +1,14 @@
-from models.models import SpendEvent
+import uuid
+from models.models import AuditLog, Category, SpendEvent, Vendor
+from tortoise.expressions import Q
+from tortoise.transactions import in_transaction
 from services.audit_service import log_action
-from services.policy_service import evaluate_policies
-from services.idempotency_service import is_duplicate, record_key
+from services.policy_service import evaluate_policies, evaluate_policies_bulk
+from services.idempotency_service import claim_key, claim_keys, remember_key
+from services.spend_rollup import record_rollup_change, rollup_entry
+from spend_state import lock_spend
+
+BULK_BATCH_SIZE = 500
 
 
 async def create_spend_event(
@@ -18,27 +25,43 @@ async def create_spend_event(
     raw_metadata=None,
     idempotency_key: str | None = None
 ):
-    
-    if idempotency_key and await is_duplicate(idempotency_key):
-        return await SpendEvent.get(raw_metadata__idempotency=idempotency_key)
     # Merge existing raw_metadata dict with idempotency key
     metadata = (raw_metadata or {}).copy()  # ensure it’s a dict
     if idempotency_key:
         metadata["idempotency"] = idempotency_key
-    spend = await SpendEvent.create(
-        organization=organization,
-        user=user,
-        vendor=vendor,
-        category=category,
-        amount=amount,
-        currency=currency,
-        spend_date=spend_date,
-        source=source,
-        description=description,
-        raw_metadata=raw_metadata,
-        status="pending",
-        # raw_metadata={"idempotency": idempotency_key}
-    )
+
+    spend_id = uuid.uuid4()
+    async with in_transaction() as conn:
+        if idempotency_key:
+            # Claim and insert commit together, so a replay always finds the spend
+            claim = await claim_key(
+                idempotency_key,
+                scope="spend_create",
+                organization=organization,
+                entity_id=spend_id
+            )
+            if not claim.acquired:
+                if claim.entity_id is None:
+                    raise ValueError(f"Idempotency key {idempotency_key} was already used")
+                return await SpendEvent.get(id=claim.entity_id, organization_id=getattr(organization, "id", organization))
+
+        spend = await SpendEvent.create(
+            id=spend_id,
+            organization=organization,
+            user=user,
+            vendor=vendor,
+            category=category,
+            amount=amount,
+            currency=currency,
+            spend_date=spend_date,
+            source=source,
+            description=description,
+            raw_metadata=metadata or None,
+            status="pending"
+        )
+        await record_rollup_change([], [rollup_entry(spend)], using_db=conn)
+    if idempotency_key:
+        remember_key(idempotency_key, spend.id, scope="spend_create", organization=organization)
 
     await log_action(
         organization=organization,
@@ -48,23 +71,189 @@ async def create_spend_event(
     )
 
     await evaluate_policies(spend)
-    if idempotency_key:
-        await record_key(
-            key=idempotency_key,
-            scope="spend_create",
-            organization=organization
-        )
 
     return spend
+
+
+async def create_spend_events_bulk(*, organization, user, items: list[dict]) -> list[dict]:
+    """
+    Creates many spends with a fixed number of queries per batch.
+
+    Categories and vendors are resolved up front. In one transaction the
+    idempotency keys are claimed with a multi-row INSERT ... ON CONFLICT, and
+    spends and audit rows are inserted with bulk_create. Policies are then
+    evaluated against a single rule set. Returns one result per item, in
+    input order.
+    """
+    results: list[dict | None] = [None] * len(items)
+
+    # Keys repeated inside the batch resolve to their first occurrence
+    first_by_key = {}
+
+    # Resolve categories and vendors with one query each
+    category_ids = {item["category_id"] for item in items if item.get("category_id")}
+    category_names = {item["category"] for item in items if item.get("category") and not item.get("category_id")}
+    vendor_ids = {item["vendor_id"] for item in items if item.get("vendor_id")}
+
+    categories_by_id = {}
+    categories_by_name = {}
+    if category_ids or category_names:
+        for category in await Category.filter(organization_id=organization.id).filter(
+            Q(id__in=category_ids) | Q(name__in=category_names)
+        ):
+            categories_by_id[category.id] = category
+            categories_by_name[category.name] = category
+
+    # Same get-or-create behaviour as the single create route; new names are rare
+    for name in category_names - categories_by_name.keys():
+        categories_by_name[name] = await Category.create(organization=organization, name=name)
+
+    vendors_by_id = {}
+    if vendor_ids:
+        vendors_by_id = {
+            v.id: v for v in await Vendor.filter(organization_id=organization.id, id__in=vendor_ids)
+        }
+
+    spends = []
+    repeats = []
+    for index, item in enumerate(items):
+        key = item.get("idempotency_key")
+        if key and key in first_by_key:
+            repeats.append((index, key))
+            continue
+
+        category = None
+        if item.get("category_id"):
+            category = categories_by_id.get(item["category_id"])
+            if not category:
+                results[index] = {"index": index, "status": "invalid", "error": "Category not found"}
+                continue
+        elif item.get("category"):
+            category = categories_by_name[item["category"]]
+
+        vendor = None
+        if item.get("vendor_id"):
+            vendor = vendors_by_id.get(item["vendor_id"])
+            if not vendor:
+                results[index] = {"index": index, "status": "invalid", "error": "Vendor not found"}
+                continue
+
+        metadata = (item.get("raw_metadata") or {}).copy()
+        if key:
+            metadata["idempotency"] = key
+
+        spend = SpendEvent(
+            organization=organization,
+            user=user,
+            vendor=vendor,
+            category=category,
+            amount=item["amount"],
+            currency=item["currency"],
+            spend_date=item["spend_date"],
+            source=item["source"],
+            description=item.get("description"),
+            raw_metadata=metadata or None,
+            status="pending"
+        )
+        spends.append((index, key, spend))
+        if key:
+            first_by_key[key] = spend.id
+
+    created = []
+    policy_errors = {}
+    if spends:
+        async with in_transaction() as conn:
+            claims = {}
+            if first_by_key:
+                claims = await claim_keys(
+                    first_by_key,
+                    scope="spend_create",
+                    organization=organization,
+                    using_db=conn
+                )
+
+            for index, key, spend in spends:
+                if key and not claims[key].acquired:
+                    entity_id = claims[key].entity_id
+                    first_by_key[key] = entity_id
+                    results[index] = {
+                        "index": index,
+                        "status": "duplicate",
+                        "idempotency_key": key,
+                        "id": str(entity_id) if entity_id else None
+                    }
+                else:
+                    created.append(spend)
+
+            if created:
+                await SpendEvent.bulk_create(created, batch_size=BULK_BATCH_SIZE, using_db=conn)
+                await AuditLog.bulk_create(
+                    [
+                        AuditLog(
+                            organization=organization,
+                            actor=user,
+                            entity_type="SpendEvent",
+                            entity_id=spend.id,
+                            action="spend_created"
+                        )
+                        for spend in created
+                    ],
+                    batch_size=BULK_BATCH_SIZE,
+                    using_db=conn
+                )
+                await record_rollup_change([], [rollup_entry(spend) for spend in created], using_db=conn)
+
+        for key, claim in claims.items():
+            if claim.acquired:
+                remember_key(key, claim.entity_id, scope="spend_create", organization=organization)
+
+        policy_errors = await evaluate_policies_bulk(created)
+
+    for index, _, spend in spends:
+        if results[index] is None:
+            results[index] = {
+                "index": index,
+                "status": "created",
+                "id": str(spend.id),
+                "spend_status": spend.status
+            }
+            if spend.id in policy_errors:
+                results[index]["error"] = policy_errors[spend.id]
+
+    for index, key in repeats:
+        entity_id = first_by_key[key]
+        results[index] = {
+            "index": index,
+            "status": "duplicate",
+            "idempotency_key": key,
+            "id": str(entity_id) if entity_id else None
+        }
+
+    return results
+
+
 async def update_spend_after_receipt(spend, invoice_data):
     """
     Maps Gemini structured output to SpendEvent fields.
     """
-    if invoice_data.total_amount:
-        spend.amount = invoice_data.total_amount
-    if invoice_data.date:
-        spend.spend_date = invoice_data.date
+    vendor = None
     if invoice_data.vendor_name:
-        # TODO: normalize vendor or create new Vendor entry
-        spend.vendor = invoice_data.vendor_name
-    await spend.save()
+        vendor_name = invoice_data.vendor_name.strip()
+        vendor, _ = await Vendor.get_or_create(
+            organization_id=spend.organization_id,
+            normalized_name=vendor_name.lower(),
+            defaults={"name": vendor_name}
+        )
+    async with in_transaction() as conn:
+        # Only the extracted fields are written; status stays whatever
+        # concurrent transitions made it
+        await lock_spend(spend, conn)
+        before = rollup_entry(spend)
+        if invoice_data.total_amount:
+            spend.amount = invoice_data.total_amount
+        if invoice_data.date:
+            spend.spend_date = invoice_data.date
+        if vendor:
+            spend.vendor = vendor
+        await spend.save(update_fields=["amount", "spend_date", "vendor_id", "updated_at"], using_db=conn)
+        await record_rollup_change([before], [rollup_entry(spend)], using_db=conn)
@@ -1,5 +1,6 @@
 from models.models import User, Organization
 from tortoise.transactions import in_transaction
+from auth.user_cache import invalidate_user, invalidate_organization_users
 
 async def create_user_from_auth0(user_data: dict):
     """
@@ -58,6 +59,7 @@ async def update_user_from_auth0(user_data: dict):
         user.is_active = not user_data["blocked"]
 
     await user.save()
+    invalidate_user(user.auth_id)
     return user
 
 async def delete_user_from_auth0(auth0_user_id: str):
@@ -70,6 +72,8 @@ async def delete_user_from_auth0(auth0_user_id: str):
     if user:
         user.is_active = False
         await user.save()
+        invalidate_user(user.auth_id)
+    invalidate_user(auth0_user_id)
     return {"status": "deactivated"}
 
 async def sync_user_roles_from_auth0(user_data: dict):
@@ -84,6 +88,7 @@ async def sync_user_roles_from_auth0(user_data: dict):
         # Take the highest priority role
         user.role = roles[0] 
         await user.save()
+        invalidate_user(user.auth_id)
     return user
 
 async def handle_role_assignment(data: dict, action: str):
@@ -103,6 +108,7 @@ async def handle_role_assignment(data: dict, action: str):
         user.role = "employee" # Fallback to base role
         
     await user.save()
+    invalidate_user(user.auth_id)
     
 from models import Organization, Category, Policy
 org_data_example ={
@@ -174,6 +180,8 @@ async def handle_organization_deleted(org_data: dict):
         # Option 2: Hard delete (uncomment if you want)
         await org.delete()
 
+    invalidate_organization_users(org.id)
+
     return {"status": "deleted", "organization": org_id}
 
 
@@ -219,5 +227,6 @@ async def handle_organization_user_link(event_object: dict):
         user.is_active = True  # activate if previously inactive
         await user.save()
 
+    invalidate_user(auth0_user_id)
     print(f"User {auth0_user_id} linked to organization {org_id}")
     return {"status": "linked", "user": auth0_user_id, "org": org_id}
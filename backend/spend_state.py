@@ -1,5 +1,8 @@
 from enum import Enum
-from models import SpendEvent, Approval
+from tortoise import timezone
+from tortoise.transactions import in_transaction
+from models import SpendEvent, SpendTransition
+from services.spend_rollup import record_rollup_change, rollup_entry
 
 class SpendStatus(str, Enum):
     PENDING = "pending"
@@ -19,9 +22,140 @@ TRANSITIONS = {
 }
 
 
-async def transition_spend(spend: SpendEvent, new_status: str):
-    if new_status not in TRANSITIONS[spend.status]:
-        raise ValueError(f"Invalid transition from {spend.status} to {new_status}")
+class TransitionLost(Exception):
+    """
+    A spend in a batch changed status since it was loaded.
+    """
 
-    spend.status = new_status
-    await spend.save()
+
+def _check(spend: SpendEvent, new_status) -> tuple[SpendStatus, SpendStatus]:
+    current, new_status = SpendStatus(spend.status), SpendStatus(new_status)
+    if new_status not in TRANSITIONS[current]:
+        raise ValueError(f"Invalid transition from {current.value} to {new_status.value}")
+    return current, new_status
+
+
+async def transition_spend(spend: SpendEvent, new_status: str, *, actor=None, reason: str | None = None, using_db=None) -> bool:
+    """
+    Moves `spend` from the status it was loaded with to `new_status`, with
+    one conditional UPDATE of status and updated_at, plus the
+    SpendTransition row and rollup change, in one transaction (the caller's
+    with `using_db`).
+
+    Returns False, changing nothing, if the spend's status changed since it
+    was loaded: someone else's transition won. Raises ValueError if
+    TRANSITIONS doesn't allow the move.
+    """
+    current, new_status = _check(spend, new_status)
+    if using_db is None:
+        async with in_transaction() as conn:
+            return await _transition(spend, current, new_status, actor, reason, conn)
+    return await _transition(spend, current, new_status, actor, reason, using_db)
+
+
+async def _transition(spend, current, new_status, actor, reason, conn) -> bool:
+    before = rollup_entry(spend)
+    now = timezone.now()
+    won = await SpendEvent.filter(id=spend.id, status=current.value).using_db(conn).update(
+        status=new_status.value,
+        updated_at=now
+    )
+    if not won:
+        return False
+
+    spend.status = new_status.value
+    spend.updated_at = now
+    await SpendTransition.create(
+        spend_event_id=spend.id,
+        from_status=current.value,
+        to_status=new_status.value,
+        actor_id=getattr(actor, "id", actor),
+        reason=reason,
+        using_db=conn
+    )
+    await record_rollup_change([before], [rollup_entry(spend)], using_db=conn)
+    return True
+
+
+async def transition_spends(
+    spends: list[SpendEvent],
+    new_status: str,
+    *,
+    actor=None,
+    reason: str | None = None,
+    using_db=None
+) -> list[SpendEvent]:
+    """
+    transition_spend for many spends: one UPDATE per current status and
+    one bulk insert of history. If any spend changed under us the batch is
+    rolled back and retried spend by spend, so the others still move.
+    Returns the spends that moved.
+
+    With `using_db` it raises TransitionLost instead, and rolling back is
+    up to the caller's transaction.
+    """
+    groups = {}
+    for spend in spends:
+        current, target = _check(spend, new_status)
+        groups.setdefault(current, []).append(spend)
+    if not groups:
+        return []
+
+    if using_db is not None:
+        await _transition_batch(spends, groups, target, actor, reason, using_db)
+        return list(spends)
+    try:
+        async with in_transaction() as conn:
+            await _transition_batch(spends, groups, target, actor, reason, conn)
+    except TransitionLost:
+        return [spend for spend in spends if await transition_spend(spend, target, actor=actor, reason=reason)]
+    return list(spends)
+
+
+async def _transition_batch(spends, groups, target, actor, reason, conn):
+    now = timezone.now()
+    for current, group in groups.items():
+        won = await SpendEvent.filter(
+            id__in=[spend.id for spend in group],
+            status=current.value
+        ).using_db(conn).update(status=target.value, updated_at=now)
+        if won != len(group):
+            raise TransitionLost
+    await SpendTransition.bulk_create([
+        SpendTransition(
+            spend_event_id=spend.id,
+            from_status=spend.status,
+            to_status=target.value,
+            actor_id=getattr(actor, "id", actor),
+            reason=reason
+        )
+        for spend in spends
+    ], using_db=conn)
+    before = [rollup_entry(spend) for spend in spends]
+    await record_rollup_change(
+        before,
+        [(key._replace(status=target.value), amount) for key, amount in before],
+        using_db=conn
+    )
+    # Objects follow only once every row is written
+    for spend in spends:
+        spend.status = target.value
+        spend.updated_at = now
+
+
+# Everything rollup_entry reads
+_ROLLUP_FIELDS = (
+    "organization_id", "spend_date", "category_id", "team_id", "vendor_id", "currency", "status", "amount"
+)
+
+
+async def lock_spend(spend: SpendEvent, conn):
+    """
+    Re-reads the fields rollup_entry uses and locks the row of `spend`
+    until `conn` commits. Writes of other fields call this first, so their
+    rollup change is booked against the committed row and no transition or
+    other write slips in between.
+    """
+    rows = await SpendEvent.filter(id=spend.id).select_for_update().using_db(conn).values(*_ROLLUP_FIELDS)
+    for name, value in rows[0].items():
+        setattr(spend, name, value)
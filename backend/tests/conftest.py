@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+from tortoise import Tortoise
+from tortoise.backends.sqlite.client import SqliteClient
+
+
+@pytest.fixture
+def db():
+    """
+    Runs a coroutine function against a fresh in-memory SQLite database.
+    """
+    def run(test):
+        async def main():
+            await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["models.models"]})
+            await Tortoise.generate_schemas()
+            try:
+                return await test()
+            finally:
+                await Tortoise.close_connections()
+        return asyncio.run(main())
+    return run
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def reset(self):
+        self.count = 0
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    """
+    Counts the statements SQLite connections execute.
+    """
+    counter = QueryCounter()
+    for name in ("execute_query", "execute_query_dict", "execute_insert", "execute_many"):
+        original = getattr(SqliteClient, name)
+
+        def counted(original):
+            async def execute(self, *args, **kwargs):
+                counter.count += 1
+                return await original(self, *args, **kwargs)
+            return execute
+
+        monkeypatch.setattr(SqliteClient, name, counted(original))
+    return counter
@@ -0,0 +1,60 @@
+from datetime import date
+
+from models.models import Approval, Category, Organization, Receipt, SpendEvent, User, Vendor
+from services.approval_service import approval_inbox
+
+
+async def _seed(count: int) -> User:
+    organization = await Organization.create(name="Acme")
+    submitter = await User.create(organization=organization, email="sam@acme.test", full_name="Sam", role="employee")
+    approver = await User.create(organization=organization, email="max@acme.test", full_name="Max", role="manager")
+    category = await Category.create(organization=organization, name="Travel")
+    vendor = await Vendor.create(organization=organization, name="Rail Co", normalized_name="rail co")
+    for i in range(count):
+        spend = await SpendEvent.create(
+            organization=organization,
+            user=submitter,
+            category=category if i % 2 else None,
+            vendor=vendor if i % 3 else None,
+            amount=10 + i,
+            currency="EUR",
+            spend_date=date(2026, 1, 1),
+            source="test",
+            status="awaiting_approval"
+        )
+        await Receipt.create(spend_event=spend, file_url=f"receipts/{i}.pdf")
+        await Approval.create(spend_event=spend, approver=approver, status="pending")
+    return approver
+
+
+def test_inbox_query_count_does_not_grow_with_page_size(db, queries):
+    async def test():
+        approver = await _seed(30)
+
+        counts = {}
+        for limit in (5, 25):
+            queries.reset()
+            page = await approval_inbox(approver, limit=limit, include_total=False)
+            counts[limit] = queries.count
+            assert len(page["items"]) == limit
+
+        assert counts[5] == counts[25] == 2
+
+        item = page["items"][0]
+        assert item["spend"]["submitted_by"]["full_name"] == "Sam"
+        assert item["spend"]["receipts"][0]["file_url"].startswith("receipts/")
+
+    db(test)
+
+
+def test_inbox_next_page_costs_the_same(db, queries):
+    async def test():
+        approver = await _seed(12)
+        first = await approval_inbox(approver, limit=5, include_total=False)
+
+        queries.reset()
+        second = await approval_inbox(approver, limit=5, cursor=first["next_cursor"], include_total=False)
+        assert queries.count == 2
+        assert not {item["id"] for item in first["items"]} & {item["id"] for item in second["items"]}
+
+    db(test)
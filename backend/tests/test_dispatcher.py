@@ -0,0 +1,112 @@
+import asyncio
+import socket
+
+import pytest
+
+from notifications import dispatcher
+from notifications.dispatcher import NotificationDispatcher, OutboundEmail, SmtpPool
+from scripts import smtp_sink
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    """
+    Starts scripts/smtp_sink.py on a free local port; returns
+    start(port) -> server and the port to point SmtpPool at.
+    """
+    monkeypatch.setattr(smtp_sink, "stats", {"connections": 0, "messages": 0, "rejected": 0})
+    monkeypatch.setitem(dispatcher._renderers, "test", lambda digest: (f"{len(digest.items)} items", "body"))
+    monkeypatch.setattr(dispatcher, "NOTIFY_RETRY_BASE", 0.05)
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    async def start():
+        return await asyncio.start_server(
+            lambda r, w: smtp_sink.handle(r, w, fail_rate=0.0, verbose=False),
+            "127.0.0.1", port
+        )
+
+    return start, port
+
+
+def pool(port):
+    return SmtpPool(size=1, hostname="127.0.0.1", port=port, start_tls=False, username=None, password=None)
+
+
+def email(to, n):
+    return OutboundEmail(to=to, kind="test", item={"n": n})
+
+
+def test_emails_to_one_recipient_are_coalesced(sink, capsys):
+    start, port = sink
+
+    async def main():
+        server = await start()
+        notifier = NotificationDispatcher(pool(port), window=0.1)
+        notifier.start()
+        for n in range(3):
+            notifier.enqueue(email("approver@example.test", n))
+        notifier.enqueue(email("other@example.test", 0))
+        await asyncio.sleep(0.5)
+        await notifier.stop()
+        server.close()
+        await server.wait_closed()
+        return notifier
+
+    notifier = asyncio.run(main())
+    assert smtp_sink.stats["messages"] == 2
+    assert smtp_sink.stats["connections"] == 1
+    assert notifier.stats["coalesced"] == 2
+    assert notifier.stats["digests"] == 1
+    out = capsys.readouterr().out
+    assert "approver@example.test: 3 items" in out
+    assert "other@example.test: 1 items" in out
+
+
+def test_refused_connection_is_retried(sink):
+    start, port = sink
+
+    async def main():
+        # Nothing listens yet, so the first attempt is refused
+        notifier = NotificationDispatcher(pool(port), window=0)
+        notifier.start()
+        notifier.enqueue(email("approver@example.test", 0))
+        await asyncio.sleep(0.01)
+        server = await start()
+        for _ in range(100):
+            if notifier.stats["sent"]:
+                break
+            await asyncio.sleep(0.02)
+        await notifier.stop()
+        server.close()
+        await server.wait_closed()
+        return notifier
+
+    notifier = asyncio.run(main())
+    assert notifier.stats["retries"] >= 1
+    assert notifier.stats["sent"] == 1
+    assert notifier.stats["failed"] == 0
+    assert smtp_sink.stats["messages"] == 1
+
+
+def test_stop_flushes_pending_digests(sink):
+    start, port = sink
+
+    async def main():
+        server = await start()
+        notifier = NotificationDispatcher(pool(port), window=60)
+        notifier.start()
+        notifier.enqueue(email("approver@example.test", 0))
+        notifier.enqueue(email("approver@example.test", 1))
+        await asyncio.sleep(0)
+        await notifier.stop()
+        server.close()
+        await server.wait_closed()
+        return notifier
+
+    notifier = asyncio.run(main())
+    assert notifier.stats["sent"] == 1
+    assert notifier.stats["digests"] == 1
+    assert smtp_sink.stats["messages"] == 1
@@ -0,0 +1,27 @@
+"""
+Cold-start budget for the API: `python -X importtime -c "import main"`.
+IMPORT_BUDGET_MS overrides the budget on slower CI machines.
+"""
+from scripts.import_budget import IMPORT_BUDGET_MS, LAZY_MODULES, eager_modules, measure, total_ms
+
+# Import time is noisy; the budget holds if the best of these runs meets it
+RUNS = 3
+
+
+def test_main_imports_within_budget():
+    totals = []
+    for _ in range(RUNS):
+        totals.append(total_ms(measure("main")))
+        if totals[-1] <= IMPORT_BUDGET_MS:
+            break
+    assert min(totals) <= IMPORT_BUDGET_MS, f"import main took {min(totals):.0f} ms, budget {IMPORT_BUDGET_MS:.0f} ms"
+
+
+def test_llm_and_client_libraries_load_lazily():
+    imports = measure("main")
+    assert eager_modules(imports) == []
+
+    loaded = {name.strip() for name, _, _ in imports}
+    for module in ("langchain_core", "langchain_google_genai", "google.genai", "authlib.integrations"):
+        assert module in LAZY_MODULES
+        assert module not in loaded
@@ -0,0 +1,154 @@
+import asyncio
+import time
+
+import pytest
+
+from services import gemini_service
+from services.llm_client import LLMClient
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def client(call, batch_call=None, **options):
+    options = {"rate": 1000, "burst": 1000, "retry_base": 0.001, "batch_window": 0.05, **options}
+    return LLMClient(call, batch_call, **options)
+
+
+def test_fake_model_batches_concurrent_payloads(monkeypatch):
+    monkeypatch.setattr(gemini_service, "LLM_FAKE_LATENCY", 0)
+    batches = []
+
+    async def batch_call(contents):
+        batches.append(len(contents))
+        return await gemini_service._fake_batch_call(contents)
+
+    async def main():
+        llm = client(gemini_service._fake_call, batch_call, batch_size=4)
+        results = await asyncio.gather(*(llm.submit([{"type": "text", "text": str(i)}]) for i in range(8)))
+        await llm.close()
+        return llm, results
+
+    llm, results = run(main())
+    assert batches == [4, 4]
+    assert [r.vendor_name for r in results] == ["Fake Vendor"] * 8
+    assert llm.stats["batches"] == 2
+    assert llm.stats["calls"] == 2
+
+
+def test_batch_results_keep_submission_order():
+    async def batch_call(payloads):
+        return [payload * 10 for payload in payloads]
+
+    async def main():
+        llm = client(None, batch_call, batch_size=3)
+        results = await asyncio.gather(*(llm.submit(i) for i in range(3)))
+        await llm.close()
+        return results
+
+    assert run(main()) == [0, 10, 20]
+
+
+def test_rate_limit_spaces_calls():
+    async def call(payload):
+        return payload
+
+    async def main():
+        llm = client(call, rate=20, burst=1)
+        started = time.monotonic()
+        await asyncio.gather(*(llm.submit(i) for i in range(5)))
+        elapsed = time.monotonic() - started
+        await llm.close()
+        return elapsed
+
+    # One token up front, then one every 50 ms
+    assert run(main()) >= 0.18
+
+
+def test_timeout_is_retried():
+    attempts = []
+
+    async def call(payload):
+        attempts.append(payload)
+        if len(attempts) == 1:
+            await asyncio.sleep(1)
+        return payload
+
+    async def main():
+        llm = client(call, timeout=0.05)
+        result = await llm.submit("receipt")
+        await llm.close()
+        return llm, result
+
+    llm, result = run(main())
+    assert result == "receipt"
+    assert llm.stats["timeouts"] == 1
+    assert llm.stats["retries"] == 1
+
+
+def test_non_retryable_error_fails_without_retrying():
+    calls = []
+
+    async def call(payload):
+        calls.append(payload)
+        raise ValueError("bad request")
+
+    async def main():
+        llm = client(call)
+        try:
+            with pytest.raises(ValueError):
+                await llm.submit("receipt")
+        finally:
+            await llm.close()
+
+    run(main())
+    assert len(calls) == 1
+
+
+def test_throttled_batch_fails_without_single_call_fallback():
+    singles = []
+    batch_calls = []
+
+    async def call(payload):
+        singles.append(payload)
+        return payload
+
+    async def batch_call(payloads):
+        batch_calls.append(payloads)
+        raise RateLimited("429 RESOURCE_EXHAUSTED")
+
+    async def main():
+        llm = client(call, batch_call, batch_size=4, max_retries=2)
+        results = await asyncio.gather(*(llm.submit(i) for i in range(4)), return_exceptions=True)
+        await llm.close()
+        return llm, results
+
+    llm, results = run(main())
+    assert all(isinstance(result, RateLimited) for result in results)
+    assert len(batch_calls) == 3
+    assert singles == []
+    assert llm.stats["rate_limited"] == 3
+    assert llm.stats["batch_fallbacks"] == 0
+
+
+def test_malformed_batch_falls_back_to_single_calls():
+    async def call(payload):
+        return payload
+
+    async def batch_call(payloads):
+        return payloads[:1]
+
+    async def main():
+        llm = client(call, batch_call, batch_size=3)
+        results = await asyncio.gather(*(llm.submit(i) for i in range(3)))
+        await llm.close()
+        return llm, results
+
+    llm, results = run(main())
+    assert results == [0, 1, 2]
+    assert llm.stats["batch_fallbacks"] == 1
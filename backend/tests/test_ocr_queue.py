@@ -0,0 +1,73 @@
+from datetime import date, timedelta
+
+from tortoise import timezone
+
+from models.models import Organization, Receipt, SpendEvent, User
+from services import ocr_queue
+from services.ocr_queue import OCR_MAX_ATTEMPTS, OcrStatus, claim_jobs, requeue_stale_jobs
+
+
+async def _receipt() -> Receipt:
+    organization = await Organization.create(name="Acme")
+    user = await User.create(organization=organization, email="sam@acme.test", full_name="Sam", role="employee")
+    spend = await SpendEvent.create(
+        organization=organization,
+        user=user,
+        amount=10,
+        currency="EUR",
+        spend_date=date(2026, 1, 1),
+        source="test",
+        status="pending"
+    )
+    return await Receipt.create(spend_event=spend, file_url="receipts/0.pdf", ocr_next_attempt_at=timezone.now())
+
+
+async def _expire_lock(receipt_id):
+    expired = timezone.now() - timedelta(seconds=ocr_queue.OCR_LOCK_TIMEOUT + 1)
+    await Receipt.filter(id=receipt_id).update(ocr_locked_at=expired)
+
+
+def test_stale_job_is_requeued_and_counts_as_an_attempt(db):
+    async def test():
+        receipt = await _receipt()
+        assert await claim_jobs(1) == [receipt.id]
+        await _expire_lock(receipt.id)
+
+        assert await requeue_stale_jobs() == (1, 0)
+        await receipt.refresh_from_db()
+        assert receipt.ocr_status == OcrStatus.QUEUED
+        assert receipt.ocr_attempts == 1
+        assert receipt.ocr_locked_at is None
+
+    db(test)
+
+
+def test_job_that_keeps_outliving_its_lock_goes_dead(db):
+    async def test():
+        receipt = await _receipt()
+        outcomes = []
+        for _ in range(OCR_MAX_ATTEMPTS):
+            assert await claim_jobs(1) == [receipt.id]
+            await _expire_lock(receipt.id)
+            outcomes.append(await requeue_stale_jobs())
+
+        assert outcomes == [(1, 0)] * (OCR_MAX_ATTEMPTS - 1) + [(0, 1)]
+        await receipt.refresh_from_db()
+        assert receipt.ocr_status == OcrStatus.DEAD
+        assert receipt.ocr_attempts == OCR_MAX_ATTEMPTS
+        assert receipt.ocr_error == ocr_queue.STALE_LOCK_ERROR
+        assert await claim_jobs(1) == []
+
+    db(test)
+
+
+def test_fresh_locks_are_left_alone(db):
+    async def test():
+        receipt = await _receipt()
+        await claim_jobs(1)
+
+        assert await requeue_stale_jobs() == (0, 0)
+        await receipt.refresh_from_db()
+        assert receipt.ocr_status == OcrStatus.PROCESSING
+
+    db(test)
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+from tortoise import Tortoise, connections
+from tortoise.utils import get_schema_sql
+
+import db
+from db import mark_written, tortoise_config, use_replica
+from models.models import Organization
+
+
+@pytest.fixture
+def replica_db(tmp_path, monkeypatch):
+    """
+    Runs a coroutine function with two SQLite databases wired up as the
+    primary and the replica, each with its own rows.
+    """
+    monkeypatch.setattr(db, "_sticky_until", {})
+    monkeypatch.setattr(db, "_routing_stats", {"replica": 0, "sticky_primary": 0})
+    config = tortoise_config(f"sqlite://{tmp_path / 'primary.db'}", f"sqlite://{tmp_path / 'replica.db'}")
+    config["apps"]["models"]["models"] = ["models.models"]
+
+    def run(test):
+        async def main():
+            await Tortoise.init(config=config)
+            await Tortoise.generate_schemas()
+            # Models live on the default connection; give the replica the same tables
+            await connections.get("replica").execute_script(get_schema_sql(connections.get("default"), safe=False))
+            try:
+                await Organization.create(name="on primary")
+                await Organization.create(name="on replica", using_db=connections.get("replica"))
+                return await test()
+            finally:
+                await Tortoise.close_connections()
+        return asyncio.run(main())
+    return run
+
+
+async def names():
+    return sorted(await Organization.all().values_list("name", flat=True))
+
+
+def test_reads_stay_on_primary_by_default(replica_db):
+    assert replica_db(names) == ["on primary"]
+
+
+def test_use_replica_routes_reads_to_replica(replica_db):
+    async def test():
+        assert use_replica("auth0|reader")
+        return await names()
+
+    assert replica_db(test) == ["on replica"]
+    assert db.replica_stats()["replica"] == 1
+
+
+def test_writes_go_to_primary_under_use_replica(replica_db):
+    async def test():
+        use_replica("auth0|writer")
+        await Organization.create(name="written")
+        primary = await connections.get("default").execute_query_dict("SELECT name FROM organization")
+        return sorted(row["name"] for row in primary), await names()
+
+    primary, replica = replica_db(test)
+    assert primary == ["on primary", "written"]
+    assert replica == ["on replica"]
+
+
+def test_session_that_wrote_sticks_to_primary(replica_db, monkeypatch):
+    monkeypatch.setattr(db, "DB_REPLICA_STICKY_SECONDS", 60)
+
+    async def test():
+        mark_written("auth0|writer")
+        sticky = use_replica("auth0|writer"), await names()
+        # Another session is unaffected; run it in its own context
+        other = await asyncio.create_task(read_from_replica("auth0|other"))
+        return sticky, other
+
+    async def read_from_replica(session):
+        return use_replica(session), await names()
+
+    sticky, other = replica_db(test)
+    assert sticky == (False, ["on primary"])
+    assert other == (True, ["on replica"])
+    assert db.replica_stats()["sticky_primary"] == 1
+
+
+def test_sticky_window_expires(replica_db, monkeypatch):
+    monkeypatch.setattr(db, "DB_REPLICA_STICKY_SECONDS", 0.01)
+
+    async def test():
+        mark_written("auth0|writer")
+        await asyncio.sleep(0.02)
+        return use_replica("auth0|writer"), await names()
+
+    assert replica_db(test) == (True, ["on replica"])
+    assert db.replica_stats()["sticky_sessions"] == 0
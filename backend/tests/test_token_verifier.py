@@ -0,0 +1,128 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from authlib.jose import JsonWebKey, JsonWebToken
+
+import auth.config
+import auth.verifier
+from auth.verifier import TokenError, TokenVerifier, get_verifier
+
+DOMAIN = "tenant.example.test"
+AUDIENCE = "https://api.example.test"
+
+
+@pytest.fixture(scope="module")
+def signing_key():
+    return JsonWebKey.generate_key("RSA", 2048, is_private=True, options={"kid": "test-key"})
+
+
+@pytest.fixture
+def jwks_file(tmp_path, signing_key):
+    """
+    A local JWKS with the public half of `signing_key`, as AUTH0_JWKS_FILE
+    would point to.
+    """
+    path = tmp_path / "jwks.json"
+    path.write_text(json.dumps({"keys": [{**signing_key.as_dict(is_private=False), "use": "sig"}]}))
+    return path
+
+
+def sign(key, *, audience=AUDIENCE, expires_in=300, **claims):
+    now = int(time.time())
+    payload = {
+        "iss": f"https://{DOMAIN}/",
+        "aud": audience,
+        "sub": "auth0|user",
+        "iat": now,
+        "exp": now + expires_in,
+        **claims,
+    }
+    return JsonWebToken(["RS256"]).encode({"alg": "RS256"}, payload, key).decode()
+
+
+@pytest.fixture
+def verifier(monkeypatch, jwks_file):
+    monkeypatch.setenv("AUTH0_DOMAIN", DOMAIN)
+    monkeypatch.setenv("AUTH0_API_AUDIENCE", AUDIENCE)
+    monkeypatch.setenv("AUTH0_JWKS_FILE", str(jwks_file))
+    auth.config.get_settings.cache_clear()
+    get_verifier.cache_clear()
+    yield get_verifier()
+    auth.config.get_settings.cache_clear()
+    get_verifier.cache_clear()
+
+
+def test_valid_token(verifier, signing_key):
+    claims = asyncio.run(verifier.verify(sign(signing_key)))
+    assert claims["sub"] == "auth0|user"
+    assert verifier.stats["verified"] == 1
+
+
+def test_expired_token(verifier, signing_key):
+    token = sign(signing_key, expires_in=-(verifier.leeway + 60))
+    with pytest.raises(TokenError):
+        asyncio.run(verifier.verify(token))
+    assert verifier.stats["rejected"] == 1
+
+
+def test_wrong_audience(verifier, signing_key):
+    with pytest.raises(TokenError):
+        asyncio.run(verifier.verify(sign(signing_key, audience="https://other.example.test")))
+
+
+def test_token_signed_by_another_key(verifier):
+    other = JsonWebKey.generate_key("RSA", 2048, is_private=True)
+    with pytest.raises(TokenError):
+        asyncio.run(verifier.verify(sign(other)))
+
+
+def test_repeat_token_is_a_memo_hit(verifier, signing_key):
+    token = sign(signing_key)
+
+    async def main():
+        first = await verifier.verify(token)
+        second = await verifier.verify(token)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first == second
+    assert verifier.stats["verified"] == 1
+    assert verifier.stats["memo_hits"] == 1
+
+
+def test_unknown_kid_refreshes_at_most_every_min_interval(monkeypatch, jwks_file, signing_key):
+    fetches = []
+
+    def serve(request):
+        fetches.append(request.url)
+        return httpx.Response(200, content=jwks_file.read_bytes())
+
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(
+        auth.verifier.httpx, "AsyncClient",
+        lambda **kwargs: real_client(transport=httpx.MockTransport(serve), **kwargs)
+    )
+
+    # authlib puts the signing key's kid in the header
+    rotated = JsonWebKey.generate_key("RSA", 2048, is_private=True, options={"kid": "rotated-key"})
+
+    async def main():
+        verifier = TokenVerifier(DOMAIN, AUDIENCE)
+        await verifier.verify(sign(signing_key))
+        assert len(fetches) == 1
+
+        # Within JWKS_MIN_REFRESH_INTERVAL an unknown kid does not refetch
+        with pytest.raises(TokenError, match="Unknown signing key"):
+            await verifier.verify(sign(rotated))
+        assert len(fetches) == 1
+
+        monkeypatch.setattr(auth.verifier, "JWKS_MIN_REFRESH_INTERVAL", 0)
+        with pytest.raises(TokenError, match="Unknown signing key"):
+            await verifier.verify(sign(rotated))
+        assert len(fetches) == 2
+        assert str(fetches[0]) == f"https://{DOMAIN}/.well-known/jwks.json"
+
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""Receipt OCR worker entrance
+
+Runs separately from the API so OCR neither competes with request handling
+nor dies with a web worker:
+
+    python worker.py
+
+Scale throughput with more processes or OCR_CONCURRENCY.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+
+from db import init_db, close_db, pool_stats
+from notifications.dispatcher import dispatcher_stats, start_dispatcher, stop_dispatcher
+from services.audit_service import start_audit_writer, stop_audit_writer
+from services.extraction_cache import RECEIPT_CACHE_EVICT_INTERVAL, evict_extractions
+from services.gemini_service import get_llm_client, llm_client_stats
+from services.ocr_queue import OcrWorker
+from services.receipt_service import process_receipt_ocr
+
+logger = logging.getLogger(__name__)
+
+STATS_LOG_INTERVAL = float(os.getenv("WORKER_STATS_INTERVAL_SECONDS", 60))
+
+
+async def evict_cached_extractions(stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            await evict_extractions()
+        except Exception:
+            logger.exception("Receipt extraction cache eviction failed")
+        try:
+            await asyncio.wait_for(stop.wait(), RECEIPT_CACHE_EVICT_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def log_stats(worker: OcrWorker, stop: asyncio.Event):
+    # The worker has no HTTP endpoint; queue depth and LLM latency go to the log
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), STATS_LOG_INTERVAL)
+        except asyncio.TimeoutError:
+            logger.info(
+                "OCR worker: %s llm: %s db pool: %s notifications: %s",
+                worker.stats, llm_client_stats(), pool_stats(), dispatcher_stats()
+            )
+
+
+async def main():
+    await init_db()
+    start_audit_writer()
+    # Spends created from receipts can request approvals
+    start_dispatcher()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    worker = OcrWorker(process_receipt_ocr)
+    logger.info("OCR worker started (concurrency=%s)", worker.concurrency)
+    evictor = asyncio.create_task(evict_cached_extractions(stop))
+    stats_logger = asyncio.create_task(log_stats(worker, stop))
+    try:
+        await worker.run(stop)
+        await evictor
+        await stats_logger
+    finally:
+        logger.info("OCR worker stopping: %s llm: %s", worker.stats, llm_client_stats())
+        await get_llm_client().close()
+        await stop_dispatcher()
+        await stop_audit_writer()
+        await close_db()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())